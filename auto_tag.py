@@ -0,0 +1,192 @@
+# auto_tag.py - 自动打标签规则：所有规则合成一个字面串倒排表做预筛选，扫描发现新文件/变化文件时增量应用
+#
+# Save/AutoTagRules.json: {"rules": [{"name", "enabled", "pattern", "ignore_case", "folder",
+#                                     "extensions", "min_size_mb", "max_size_mb", "tags": [...]}]}
+#   pattern    匹配完整路径（分隔符统一为 '/'），为空表示不限
+#   folder     只作用于该文件夹之下
+#   extensions / min_size_mb / max_size_mb  按扩展名、文件大小筛选
+# 规则只会添加标签，不会删除用户手动打的标签。
+import os
+import re
+import json
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+AUTO_TAG_RULES_FILE = os.path.join(SAVE_DIR, "AutoTagRules.json")
+
+MB = 1024 * 1024
+GRAM = 3
+DIR_CACHE_SIZE = 4096
+
+
+class RuleError(ValueError):
+    pass
+
+
+class AutoTagCancelled(Exception):
+    pass
+
+
+def load_rules():
+    try:
+        if os.path.exists(AUTO_TAG_RULES_FILE):
+            with open(AUTO_TAG_RULES_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f).get('rules', [])
+    except Exception as e:
+        log.error("读取 %s 出错: %s", AUTO_TAG_RULES_FILE, e)
+    return []
+
+
+def save_rules(rules):
+    try:
+        write_json_atomic(AUTO_TAG_RULES_FILE, {"rules": rules}, indent=4)
+    except Exception as e:
+        log.error("保存 %s 出错: %s", AUTO_TAG_RULES_FILE, e)
+
+
+class _Predicate:
+    __slots__ = ('tags', 'folder', 'extensions', 'min_size', 'max_size')
+
+    def __init__(self, rule):
+        self.tags = tuple(rule.get('tags', []))
+        folder = rule.get('folder') or None
+        if folder:
+            folder = os.path.normpath(folder)
+            folder = folder if folder.endswith(os.sep) else folder + os.sep
+        self.folder = folder
+        extensions = rule.get('extensions') or ()
+        self.extensions = {('.' + e.lstrip('.')).lower() for e in extensions} or None
+        self.min_size = rule['min_size_mb'] * MB if rule.get('min_size_mb') else None
+        self.max_size = rule['max_size_mb'] * MB if rule.get('max_size_mb') else None
+
+    def accepts(self, path, size):
+        if self.folder is not None and not path.startswith(self.folder):
+            return False
+        if self.extensions is not None and os.path.splitext(path)[1].lower() not in self.extensions:
+            return False
+        if self.min_size is not None and (size is None or size < self.min_size):
+            return False
+        if self.max_size is not None and (size is None or size > self.max_size):
+            return False
+        return True
+
+
+def _literal_cover(items):
+    # 返回一组字面串，任何一次匹配必然包含其中至少一个；无法确定时返回 None。
+    # 在一个序列中取“最短串最长”的那组，作为预筛选条件区分度最好
+    best = None
+    run = []
+
+    def consider(cover):
+        nonlocal best
+        if cover and (best is None or min(map(len, cover)) > min(map(len, best))):
+            best = cover
+
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        consider({''.join(run)} if run else None)
+        run = []
+        if op is sre_constants.SUBPATTERN:
+            consider(_literal_cover(av[-1]))
+        elif op is sre_constants.BRANCH:
+            covers = [_literal_cover(branch) for branch in av[1]]
+            if all(covers):
+                consider(set().union(*covers))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            consider(_literal_cover(av[2]))
+    consider({''.join(run)} if run else None)
+    return best
+
+
+class AutoTagger:
+    def __init__(self, rules=None):
+        self.rules = load_rules() if rules is None else rules
+        self.compile()
+
+    def compile(self):
+        # 所有规则合成一个三字母组倒排表：每条正则提取出必然出现的字面串，取其首个三字母组登记；
+        # 对每个路径只做一次“路径的三字母组 ∩ 倒排表键”的集合运算得到候选规则，再逐条确认候选。
+        # 提取不出足够长字面串的规则每个路径都确认一次。
+        self._plain = []
+        self._grams = {}
+        self._always = []
+        for i, rule in enumerate(self.rules):
+            if not rule.get('enabled', True) or not rule.get('tags'):
+                continue
+            predicate = _Predicate(rule)
+            pattern = rule.get('pattern') or ''
+            if not pattern:
+                self._plain.append(predicate)
+                continue
+            name = rule.get('name') or i + 1
+            flags = re.IGNORECASE if rule.get('ignore_case', True) else 0
+            try:
+                regex = re.compile(pattern, flags)
+                parsed = sre_parse.parse(pattern, flags)
+            except re.error as e:
+                raise RuleError(f"规则“{name}”的正则无效: {e}")
+            entry = (regex, predicate)
+            cover = _literal_cover(list(parsed))
+            if cover and min(map(len, cover)) >= GRAM:
+                for literal in cover:
+                    self._grams.setdefault(literal[:GRAM].lower(), []).append(entry)
+            else:
+                self._always.append(entry)
+        self._gram_keys = set(self._grams)
+        self._dir_cache = {}
+
+    def _candidates(self, lower):
+        grams = {lower[i:i + GRAM] for i in range(len(lower) - GRAM + 1)}
+        return [entry for gram in grams & self._gram_keys for entry in self._grams[gram]]
+
+    def tags_for(self, path, size=None):
+        tags = set()
+        for predicate in self._plain:
+            if predicate.accepts(path, size):
+                tags.update(predicate.tags)
+        normalized = path.replace(os.sep, '/')
+        candidates = self._always
+        if self._gram_keys:
+            # 同一目录下的文件共用目录部分的候选，文件名部分（连同跨 '/' 的三字母组）单独算；
+            # 两段重叠 GRAM - 1 个字符，任何一个三字母组都完整落在其中一段里
+            lower = normalized.lower()
+            sep = lower.rfind('/')
+            head = lower[:max(0, sep)]
+            by_dir = self._dir_cache.get(head)
+            if by_dir is None:
+                if len(self._dir_cache) >= DIR_CACHE_SIZE:
+                    self._dir_cache.clear()
+                by_dir = self._dir_cache[head] = self._candidates(head)
+            tail = lower[max(0, sep - GRAM + 1):]
+            candidates = candidates + by_dir + self._candidates(tail)
+        for regex, predicate in candidates:
+            if predicate.accepts(path, size) and regex.search(normalized):
+                tags.update(predicate.tags)
+        return tags
+
+    def apply(self, entries, cancel=None, progress=None):
+        # entries: (path, size) 列表；返回 {path: set(tags)}，只包含命中了规则的路径
+        result = {}
+        for n, (path, size) in enumerate(entries):
+            if n % 4096 == 0:
+                if cancel is not None and cancel():
+                    raise AutoTagCancelled()
+                if progress is not None:
+                    progress(n, len(entries))
+            tags = self.tags_for(path, size)
+            if tags:
+                result[path] = tags
+        return result
+
+    def __bool__(self):
+        return bool(self._plain or self._grams or self._always)
@@ -0,0 +1,200 @@
+# auto_tag_dialog.py - 自动打标签规则编辑对话框（保存后可在后台线程对所有已扫描视频重新应用）
+import threading
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QPushButton, QTableWidget,
+    QTableWidgetItem, QHeaderView, QMessageBox
+)
+from PyQt5.QtCore import Qt, QObject, pyqtSignal
+from PyQt5.QtGui import QFont
+from auto_tag import AutoTagger, AutoTagCancelled, RuleError, save_rules
+
+# (列标题, 规则字段)
+COLUMNS = [
+    ("启用", 'enabled'),
+    ("名称", 'name'),
+    ("路径正则", 'pattern'),
+    ("忽略大小写", 'ignore_case'),
+    ("限定文件夹", 'folder'),
+    ("扩展名", 'extensions'),
+    ("最小MB", 'min_size_mb'),
+    ("最大MB", 'max_size_mb'),
+    ("标签", 'tags'),
+]
+CHECK_FIELDS = {'enabled', 'ignore_case'}
+LIST_FIELDS = {'extensions', 'tags'}
+NUMBER_FIELDS = {'min_size_mb', 'max_size_mb'}
+
+
+def _split(text):
+    return [part.strip() for part in text.replace('，', ',').split(',') if part.strip()]
+
+
+class _ApplySignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+class AutoTagRulesDialog(QDialog):
+    # save_callback(tagger)：规则保存后替换正在使用的规则
+    # entries_callback() -> [(path, size)]：全部重新应用的范围（各文件夹的扫描索引）
+    # apply_callback(results) -> 实际改动的视频数：在界面线程写入标签
+    def __init__(self, rules, save_callback, entries_callback, apply_callback, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("自动打标签规则")
+        self.resize(1000, 520)
+        self.save_callback = save_callback
+        self.entries_callback = entries_callback
+        self.apply_callback = apply_callback
+        self._cancel = threading.Event()
+
+        layout = QVBoxLayout(self)
+        hint = QLabel("规则只会添加标签。正则匹配完整路径（分隔符为 /），扩展名与标签用逗号分隔；"
+                      "扫描时只对新发现或有变化的文件应用。")
+        hint.setWordWrap(True)
+        hint.setFont(QFont("SimHei", 10))
+        layout.addWidget(hint)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels([title for title, _ in COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setColumnWidth(2, 260)
+        self.table.setFont(QFont("SimHei", 10))
+        for rule in rules:
+            self.add_row(rule)
+        layout.addWidget(self.table, stretch=1)
+
+        self.status_label = QLabel()
+        self.status_label.setFont(QFont("SimHei", 10))
+        layout.addWidget(self.status_label)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.hide()
+        layout.addWidget(self.progress_bar)
+
+        buttons = QHBoxLayout()
+        add_btn = QPushButton("添加规则")
+        add_btn.clicked.connect(lambda: self.add_row({}))
+        buttons.addWidget(add_btn)
+        remove_btn = QPushButton("删除选中规则")
+        remove_btn.clicked.connect(self.remove_selected)
+        buttons.addWidget(remove_btn)
+        buttons.addStretch()
+        self.save_btn = QPushButton("保存")
+        self.save_btn.clicked.connect(self.save)
+        buttons.addWidget(self.save_btn)
+        self.apply_btn = QPushButton("保存并全部重新应用")
+        self.apply_btn.clicked.connect(self.save_and_apply)
+        buttons.addWidget(self.apply_btn)
+        self.cancel_btn = QPushButton("取消应用")
+        self.cancel_btn.clicked.connect(self._cancel.set)
+        self.cancel_btn.setEnabled(False)
+        buttons.addWidget(self.cancel_btn)
+        layout.addLayout(buttons)
+
+        self.signals = _ApplySignals()
+        self.signals.progress.connect(self.on_progress)
+        self.signals.finished.connect(self.on_finished)
+        self.signals.failed.connect(self.on_failed)
+
+    # === 表格与规则互转 ===
+    def add_row(self, rule):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        for column, (_, field) in enumerate(COLUMNS):
+            value = rule.get(field)
+            item = QTableWidgetItem()
+            if field in CHECK_FIELDS:
+                item.setFlags(Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsUserCheckable)
+                item.setCheckState(Qt.Checked if value is None or value else Qt.Unchecked)
+            elif field in LIST_FIELDS:
+                item.setText(", ".join(value or []))
+            else:
+                item.setText("" if value is None else str(value))
+            self.table.setItem(row, column, item)
+
+    def remove_selected(self):
+        for row in sorted({index.row() for index in self.table.selectedIndexes()}, reverse=True):
+            self.table.removeRow(row)
+
+    def rules(self):
+        rules = []
+        for row in range(self.table.rowCount()):
+            rule = {}
+            for column, (title, field) in enumerate(COLUMNS):
+                item = self.table.item(row, column)
+                if field in CHECK_FIELDS:
+                    rule[field] = item.checkState() == Qt.Checked
+                    continue
+                text = item.text().strip() if item else ""
+                if field in LIST_FIELDS:
+                    rule[field] = _split(text)
+                elif field in NUMBER_FIELDS:
+                    if text:
+                        try:
+                            rule[field] = float(text)
+                        except ValueError:
+                            raise RuleError(f"第 {row + 1} 行的“{title}”不是数字: {text}")
+                elif text:
+                    rule[field] = text
+            if rule.get('tags') and (rule.get('pattern') or rule.get('folder') or rule.get('extensions')):
+                rules.append(rule)
+        return rules
+
+    # === 保存 / 全部重新应用 ===
+    def save(self):
+        try:
+            tagger = AutoTagger(self.rules())
+        except RuleError as e:
+            QMessageBox.warning(self, "规则无效", str(e))
+            return None
+        save_rules(tagger.rules)
+        self.save_callback(tagger)
+        self.status_label.setText(f"已保存 {len(tagger.rules)} 条规则")
+        return tagger
+
+    def save_and_apply(self):
+        tagger = self.save()
+        if tagger is None or not tagger:
+            return
+        entries = self.entries_callback()
+        self._cancel.clear()
+        self.save_btn.setEnabled(False)
+        self.apply_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.progress_bar.show()
+        self.on_progress(0, len(entries))
+        threading.Thread(target=self._run, args=(tagger, entries), daemon=True, name="auto-tag").start()
+
+    def _run(self, tagger, entries):
+        try:
+            results = tagger.apply(entries, cancel=self._cancel.is_set, progress=self.signals.progress.emit)
+        except AutoTagCancelled:
+            self.signals.failed.emit("已取消")
+        except Exception as e:
+            self.signals.failed.emit(f"应用失败: {e}")
+        else:
+            self.signals.finished.emit(results)
+
+    def on_progress(self, done, total):
+        self.status_label.setText(f"正在应用规则: {done}/{total}")
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def _finish(self, message):
+        self.save_btn.setEnabled(True)
+        self.apply_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.progress_bar.hide()
+        self.status_label.setText(message)
+
+    def on_finished(self, results):
+        changed = self.apply_callback(results)
+        self._finish(f"规则命中 {len(results)} 个视频，新增标签的视频 {changed} 个")
+
+    def on_failed(self, message):
+        self._finish(message)
+
+    def reject(self):
+        self._cancel.set()
+        super().reject()
@@ -1,80 +1,621 @@
-# data_manager.py - 负责所有数据的加载与保存
-import os
-import json
-from pathlib import Path
-
-SAVE_DIR = "Save"
-FOLDERS_FILE = os.path.join(SAVE_DIR, "FolderPath.json")
-LABELS_FILE = os.path.join(SAVE_DIR, "AllMoviesLabel.json")
-ALL_TAGS_FILE = os.path.join(SAVE_DIR, "AllKnownTags.json")
-
-os.makedirs(SAVE_DIR, exist_ok=True)
-
-class DataManager:
-    def __init__(self):
-        self.folders = []
-        self.all_videos_info = {}
-        self.all_known_tags = set()
-        self.load_all()
-
-    def load_all(self):
-        self.load_folders()
-        self.load_labels()
-        self.load_all_known_tags()
-
-    def load_folders(self):
-        self.folders = []
-        try:
-            if os.path.exists(FOLDERS_FILE):
-                with open(FOLDERS_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    folders = data.get("folders", [])
-                    for f in folders:
-                        if os.path.exists(f):
-                            self.folders.append(os.path.normpath(f))
-        except Exception as e:
-            print(f"[Data Load Error] 读取 {FOLDERS_XFILE} 出错: {e}")
-
-    def save_folders(self, folders):
-        try:
-            with open(FOLDERS_FILE, 'w', encoding='utf-8') as f:
-                json.dump({"folders": folders}, f, indent=4, ensure_ascii=False)
-            print(f"[Data Save] 已保存文件夹列表到 {FOLDERS_FILE}")
-        except Exception as e:
-            print(f"[Data Save Error] 保存 {FOLDERS_FILE} 出错: {e}")
-
-    def load_labels(self):
-        self.all_videos_info = {}
-        try:
-            if os.path.exists(LABELS_FILE):
-                with open(LABELS_FILE, 'r', encoding='utf-8') as f:
-                    self.all_videos_info = json.load(f)
-                for info in self.all_videos_info.values():
-                    self.all_known_tags.update(info.get('tags', []))
-        except Exception as e:
-            print(f"[Data Load Error] 读取 {LABELS_FILE} 出错: {e}")
-
-    def save_labels(self, all_videos_info):
-        try:
-            with open(LABELS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(all_videos_info, f, indent=4, ensure_ascii=False)
-            print(f"[Data Save] 已保存视频标签到 {LABELS_FILE}")
-        except Exception as e:
-            print(f"[Data Save Error] 保存 {LABELS_FILE} 出错: {e}")
-
-    def load_all_known_tags(self):
-        try:
-            if os.path.exists(ALL_TAGS_FILE):
-                with open(ALL_TAGS_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.all_known_tags = set(data.get("tags", []))
-        except Exception as e:
-            print(f"[Data Load Error] 读取 {ALL_TAGS_FILE} 出错: {e}")
-
-    def save_all_known_tags(self, tags_set):
-        try:
-            with open(ALL_TAGS_FILE, 'w', encoding='utf-8') as f:
-                json.dump({"tags": list(tags_set)}, f, indent=4, ensure_ascii=False)
-            print(f"[Data Save] 已保存全局标签到 {ALL_TAGS_FILE}")
-        except Exception as e:
-            print(f"[Data Save Error] 保存 {ALL_TAGS_FILE} 出错: {e}")
\ No newline at end of file
+# data_manager.py - 负责所有数据的加载与保存
+import os
+import json
+from pathlib import Path
+from contextlib import contextmanager
+from tag_index import TagIndex
+from tag_hierarchy import TagHierarchy
+from label_store import write_json_atomic
+from label_shards import ShardedLabelStore, MANIFEST_FILE
+from scan_index import ScanIndex, ScanIndexRegistry
+from auto_tag import AutoTagger, RuleError
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+FOLDERS_FILE = os.path.join(SAVE_DIR, "FolderPath.json")
+# 旧版的单文件标签存储，首次启动时迁移到按文件夹分片的存储（label_shards.py）
+LABELS_FILE = os.path.join(SAVE_DIR, "AllMoviesLabel.json")
+ALL_TAGS_FILE = os.path.join(SAVE_DIR, "AllKnownTags.json")
+
+os.makedirs(SAVE_DIR, exist_ok=True)
+
+
+def merge_label_records(base, local, remote):
+    # 三方合并：把本地相对 base 的标签增删重放到远端最新记录上
+    if remote is None or local is None:
+        return local if remote is None else remote
+    base_tags = set((base or {}).get('tags', []))
+    local_tags = local.get('tags', [])
+    removed = base_tags.difference(local_tags)
+    merged = dict(remote)
+    tags = [t for t in remote.get('tags', []) if t not in removed]
+    tags += [t for t in local_tags if t not in base_tags and t not in tags]
+    merged['tags'] = tags
+    return merged
+
+
+class DataManager:
+    def __init__(self):
+        self.folders = []
+        self.all_known_tags = set()
+        self.tag_hierarchy = TagHierarchy()
+        self.tag_hierarchy.load()
+        # 索引只包含已加载分片中的视频
+        self.tag_index = TagIndex(self.tag_hierarchy)
+        self.labels = ShardedLabelStore(on_load=self._index_shard, on_evict=self._unindex_shard)
+        self.scan_indexes = ScanIndexRegistry(on_delta=self._on_scan_delta)
+        try:
+            self.auto_tagger = AutoTagger()
+        except RuleError as e:
+            log.error("自动打标签规则无效，已停用: %s", e)
+            self.auto_tagger = AutoTagger([])
+        self._known_added = set()
+        self._known_removed = set()
+        self._known_tags_mtime = None
+        self._tag_listeners = []
+        self._scan_listeners = []
+        # on_io_error(root)：访问文件夹出错（可能已掉线）时调用，由主窗口交给可用性检测
+        self.on_io_error = None
+        self._batch_depth = 0
+        self._labels_dirty = False
+        self._tags_dirty = False
+        self.load_all()
+
+    def load_all(self):
+        self.load_folders()
+        self.load_labels()
+        self.load_all_known_tags()
+
+    def load_folders(self):
+        # 不在这里检查文件夹是否存在：离线的网络盘/移动硬盘会阻塞启动，
+        # 且不能因为暂时不可用就从列表中丢弃，可用性由 FolderHealthMonitor 异步检测
+        self.folders = []
+        try:
+            if os.path.exists(FOLDERS_FILE):
+                with open(FOLDERS_FILE, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                    for folder in data.get("folders", []):
+                        folder = os.path.normpath(folder)
+                        if folder not in self.folders:
+                            self.folders.append(folder)
+        except Exception as e:
+            log.error("读取 %s 出错: %s", FOLDERS_FILE, e)
+        self.labels.set_roots(self.folders)
+
+    def save_folders(self, folders):
+        self.labels.set_roots(folders)
+        try:
+            with open(FOLDERS_FILE, 'w', encoding='utf-8') as f:
+                json.dump({"folders": folders}, f, indent=4, ensure_ascii=False)
+            log.debug("已保存文件夹列表到 %s", FOLDERS_FILE)
+        except Exception as e:
+            log.error("保存 %s 出错: %s", FOLDERS_FILE, e)
+
+    def load_labels(self):
+        # 启动时只读取分片清单，分片本身在打开/查询对应文件夹时才加载
+        try:
+            if not os.path.exists(MANIFEST_FILE) and os.path.exists(LABELS_FILE):
+                self._migrate_labels()
+            self.labels.load_manifest()
+            self.labels.set_roots(self.folders)
+        except Exception as e:
+            log.error("读取 %s 出错: %s", MANIFEST_FILE, e)
+        self.all_known_tags.update(self.labels.all_tags())
+
+    def _migrate_labels(self):
+        # 记录可能以注册路径或扫描时解析出的真实路径为键，两种前缀都归入同一分片
+        roots = {}
+        for folder in self.folders:
+            index = ScanIndex(folder)
+            index.load()
+            roots[folder] = list(dict.fromkeys(p for p in (index.scan_root, folder) if p))
+        if self.labels.migrate(LABELS_FILE, roots):
+            log.info("已将 %s 按文件夹拆分到 %s", LABELS_FILE, MANIFEST_FILE)
+
+    def _index_shard(self, shard):
+        for rel, info in shard.store.records.items():
+            self.tag_index.add(shard.abs(rel), info.get('tags', []))
+
+    def _unindex_shard(self, shard):
+        for rel, info in shard.store.records.items():
+            self.tag_index.remove(shard.abs(rel), info.get('tags', []))
+
+    def open_folder(self, root, base=None):
+        # 浏览某个文件夹前加载它（以及嵌套在其中的注册文件夹）的分片，并保持它们常驻
+        if base and base != root:
+            self.labels.rebase(root, base)
+        roots = self.labels.nested_roots(root) or [root]
+        self.labels.pinned = set(roots)
+        for r in roots:
+            self.labels.shard(r)
+        self.labels.evict()
+
+    def open_roots(self, roots):
+        # 同时浏览多个文件夹中的视频（智能文件夹）：这些分片都保持常驻
+        pinned = set()
+        for root in roots:
+            pinned.update(self.labels.nested_roots(root) or [root])
+        self.labels.pinned = pinned
+        for r in pinned:
+            self.labels.shard(r)
+        self.labels.evict()
+
+    def close_folder(self):
+        self.labels.pinned = set()
+        self.labels.evict()
+
+    def save_labels(self):
+        # 只提交本进程改动过的记录；其他进程并发修改的记录做三方合并
+        for shard in self.labels.dirty_shards():
+            try:
+                changes = self.labels.commit(shard, merge=merge_label_records)
+                self._apply_store_changes(shard, changes)
+                log.debug("已保存视频标签到 %s", shard.store.snapshot_file)
+            except Exception as e:
+                log.error("保存 %s 出错: %s", shard.store.snapshot_file, e)
+        self.labels.evict()
+
+    # === 侧车副本：标签随文件夹一起保存 ===
+    def set_sidecar(self, root, enabled):
+        self.labels.set_sidecar(root, enabled)
+        if enabled:
+            self.labels.shard(root)
+            self.sync_sidecar(root)
+
+    def sync_sidecar(self, root):
+        # 文件夹在线时调用：先导入别处写入的较新记录，再把本地修改导出
+        try:
+            shard, changes = self.labels.import_sidecar(root, merge_label_records)
+            changed = set()
+            if changes:
+                changed = self._apply_store_changes(shard, changes)
+                new_tags = {t for _, _, new in changes for t in new.get('tags', [])} - self.all_known_tags
+                for tag in new_tags:
+                    self._add_known(tag)
+                self._mark_dirty(labels=True, tags=bool(new_tags))
+            self.labels.export_sidecar(root)
+            return changed
+        except Exception as e:
+            log.error("同步 %s 出错: %s", self.labels.sidecar_file(root), e)
+            self._report_io_error(root, e)
+            return set()
+
+    def export_sidecars(self, is_online):
+        # 退出前调用：把已加载分片中尚未导出的修改写入各自在线文件夹的侧车副本
+        self.flush()
+        for root in list(self.labels.loaded):
+            if root and is_online(root):
+                try:
+                    self.labels.export_sidecar(root)
+                except Exception as e:
+                    log.error("保存 %s 出错: %s", self.labels.sidecar_file(root), e)
+                    self._report_io_error(root, e)
+
+    def _report_io_error(self, root, error):
+        if isinstance(error, OSError) and self.on_io_error is not None:
+            self.on_io_error(root)
+
+    def load_all_known_tags(self):
+        try:
+            tags = self._read_known_tags()
+            if tags is not None:
+                self.all_known_tags = tags
+        except Exception as e:
+            log.error("读取 %s 出错: %s", ALL_TAGS_FILE, e)
+
+    def _read_known_tags(self):
+        if not os.path.exists(ALL_TAGS_FILE):
+            return None
+        self._known_tags_mtime = os.path.getmtime(ALL_TAGS_FILE)
+        with open(ALL_TAGS_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return (set(data.get("tags", [])) - self._known_removed) | self._known_added
+
+    def save_all_known_tags(self):
+        # 在锁内读取最新文件，只应用本进程的增删，避免覆盖其他进程新加的标签
+        try:
+            with self.labels.lock:
+                on_disk = self._read_known_tags()
+                if on_disk is not None:
+                    self.all_known_tags = on_disk
+                write_json_atomic(ALL_TAGS_FILE, {"tags": list(self.all_known_tags)}, indent=4)
+                self._known_tags_mtime = os.path.getmtime(ALL_TAGS_FILE)
+            self._known_added.clear()
+            self._known_removed.clear()
+            log.debug("已保存全局标签到 %s", ALL_TAGS_FILE)
+        except Exception as e:
+            log.error("保存 %s 出错: %s", ALL_TAGS_FILE, e)
+
+    # === 与其他进程同步：只合并已加载分片的增量，不重新读取整个存储 ===
+    def sync(self):
+        changed = set()
+        for shard in list(self.labels.loaded.values()):
+            try:
+                changes = shard.store.poll()
+            except Exception as e:
+                log.error("同步 %s 出错: %s", shard.store.snapshot_file, e)
+                continue
+            changed |= self._apply_store_changes(shard, changes)
+        tags_changed = False
+        if self.tag_hierarchy.changed_on_disk():
+            self.tag_hierarchy.load()
+            self.tag_index.rebuild_under()
+            tags_changed = True
+        try:
+            if os.path.exists(ALL_TAGS_FILE) and os.path.getmtime(ALL_TAGS_FILE) != self._known_tags_mtime:
+                tags = self._read_known_tags()
+                tags_changed = tags_changed or tags != self.all_known_tags
+                self.all_known_tags = tags
+        except Exception as e:
+            log.error("同步 %s 出错: %s", ALL_TAGS_FILE, e)
+        return changed, tags_changed
+
+    def _apply_store_changes(self, shard, changes):
+        changed = set()
+        for rel, old, new in changes:
+            path = shard.abs(rel)
+            old_tags = (old or {}).get('tags', [])
+            new_tags = (new or {}).get('tags', [])
+            self.tag_index.remove(path, old_tags)
+            self.tag_index.add(path, new_tags)
+            shard.count_tags(old_tags, new_tags)
+            self._notify_tags(path, old_tags, new_tags)
+            changed.add(path)
+        return changed
+
+    # === 自动打标签：扫描只把新发现/有变化的文件交给规则，全部重新应用由界面在后台线程计算 ===
+    def _on_scan_delta(self, index, added, removed, changed):
+        # 先应用自动打标签，监听者（智能文件夹）看到的是打好标签之后的状态
+        self._auto_tag_delta(index, added, changed)
+        for callback in self._scan_listeners:
+            callback(index, added, removed, changed)
+
+    def _auto_tag_delta(self, index, added, changed):
+        if not self.auto_tagger or not (added or changed):
+            return
+        if index.scan_root and index.scan_root != index.root:
+            self.labels.rebase(index.root, index.scan_root)
+        entries = []
+        for path in added | changed:
+            stat = index.stat_of(path)
+            entries.append((path, stat[0] if stat else None))
+        try:
+            self.apply_auto_tags(self.auto_tagger.apply(entries))
+        except Exception as e:
+            log.error("自动打标签出错 %s: %s", index.root, e)
+
+    def apply_auto_tags(self, results):
+        # results: {path: set(tags)}；相同标签组合的路径一起添加，整体只落盘一次
+        groups = {}
+        for path, tags in results.items():
+            groups.setdefault(frozenset(tags), []).append(path)
+        changed = set()
+        with self.batch():
+            for tags, paths in groups.items():
+                changed |= self.add_tags(paths, sorted(tags))
+                for tag in tags:
+                    self.add_known_tag(tag)
+        if changed:
+            log.info("自动打标签: %d 个视频", len(changed))
+        return changed
+
+    # === 批量标签操作：只改动受影响的记录，整批结束后统一落盘一次 ===
+    @contextmanager
+    def batch(self):
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
+
+    def flush(self):
+        if self._labels_dirty:
+            self._labels_dirty = False
+            self.save_labels()
+        if self._tags_dirty:
+            self._tags_dirty = False
+            self.save_all_known_tags()
+
+    def _mark_dirty(self, labels=False, tags=False):
+        self._labels_dirty = self._labels_dirty or labels
+        self._tags_dirty = self._tags_dirty or tags
+        if self._batch_depth == 0:
+            self.flush()
+
+    def stat_of(self, path):
+        # 扫描索引中缓存的 (size, mtime_ns)；不在任何已注册文件夹中时返回 None
+        root = self.labels.root_for(path)
+        if root not in self.folders:
+            return None
+        return self.scan_indexes.get(root).stat_of(path)
+
+    def get_tags(self, path):
+        shard = self.labels.shard_for(path)
+        return shard.store.records.get(shard.rel(path), {}).get('tags', [])
+
+    def add_known_tag(self, tag):
+        if tag in self.all_known_tags:
+            return False
+        self._add_known(tag)
+        self._mark_dirty(tags=True)
+        return True
+
+    def _load_shards_for(self, paths):
+        # 索引只覆盖已加载分片，按路径批量操作前先确保对应分片已加载
+        for root in {self.labels.root_for(path) for path in paths}:
+            self.labels.shard(root)
+
+    def add_tags(self, paths, tags):
+        tags = list(dict.fromkeys(tags))
+        changed = set()
+        self._load_shards_for(paths)
+        for path in paths:
+            missing = [t for t in tags if not self.tag_index.has(path, t)]
+            if missing:
+                self._update_tags(path, add=missing)
+                changed.add(path)
+        if changed:
+            self._mark_dirty(labels=True)
+        return changed
+
+    def remove_tags(self, paths, tags):
+        hits = {}
+        self._load_shards_for(paths)
+        for tag in set(tags):
+            # 只遍历 (选中路径 ∩ 含该标签的路径)
+            for path in self.tag_index.paths_with(tag).intersection(paths):
+                hits.setdefault(path, set()).add(tag)
+        for path, drop in hits.items():
+            self._update_tags(path, remove=drop)
+        if hits:
+            self._mark_dirty(labels=True)
+        return set(hits)
+
+    def _load_shards_with(self, tag):
+        # 清单记录了每个分片的标签计数，只加载含有该标签的分片
+        for root in self.labels.roots_with_tag(tag):
+            self.labels.shard(root)
+
+    # === 标签层级：移动/改名/删除只调整受影响的子树与视频 ===
+    def set_tag_parent(self, tag, parent):
+        # parent 为 None 表示移到顶层；形成环时抛出 TagHierarchyError
+        self._move_tag(tag, parent)
+        self._add_known(tag)
+        if parent is not None:
+            self._add_known(parent)
+        self.tag_hierarchy.save()
+        self._mark_dirty(tags=True)
+
+    def _move_tag(self, tag, parent):
+        subtree, old_up, new_up = self.tag_hierarchy.set_parent(tag, parent)
+        if old_up != new_up:
+            self.tag_index.move_subtree(subtree, old_up, new_up)
+
+    def rename_tag(self, old_tag, new_tag):
+        # 新名字接替旧标签在层级中的位置，子标签改挂到新名字下；新名字已存在时合并
+        if old_tag == new_tag:
+            return set()
+        hierarchy = self.tag_hierarchy
+        structural = old_tag in hierarchy
+        if structural:
+            if new_tag in hierarchy.descendants(old_tag):
+                raise ValueError(f"不能把 '{old_tag}' 合并到它的子标签 '{new_tag}'")
+            if new_tag not in hierarchy:
+                self._move_tag(new_tag, hierarchy.parent_of(old_tag))
+            for child in list(hierarchy.children_of(old_tag)):
+                self._move_tag(child, new_tag)
+        self._load_shards_with(old_tag)
+        affected = set(self.tag_index.paths_with(old_tag))
+        for path in affected:
+            self._update_tags(path, add=[new_tag], remove={old_tag})
+        if structural:
+            self._move_tag(old_tag, None)
+            hierarchy.drop(old_tag)
+            self.tag_index.forget_tags([old_tag])
+            hierarchy.save()
+        self._discard_known(old_tag)
+        self._add_known(new_tag)
+        self._mark_dirty(labels=bool(affected), tags=True)
+        return affected
+
+    def delete_tag(self, tag, with_children=False):
+        # with_children 为 False 时子标签移到上一级；为 True 时整棵子树一起删除
+        hierarchy = self.tag_hierarchy
+        structural = tag in hierarchy
+        if with_children:
+            doomed = hierarchy.subtree(tag)
+        else:
+            doomed = {tag}
+            for child in list(hierarchy.children_of(tag)):
+                self._move_tag(child, hierarchy.parent_of(tag))
+        affected = set()
+        for t in doomed:
+            self._load_shards_with(t)
+            affected.update(self.tag_index.paths_with(t))
+        for path in affected:
+            self._update_tags(path, remove=doomed)
+        if structural:
+            self._move_tag(tag, None)
+            hierarchy.drop(tag)
+            self.tag_index.forget_tags(doomed)
+            hierarchy.save()
+        for t in doomed:
+            self._discard_known(t)
+        self._mark_dirty(labels=bool(affected), tags=True)
+        return affected
+
+    # === 程序内批量移动/重命名：标签记录与扫描索引条目改用新路径，整批只落盘一次 ===
+    def move_paths(self, mapping):
+        # mapping: {原路径: 新路径}，文件已在磁盘上移动完成；先改扫描索引，监听者看到的是移动之后的状态
+        indexes = set()
+        for src, dst in mapping.items():
+            stat = None
+            for index in self._indexes_containing(src):
+                stat = index.pop_file(src) or stat
+                indexes.add(index)
+            if stat is not None:
+                for index in self._indexes_containing(dst):
+                    if index.put_file(dst, stat):
+                        indexes.add(index)
+        self._load_shards_for(list(mapping) + list(mapping.values()))
+        with self.batch():
+            moved = 0
+            for src, dst in mapping.items():
+                src_shard = self.labels.shard_for(src)
+                rel = src_shard.rel(src)
+                info = src_shard.store.records.get(rel)
+                if info is None:
+                    continue
+                tags = info.get('tags', [])
+                src_shard.store.touch(rel)
+                del src_shard.store.records[rel]
+                src_shard.count_tags(tags, ())
+                self.tag_index.remove(src, tags)
+                self._notify_tags(src, tags, [])
+                dst_shard = self.labels.shard_for(dst)
+                dst_rel = dst_shard.rel(dst)
+                dst_shard.store.touch(dst_rel)
+                old = dst_shard.store.records.get(dst_rel, {}).get('tags', [])
+                record = {k: v for k, v in info.items() if k != 'version'}
+                record['tags'] = old + [t for t in tags if t not in old]
+                dst_shard.store.records[dst_rel] = record
+                dst_shard.count_tags(old, record['tags'])
+                self.tag_index.remove(dst, old)
+                self.tag_index.add(dst, record['tags'])
+                self._notify_tags(dst, old, record['tags'])
+                moved += 1
+            if moved:
+                self._mark_dirty(labels=True)
+        for index in indexes:
+            index.save()
+        log.info("移动/重命名: %d 个文件，其中 %d 个带标签", len(mapping), moved)
+
+    def _indexes_containing(self, path):
+        # 嵌套注册时外层文件夹的索引也列出了这个文件
+        deepest = self.labels.root_for(path)
+        for root in self.folders:
+            if root == deepest or deepest.startswith(root + os.sep):
+                yield self.scan_indexes.get(root)
+
+    # === 查询与批量修改（本地 API 使用，均在界面线程调用）===
+    def query_videos(self, tags=(), folder=None):
+        # 已扫描视频中同时含有 tags 的条目，按文件夹注册顺序、路径排序：[(path, size, mtime_ns, tags)]
+        if folder is not None and folder not in self.folders:
+            raise ValueError(f"未注册的文件夹: {folder}")
+        wanted = None
+        if tags:
+            # 父标签匹配其任一子孙标签
+            for tag in tags:
+                for t in self.tag_hierarchy.subtree(tag):
+                    self._load_shards_with(t)
+            wanted = self.tag_index.match_all(tags)
+        rows = []
+        for root in [folder] if folder is not None else self.folders:
+            table = self.scan_indexes.get(root).table()
+            for path, size, mtime in sorted(zip(table.paths, table.sizes, table.mtimes)):
+                if wanted is None or path in wanted:
+                    rows.append((path, size, mtime, list(self.get_tags(path))))
+        self.labels.evict()
+        return rows
+
+    def apply_tag_ops(self, ops):
+        # ops: [{"op": "add"|"remove", "paths": [...], "tags": [...]} | {"op": "rename", "from", "to"}
+        #       | {"op": "delete", "tag"}]，整批只落盘一次；返回标签有变化的视频。
+        # 先按顺序检查整批操作，任何一步会失败时抛出 ValueError，一条都不执行
+        self.check_tag_ops(ops)
+        changed = set()
+        with self.batch():
+            for op in ops:
+                kind = op['op']
+                if kind == 'add':
+                    changed |= self.add_tags(op['paths'], op['tags'])
+                    for tag in op['tags']:
+                        self.add_known_tag(tag)
+                elif kind == 'remove':
+                    changed |= self.remove_tags(op['paths'], op['tags'])
+                elif kind == 'rename':
+                    changed |= self.rename_tag(op['from'], op['to'])
+                elif kind == 'delete':
+                    changed |= self.delete_tag(op['tag'])
+        return changed
+
+    def check_tag_ops(self, ops):
+        # 在层级的副本上模拟 rename / delete 对父子关系的影响（与 rename_tag / delete_tag 一致）
+        parent = dict(self.tag_hierarchy.parent)
+
+        def below(tag):
+            result = set()
+            for t in parent:
+                p, seen = parent.get(t), {t}
+                while p is not None and p not in seen:
+                    if p == tag:
+                        result.add(t)
+                        break
+                    seen.add(p)
+                    p = parent.get(p)
+            return result
+
+        def reparent_children(tag, new_parent):
+            for t, p in list(parent.items()):
+                if p == tag:
+                    if new_parent is None:
+                        del parent[t]
+                    else:
+                        parent[t] = new_parent
+
+        for i, op in enumerate(ops):
+            if op['op'] == 'rename':
+                old, new = op['from'], op['to']
+                if old == new:
+                    raise ValueError(f"ops[{i}]: 新旧标签名相同: '{old}'")
+                if old not in parent and old not in parent.values():
+                    continue
+                if new in below(old):
+                    raise ValueError(f"ops[{i}]: 不能把 '{old}' 合并到它的子标签 '{new}'")
+                if new not in parent and new not in parent.values() and old in parent:
+                    parent[new] = parent[old]
+                reparent_children(old, new)
+                parent.pop(old, None)
+            elif op['op'] == 'delete':
+                reparent_children(op['tag'], parent.pop(op['tag'], None))
+
+    def _add_known(self, tag):
+        self.all_known_tags.add(tag)
+        self._known_added.add(tag)
+        self._known_removed.discard(tag)
+
+    def _discard_known(self, tag):
+        self.all_known_tags.discard(tag)
+        self._known_removed.add(tag)
+        self._known_added.discard(tag)
+
+    def _update_tags(self, path, add=(), remove=()):
+        # 单条记录的标签增删：登记待提交记录、更新索引并通知监听者
+        shard = self.labels.shard_for(path)
+        rel = shard.rel(path)
+        shard.store.touch(rel)
+        info = shard.store.records.setdefault(rel, {'tags': []})
+        old = info.get('tags', [])
+        new = [t for t in old if t not in remove]
+        new += [t for t in add if t not in new]
+        info['tags'] = new
+        shard.count_tags(old, new)
+        self.tag_index.remove(path, [t for t in old if t in remove])
+        self.tag_index.add(path, [t for t in new if t not in old])
+        self._notify_tags(path, old, new)
+
+    # === 标签变更监听：callback(path, old_tags, new_tags) ===
+    def add_tag_listener(self, callback):
+        self._tag_listeners.append(callback)
+
+    # === 扫描变化监听：callback(index, added, removed, changed) ===
+    def add_scan_listener(self, callback):
+        self._scan_listeners.append(callback)
+
+    def _notify_tags(self, path, old_tags, new_tags):
+        for callback in self._tag_listeners:
+            callback(path, old_tags, new_tags)
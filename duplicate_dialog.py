@@ -0,0 +1,129 @@
+# duplicate_dialog.py - 重复视频查找对话框（后台线程运行检测，可取消）
+import os
+import threading
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QPushButton, QTreeWidget,
+    QTreeWidgetItem, QMessageBox
+)
+from PyQt5.QtCore import Qt, QObject, pyqtSignal
+from PyQt5.QtGui import QFont
+from duplicate_finder import (
+    DuplicateFinder, DuplicateSearchCancelled, STAGE_SIZE, STAGE_PARTIAL, STAGE_FULL
+)
+
+STAGE_TEXT = {
+    STAGE_SIZE: "按文件大小分组",
+    STAGE_PARTIAL: "抽样比对",
+    STAGE_FULL: "完整哈希",
+}
+
+
+class _FinderSignals(QObject):
+    progress = pyqtSignal(str, int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+class DuplicatesDialog(QDialog):
+    def __init__(self, entries, merge_callback, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("查找重复视频")
+        self.resize(700, 500)
+        self.entries = entries
+        self.merge_callback = merge_callback
+        self.groups = []
+        self._cancel = threading.Event()
+
+        layout = QVBoxLayout(self)
+        self.stage_label = QLabel("准备中…")
+        self.stage_label.setFont(QFont("SimHei", 11))
+        layout.addWidget(self.stage_label)
+        self.progress_bar = QProgressBar()
+        layout.addWidget(self.progress_bar)
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderHidden(True)
+        self.tree.setFont(QFont("SimHei", 11))
+        layout.addWidget(self.tree, stretch=1)
+
+        buttons = QHBoxLayout()
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.clicked.connect(self.cancel_search)
+        buttons.addWidget(self.cancel_btn)
+        buttons.addStretch()
+        self.merge_selected_btn = QPushButton("合并选中组的标签与播放进度")
+        self.merge_selected_btn.clicked.connect(self.merge_selected)
+        self.merge_selected_btn.setEnabled(False)
+        buttons.addWidget(self.merge_selected_btn)
+        self.merge_all_btn = QPushButton("全部合并")
+        self.merge_all_btn.clicked.connect(self.merge_all)
+        self.merge_all_btn.setEnabled(False)
+        buttons.addWidget(self.merge_all_btn)
+        layout.addLayout(buttons)
+
+        self.signals = _FinderSignals()
+        self.signals.progress.connect(self.on_progress)
+        self.signals.finished.connect(self.on_finished)
+        self.signals.failed.connect(self.on_failed)
+        threading.Thread(target=self._run, daemon=True, name="duplicate-finder").start()
+
+    def _run(self):
+        try:
+            groups = DuplicateFinder().find(
+                self.entries,
+                progress=self.signals.progress.emit,
+                cancel=self._cancel.is_set,
+            )
+        except DuplicateSearchCancelled:
+            self.signals.failed.emit("已取消")
+        except Exception as e:
+            self.signals.failed.emit(f"检测失败: {e}")
+        else:
+            self.signals.finished.emit(groups)
+
+    def on_progress(self, stage, done, total):
+        self.stage_label.setText(f"{STAGE_TEXT.get(stage, stage)}: {done}/{total}")
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def on_finished(self, groups):
+        self.groups = groups
+        self.cancel_btn.setEnabled(False)
+        self.stage_label.setText(f"共找到 {len(groups)} 组重复视频")
+        self.tree.clear()
+        for i, group in enumerate(groups):
+            root = QTreeWidgetItem([f"第 {i + 1} 组（{len(group)} 个副本）: {os.path.basename(group[0])}"])
+            root.setData(0, Qt.UserRole, i)
+            for path in group:
+                child = QTreeWidgetItem([path])
+                child.setData(0, Qt.UserRole, i)
+                root.addChild(child)
+            self.tree.addTopLevelItem(root)
+            root.setExpanded(True)
+        self.merge_selected_btn.setEnabled(bool(groups))
+        self.merge_all_btn.setEnabled(bool(groups))
+
+    def on_failed(self, message):
+        self.cancel_btn.setEnabled(False)
+        self.stage_label.setText(message)
+
+    def cancel_search(self):
+        self._cancel.set()
+        self.cancel_btn.setEnabled(False)
+
+    def merge_selected(self):
+        indexes = {item.data(0, Qt.UserRole) for item in self.tree.selectedItems()}
+        self._merge([self.groups[i] for i in sorted(indexes)])
+
+    def merge_all(self):
+        self._merge(self.groups)
+
+    def _merge(self, groups):
+        if not groups:
+            return
+        self.merge_callback(groups)
+        QMessageBox.information(self, "合并完成", f"已合并 {len(groups)} 组重复视频的标签与播放进度。")
+
+    def reject(self):
+        self._cancel.set()
+        super().reject()
@@ -0,0 +1,177 @@
+# duplicate_finder.py - 重复视频检测：按大小分桶 -> 抽样哈希(mmap) -> 完整哈希(进程池)
+#
+# 本模块不依赖 Qt，完整哈希在子进程中执行，进度与取消通过回调传入。
+import os
+import json
+import mmap
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+HASH_CACHE_FILE = os.path.join(SAVE_DIR, "HashCache.json")
+
+SAMPLE_SIZE = 64 * 1024
+# 等待完整哈希结果时检查取消的间隔（秒）：单个大文件可能要读很久
+CANCEL_POLL = 0.2
+FULL_HASH_CHUNK = 1024 * 1024
+
+STAGE_SIZE = "size"
+STAGE_PARTIAL = "partial"
+STAGE_FULL = "full"
+
+
+class DuplicateSearchCancelled(Exception):
+    pass
+
+
+def partial_hash(path, size):
+    # 取开头、中间、结尾三段样本；小文件直接整体哈希
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(size).encode('ascii'))
+    with open(path, 'rb') as f:
+        if size <= SAMPLE_SIZE * 3:
+            h.update(f.read())
+            return h.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            for offset in (0, size // 2 - SAMPLE_SIZE // 2, size - SAMPLE_SIZE):
+                h.update(m[offset:offset + SAMPLE_SIZE])
+    return h.hexdigest()
+
+
+def full_hash(path):
+    # 在子进程中执行
+    h = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(FULL_HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return path, h.hexdigest()
+
+
+class HashCache:
+    # path -> {"size", "mtime", "partial", "full"}；大小或修改时间变化即视为失效
+    def __init__(self):
+        self.entries = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        try:
+            if os.path.exists(HASH_CACHE_FILE):
+                with open(HASH_CACHE_FILE, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+        except Exception as e:
+            log.error("读取 %s 出错: %s", HASH_CACHE_FILE, e)
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            write_json_atomic(HASH_CACHE_FILE, self.entries)
+            self.dirty = False
+        except Exception as e:
+            log.error("保存 %s 出错: %s", HASH_CACHE_FILE, e)
+
+    def get(self, path, size, mtime, kind):
+        entry = self.entries.get(path)
+        if entry and entry['size'] == size and entry['mtime'] == mtime:
+            return entry.get(kind)
+        return None
+
+    def put(self, path, size, mtime, kind, value):
+        entry = self.entries.get(path)
+        if not entry or entry['size'] != size or entry['mtime'] != mtime:
+            entry = {'size': size, 'mtime': mtime}
+            self.entries[path] = entry
+        entry[kind] = value
+        self.dirty = True
+
+
+class DuplicateFinder:
+    def __init__(self, cache=None, max_workers=None):
+        self.cache = cache if cache is not None else HashCache()
+        self.max_workers = max_workers
+
+    def find(self, entries, progress=None, cancel=None):
+        # entries: [(path, size, mtime_ns)]；返回 [[path, ...], ...]，每组内容完全相同
+        progress = progress or (lambda stage, done, total: None)
+        cancel = cancel or (lambda: False)
+        try:
+            groups = self._bucket_by_size(entries, progress)
+            groups = self._refine(groups, STAGE_PARTIAL, progress, cancel)
+            groups = self._refine(groups, STAGE_FULL, progress, cancel)
+        finally:
+            self.cache.save()
+        return sorted((sorted(entry[0] for entry in group) for group in groups), key=lambda g: g[0])
+
+    def _bucket_by_size(self, entries, progress):
+        buckets = {}
+        for entry in entries:
+            buckets.setdefault(entry[1], []).append(entry)
+        progress(STAGE_SIZE, len(entries), len(entries))
+        return [group for size, group in buckets.items() if len(group) > 1 and size > 0]
+
+    def _refine(self, groups, kind, progress, cancel):
+        # 对每组候选计算哈希（先查缓存），再按哈希拆分，只保留仍有多个成员的组
+        todo = [e for group in groups for e in group if self.cache.get(*e, kind) is None]
+        total = len(todo)
+        progress(kind, 0, total)
+        if todo:
+            if kind == STAGE_PARTIAL:
+                self._partial_hashes(todo, progress, cancel)
+            else:
+                self._full_hashes(todo, progress, cancel)
+        refined = []
+        for group in groups:
+            by_hash = {}
+            for entry in group:
+                digest = self.cache.get(*entry, kind)
+                if digest is not None:
+                    by_hash.setdefault(digest, []).append(entry)
+            refined.extend(g for g in by_hash.values() if len(g) > 1)
+        return refined
+
+    def _partial_hashes(self, todo, progress, cancel):
+        for done, (path, size, mtime) in enumerate(todo, 1):
+            if cancel():
+                raise DuplicateSearchCancelled()
+            try:
+                self.cache.put(path, size, mtime, STAGE_PARTIAL, partial_hash(path, size))
+            except (OSError, ValueError) as e:
+                log.warning("读取 %s 失败: %s", path, e)
+            progress(STAGE_PARTIAL, done, len(todo))
+
+    def _full_hashes(self, todo, progress, cancel):
+        stats = {path: (size, mtime) for path, size, mtime in todo}
+        executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        cancelled = False
+        pending = set()
+        try:
+            pending = {executor.submit(full_hash, path) for path in stats}
+            done = 0
+            while pending:
+                finished, pending = wait(pending, timeout=CANCEL_POLL, return_when=FIRST_COMPLETED)
+                if cancel():
+                    cancelled = True
+                    raise DuplicateSearchCancelled()
+                for future in finished:
+                    done += 1
+                    try:
+                        path, digest = future.result()
+                    except OSError as e:
+                        log.warning("完整哈希失败: %s", e)
+                    else:
+                        size, mtime = stats[path]
+                        self.cache.put(path, size, mtime, STAGE_FULL, digest)
+                    progress(STAGE_FULL, done, len(todo))
+        finally:
+            # 取消时不等待正在哈希的大文件读完；排队中的任务逐个取消（cancel_futures 需要 Python 3.9）
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=not cancelled)
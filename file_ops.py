@@ -0,0 +1,283 @@
+# file_ops.py - 批量移动/重命名视频文件：生成预览 -> 工作线程池执行 -> 任一失败时回滚已完成的部分
+#
+# 执行前把整批计划写入 Save/FileOps.json，文件全部移动完成、且标签/播放进度/扫描索引/观看记录
+# 都已改用新路径之后才删除。日志分两个阶段：
+#   移动文件期间（无 "phase"）中途退出：下次启动先把已经移动的文件移回原处，再加载以原路径为键的存储；
+#   文件已全部移动、正在迁移各个存储（"phase": "migrating"）时退出：各个存储可能只迁移了一部分，
+#   下次启动不再移动文件，而是在存储加载之后把迁移重跑一遍（各步骤对已迁移的路径不做任何事）。
+#
+# 重命名模式只决定不含扩展名的部分，扩展名保持不变：
+#   {name} 原文件名（先经过“查找/替换”）   {n} 序号，{n:3} 补零到 3 位
+#   {parent} 所在目录名                    {date} 文件修改日期 YYYY-MM-DD
+import os
+import re
+import json
+import time
+import errno
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+FILE_OPS_JOURNAL = os.path.join(SAVE_DIR, "FileOps.json")
+# 同盘改名几乎不耗时，跨盘移动受磁盘带宽限制，少量线程即可把等待重叠起来
+MAX_WORKERS = 4
+PHASE_MIGRATING = "migrating"
+
+_TOKEN = re.compile(r'\{(\w+)(?::(\d+))?\}')
+_INVALID_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+
+
+class FileOpError(ValueError):
+    pass
+
+
+class FileOpCancelled(Exception):
+    pass
+
+
+def render_name(pattern, values):
+    # values: {'name', 'n', 'parent', 'date'}；未知的占位符抛出 FileOpError
+    def token(m):
+        key, width = m.group(1), m.group(2)
+        if key not in values:
+            raise FileOpError(f"未知的占位符 {{{key}}}")
+        if width is not None:
+            if key != 'n':
+                raise FileOpError("只有 {n} 可以指定位数")
+            return str(values['n']).zfill(int(width))
+        return str(values[key])
+    return _TOKEN.sub(token, pattern)
+
+
+class PlannedOp:
+    def __init__(self, src, dst, error=None):
+        self.src = src
+        self.dst = dst
+        self.error = error
+
+    @property
+    def unchanged(self):
+        return self.dst == self.src
+
+    @property
+    def ready(self):
+        return self.error is None and not self.unchanged
+
+
+class FilePlanner:
+    # 生成并检查计划；目标目录只列出一次，预览随输入实时刷新时不重复访问磁盘
+    def __init__(self):
+        self._listings = {}
+
+    def names_in(self, directory):
+        names = self._listings.get(directory)
+        if names is None:
+            try:
+                names = {os.path.normcase(n) for n in os.listdir(directory)}
+            except OSError:
+                names = set()
+            self._listings[directory] = names
+        return names
+
+    def plan_move(self, paths, dest_dir):
+        dest_dir = os.path.normpath(dest_dir) if dest_dir else ""
+        if not dest_dir or not os.path.isdir(dest_dir):
+            raise FileOpError("目标文件夹不存在")
+        return self._check([PlannedOp(p, os.path.join(dest_dir, os.path.basename(p))) for p in paths])
+
+    def plan_rename(self, paths, pattern, find="", replace="", start=1, mtimes=None):
+        # paths 按显示顺序给出，{n} 依此编号；mtimes 为 {path: mtime_ns}，取自扫描索引
+        if not pattern.strip():
+            raise FileOpError("请输入重命名模式")
+        render_name(pattern, {'name': '', 'n': 0, 'parent': '', 'date': ''})
+        regex = None
+        if find:
+            try:
+                regex = re.compile(find)
+            except re.error as e:
+                raise FileOpError(f"查找表达式无效: {e}") from e
+        mtimes = mtimes or {}
+        ops = []
+        for i, path in enumerate(paths):
+            directory, base = os.path.split(path)
+            stem, ext = os.path.splitext(base)
+            if regex is not None:
+                try:
+                    stem = regex.sub(replace, stem)
+                except (re.error, IndexError) as e:
+                    raise FileOpError(f"替换内容无效: {e}") from e
+            mtime = mtimes.get(path)
+            values = {
+                'name': stem,
+                'n': start + i,
+                'parent': os.path.basename(directory),
+                'date': time.strftime("%Y-%m-%d", time.localtime(mtime / 1e9)) if mtime else "",
+            }
+            ops.append(PlannedOp(path, os.path.join(directory, render_name(pattern, values).strip() + ext)))
+        return self._check(ops)
+
+    def _check(self, ops):
+        targets = {}
+        for op in ops:
+            key = os.path.normcase(op.dst)
+            targets[key] = targets.get(key, 0) + 1
+        sources = {os.path.normcase(op.src) for op in ops}
+        for op in ops:
+            if op.unchanged:
+                continue
+            directory, name = os.path.split(op.dst)
+            key = os.path.normcase(op.dst)
+            # 只改大小写时目标与源是同一个文件（不区分大小写的文件系统）
+            same_file = key == os.path.normcase(op.src)
+            stem = os.path.splitext(name)[0]
+            if not stem.strip('. ') or _INVALID_CHARS.search(name):
+                op.error = "文件名无效"
+            elif targets[key] > 1:
+                op.error = "与本批其他文件重名"
+            elif key in sources and not same_file:
+                op.error = "目标是本批中另一个待处理的文件"
+            elif not same_file and os.path.normcase(name) in self.names_in(directory):
+                op.error = "目标已存在"
+        return ops
+
+
+def _move_file(src, dst):
+    if os.path.lexists(dst) and os.path.normcase(dst) != os.path.normcase(src):
+        raise FileExistsError(errno.EEXIST, "目标已存在", dst)
+    try:
+        os.rename(src, dst)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    # 跨磁盘：先完整复制（保留修改时间，扫描索引不会把它当作变化的文件），成功后再删除源文件
+    try:
+        shutil.copy2(src, dst)
+    except BaseException:
+        try:
+            if os.path.exists(dst):
+                os.remove(dst)
+        except OSError:
+            pass
+        raise
+    os.remove(src)
+
+
+class BatchFileMover:
+    def __init__(self, max_workers=MAX_WORKERS, journal_file=FILE_OPS_JOURNAL):
+        self.max_workers = max_workers
+        self.journal_file = journal_file
+
+    def run(self, ops, progress=None, cancel=None):
+        # 在工作线程中调用；全部成功时返回 {原路径: 新路径}。
+        # 任一文件失败或被取消：不再开始新的移动，等正在进行的完成后把已完成的全部移回原处再抛出异常
+        ops = [op for op in ops if op.ready]
+        if not ops:
+            return {}
+        write_json_atomic(self.journal_file, {'started': time.time(), 'ops': [[op.src, op.dst] for op in ops]})
+        stop = threading.Event()
+
+        def work(op):
+            if stop.is_set():
+                return None
+            try:
+                _move_file(op.src, op.dst)
+            except OSError as e:
+                raise FileOpError(f"{op.src}: {e.strerror or e}") from e
+            return op
+
+        done = []
+        failure = None
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="file-ops")
+        try:
+            futures = [executor.submit(work, op) for op in ops]
+            for n, future in enumerate(as_completed(futures), 1):
+                try:
+                    op = future.result()
+                except FileOpError as e:
+                    failure = failure or e
+                    stop.set()
+                    continue
+                if op is not None:
+                    done.append(op)
+                if failure is None and cancel is not None and cancel():
+                    failure = FileOpCancelled()
+                    stop.set()
+                if progress is not None:
+                    progress(n, len(ops))
+        finally:
+            executor.shutdown(wait=True)
+        if failure is not None:
+            stuck = self.rollback(done)
+            if stuck:
+                raise FileOpError(f"{failure}；另有 {len(stuck)} 个文件未能移回原处，下次启动时会再次尝试") from None
+            raise failure
+        log.info("批量移动/重命名完成: %d 个文件", len(done))
+        return {op.src: op.dst for op in done}
+
+    def rollback(self, done):
+        # 逆序移回；移不回的保留在日志中，下次启动时再试
+        stuck = []
+        for op in reversed(done):
+            try:
+                _move_file(op.dst, op.src)
+            except OSError as e:
+                log.error("回滚失败 %s -> %s: %s", op.dst, op.src, e)
+                stuck.append(op)
+        if stuck:
+            write_json_atomic(self.journal_file, {'started': time.time(), 'ops': [[op.src, op.dst] for op in stuck]})
+        else:
+            self.finish()
+        log.info("已回滚 %d 个文件", len(done) - len(stuck))
+        return stuck
+
+    def mark_migrating(self, mapping):
+        # 文件全部移动完成、开始迁移各个存储之前调用；此后中途退出由 pending_migration 向前完成
+        write_json_atomic(self.journal_file, {
+            'started': time.time(), 'phase': PHASE_MIGRATING, 'ops': [[src, dst] for src, dst in mapping.items()]
+        })
+
+    def finish(self):
+        # 各个存储都已改用新路径之后调用
+        try:
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+        except OSError as e:
+            log.error("删除 %s 出错: %s", self.journal_file, e)
+
+
+def _read_journal(journal_file):
+    if not os.path.exists(journal_file):
+        return None
+    try:
+        with open(journal_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        log.error("读取 %s 出错: %s", journal_file, e)
+        return None
+
+
+def recover_interrupted(journal_file=FILE_OPS_JOURNAL):
+    # 启动时、加载任何以路径为键的数据之前调用；返回移回原处的文件数
+    journal = _read_journal(journal_file)
+    if journal is None or journal.get('phase') == PHASE_MIGRATING:
+        return 0
+    pairs = journal.get('ops', [])
+    moved = [PlannedOp(src, dst) for src, dst in pairs if not os.path.lexists(src) and os.path.lexists(dst)]
+    log.warning("上次批量移动/重命名未完成，正在移回 %d 个文件", len(moved))
+    stuck = BatchFileMover(journal_file=journal_file).rollback(moved)
+    return len(moved) - len(stuck)
+
+
+def pending_migration(journal_file=FILE_OPS_JOURNAL):
+    # 启动时、各个存储加载之后调用：返回迁移到一半的 {原路径: 新路径}，调用方重跑迁移后调用 BatchFileMover.finish
+    journal = _read_journal(journal_file)
+    if journal is None or journal.get('phase') != PHASE_MIGRATING:
+        return {}
+    log.warning("上次批量移动/重命名在迁移标签与进度时中断，继续迁移 %d 个文件", len(journal.get('ops', [])))
+    return {src: dst for src, dst in journal.get('ops', [])}
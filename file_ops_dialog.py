@@ -0,0 +1,219 @@
+# file_ops_dialog.py - 批量移动/重命名对话框：实时预览，后台线程池执行，失败或取消时自动回滚
+import threading
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel, QLineEdit, QPushButton, QSpinBox,
+    QProgressBar, QTreeWidget, QTreeWidgetItem, QFileDialog, QMessageBox
+)
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont, QBrush, QColor
+from file_ops import FilePlanner, BatchFileMover, FileOpError, FileOpCancelled
+
+MODE_MOVE = "move"
+MODE_RENAME = "rename"
+# 预览只画前这么多行，计数仍覆盖整批
+PREVIEW_ROWS = 2000
+
+
+class _MoverSignals(QObject):
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+class FileOpsDialog(QDialog):
+    # apply_callback(mapping) 在界面线程中调用，负责把各个存储改用新路径
+    def __init__(self, paths, mode, apply_callback, mtimes=None, start_dir="", parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("移动到文件夹" if mode == MODE_MOVE else "批量重命名")
+        self.resize(820, 560)
+        self.paths = paths
+        self.mode = mode
+        self.apply_callback = apply_callback
+        self.mtimes = mtimes or {}
+        self.start_dir = start_dir
+        self.planner = FilePlanner()
+        self.mover = BatchFileMover()
+        self.ops = []
+        self.running = False
+        self._cancel = threading.Event()
+
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+        if mode == MODE_MOVE:
+            row = QHBoxLayout()
+            self.dest_edit = QLineEdit()
+            row.addWidget(self.dest_edit, stretch=1)
+            browse_btn = QPushButton("浏览…")
+            browse_btn.clicked.connect(self.browse_dest)
+            row.addWidget(browse_btn)
+            form.addRow("目标文件夹", row)
+            self.inputs = [self.dest_edit, browse_btn]
+            self.dest_edit.textChanged.connect(self.schedule_preview)
+        else:
+            self.pattern_edit = QLineEdit("{name}")
+            form.addRow("新名称", self.pattern_edit)
+            self.find_edit = QLineEdit()
+            self.find_edit.setPlaceholderText("正则表达式，可留空")
+            form.addRow("查找", self.find_edit)
+            self.replace_edit = QLineEdit()
+            form.addRow("替换为", self.replace_edit)
+            self.start_spin = QSpinBox()
+            self.start_spin.setRange(0, 999999)
+            self.start_spin.setValue(1)
+            form.addRow("起始编号", self.start_spin)
+            self.inputs = [self.pattern_edit, self.find_edit, self.replace_edit, self.start_spin]
+            for edit in (self.pattern_edit, self.find_edit, self.replace_edit):
+                edit.textChanged.connect(self.schedule_preview)
+            self.start_spin.valueChanged.connect(self.schedule_preview)
+            hint = QLabel("{name} 原文件名（先按查找/替换处理）  {n} 序号，{n:3} 补零到 3 位  "
+                          "{parent} 所在目录名  {date} 修改日期。扩展名保持不变，序号按列表当前顺序。")
+            hint.setWordWrap(True)
+            hint.setFont(QFont("SimHei", 9))
+            form.addRow(hint)
+        layout.addLayout(form)
+
+        self.summary_label = QLabel()
+        self.summary_label.setFont(QFont("SimHei", 10))
+        layout.addWidget(self.summary_label)
+        self.preview = QTreeWidget()
+        self.preview.setHeaderLabels(["原文件", "新路径", "状态"])
+        self.preview.setRootIsDecorated(False)
+        self.preview.setColumnWidth(0, 300)
+        self.preview.setColumnWidth(1, 360)
+        layout.addWidget(self.preview, stretch=1)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.hide()
+        layout.addWidget(self.progress_bar)
+
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        self.run_btn = QPushButton("执行")
+        self.run_btn.clicked.connect(self.run)
+        buttons.addWidget(self.run_btn)
+        self.close_btn = QPushButton("取消")
+        self.close_btn.clicked.connect(self.reject)
+        buttons.addWidget(self.close_btn)
+        layout.addLayout(buttons)
+
+        # 输入停顿后再刷新预览，连续输入时不反复生成整批计划
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(200)
+        self.preview_timer.timeout.connect(self.update_preview)
+
+        self.signals = _MoverSignals()
+        self.signals.progress.connect(self.on_progress)
+        self.signals.finished.connect(self.on_finished)
+        self.signals.failed.connect(self.on_failed)
+        self.update_preview()
+
+    def browse_dest(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择目标文件夹", self.dest_edit.text() or self.start_dir)
+        if folder:
+            self.dest_edit.setText(folder)
+
+    def schedule_preview(self, *args):
+        self.preview_timer.start()
+
+    def update_preview(self):
+        self.ops = []
+        error = None
+        try:
+            if self.mode == MODE_MOVE:
+                if self.dest_edit.text().strip():
+                    self.ops = self.planner.plan_move(self.paths, self.dest_edit.text().strip())
+            else:
+                self.ops = self.planner.plan_rename(
+                    self.paths, self.pattern_edit.text(), self.find_edit.text(), self.replace_edit.text(),
+                    self.start_spin.value(), self.mtimes
+                )
+        except FileOpError as e:
+            error = str(e)
+        self.preview.clear()
+        if error is not None or not self.ops:
+            self.summary_label.setText(error or f"共 {len(self.paths)} 个文件，请选择目标文件夹")
+            self.run_btn.setEnabled(False)
+            return
+        ready = sum(op.ready for op in self.ops)
+        conflicts = sum(op.error is not None for op in self.ops)
+        unchanged = sum(op.unchanged for op in self.ops)
+        items = []
+        # 有冲突的行排在前面，便于查看
+        for op in sorted(self.ops, key=lambda o: o.error is None)[:PREVIEW_ROWS]:
+            status = op.error or ("不变" if op.unchanged else "")
+            item = QTreeWidgetItem([op.src, op.dst, status])
+            if op.error:
+                item.setForeground(2, QBrush(QColor("#c62828")))
+            elif op.unchanged:
+                item.setForeground(1, QBrush(QColor("#999")))
+            items.append(item)
+        self.preview.addTopLevelItems(items)
+        text = f"将处理 {ready} 个文件"
+        if unchanged:
+            text += f"，{unchanged} 个不变"
+        if conflicts:
+            text += f"，{conflicts} 个冲突（解决后才能执行）"
+        self.summary_label.setText(text)
+        self.run_btn.setEnabled(ready > 0 and not conflicts)
+
+    def run(self):
+        if self.preview_timer.isActive():
+            self.preview_timer.stop()
+            self.update_preview()
+            if not self.run_btn.isEnabled():
+                return
+        ops = [op for op in self.ops if op.ready]
+        self.running = True
+        self._cancel.clear()
+        for widget in self.inputs:
+            widget.setEnabled(False)
+        self.run_btn.setEnabled(False)
+        self.progress_bar.setMaximum(len(ops))
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.summary_label.setText(f"正在处理 {len(ops)} 个文件…")
+        threading.Thread(target=self._run, args=(ops,), daemon=True, name="file-ops").start()
+
+    def _run(self, ops):
+        try:
+            mapping = self.mover.run(ops, progress=self.signals.progress.emit, cancel=self._cancel.is_set)
+        except FileOpCancelled:
+            self.signals.failed.emit("已取消，已完成的部分已移回原处")
+        except FileOpError as e:
+            self.signals.failed.emit(f"执行失败，已完成的部分已移回原处: {e}")
+        except Exception as e:
+            self.signals.failed.emit(f"执行失败: {e}")
+        else:
+            self.signals.finished.emit(mapping)
+
+    def on_progress(self, done, total):
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def on_finished(self, mapping):
+        self.running = False
+        # 先记下“文件已移动、正在迁移存储”，中途退出时下次启动向前完成而不是把文件移回去
+        self.mover.mark_migrating(mapping)
+        self.apply_callback(mapping)
+        # 各个存储都已改用新路径，计划日志不再需要
+        self.mover.finish()
+        QMessageBox.information(self, "完成", f"已处理 {len(mapping)} 个文件，标签与播放进度已随文件迁移。")
+        self.accept()
+
+    def on_failed(self, message):
+        self.running = False
+        self.progress_bar.hide()
+        for widget in self.inputs:
+            widget.setEnabled(True)
+        # 磁盘内容可能已变化，重新列出目标目录再检查
+        self.planner = FilePlanner()
+        self.update_preview()
+        self.summary_label.setText(message)
+
+    def reject(self):
+        # 执行中只请求取消，等回滚完成后再关闭
+        if self.running:
+            self._cancel.set()
+            self.summary_label.setText("正在取消并回滚…")
+            return
+        super().reject()
@@ -0,0 +1,168 @@
+# folder_health.py - 已注册文件夹的可用性检测（后台线程 + 超时，不阻塞界面）
+import os
+import json
+import stat
+import time
+import threading
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+HEALTH_FILE = os.path.join(SAVE_DIR, "FolderHealth.json")
+
+STATUS_UNKNOWN = "unknown"
+STATUS_CHECKING = "checking"
+STATUS_ONLINE = "online"
+STATUS_OFFLINE = "offline"
+
+STATUS_TEXT = {
+    STATUS_UNKNOWN: "未检测",
+    STATUS_CHECKING: "检测中…",
+    STATUS_ONLINE: "在线",
+    STATUS_OFFLINE: "离线",
+}
+
+
+def probe_folder(folder):
+    # 在工作线程中执行；睡眠中的 NAS 可能在这里卡住数十秒
+    # 返回所在设备号（供扫描调度按磁盘排队），不是可访问的目录时返回 None
+    st = os.stat(folder)
+    return st.st_dev if stat.S_ISDIR(st.st_mode) else None
+
+
+class FolderHealthMonitor(QObject):
+    status_changed = pyqtSignal(str, str)
+    # 本次会话第一次得到检测结果（超时算作不可访问）、以及之后可访问性变化时发出，(folder, 是否可访问)；
+    # 定期复查的结果不变时不发出，避免每次复查都触发重新扫描
+    probed = pyqtSignal(str, bool)
+    _probe_finished = pyqtSignal(str, int, object)
+
+    def __init__(self, timeout_ms=3000, recheck_ms=30000, parent=None):
+        super().__init__(parent)
+        self.timeout_ms = timeout_ms
+        self.status = {}
+        self.checked_at = {}
+        # 最近一次检测成功时取得的设备号
+        self.devices = {}
+        self._tokens = {}
+        self._in_flight = set()
+        # 本次会话已有检测结果的文件夹
+        self.confirmed = set()
+        self._probe_finished.connect(self._on_probe_finished)
+        self.load_cache()
+
+        self._recheck_timer = QTimer(self)
+        self._recheck_timer.timeout.connect(self.recheck)
+        self._recheck_timer.start(recheck_ms)
+
+    def load_cache(self):
+        # 启动时先显示上次的检测结果，真正的检测结果随后异步更新
+        try:
+            if os.path.exists(HEALTH_FILE):
+                with open(HEALTH_FILE, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                for folder, entry in data.items():
+                    self.status[folder] = entry.get('status', STATUS_UNKNOWN)
+                    self.checked_at[folder] = entry.get('checked_at', 0)
+        except Exception as e:
+            log.error("读取 %s 出错: %s", HEALTH_FILE, e)
+
+    def save_cache(self):
+        data = {
+            folder: {'status': status, 'checked_at': self.checked_at.get(folder, 0)}
+            for folder, status in self.status.items()
+            if status in (STATUS_ONLINE, STATUS_OFFLINE)
+        }
+        try:
+            write_json_atomic(HEALTH_FILE, data, indent=4)
+        except Exception as e:
+            log.error("保存 %s 出错: %s", HEALTH_FILE, e)
+
+    def get_status(self, folder):
+        return self.status.get(folder, STATUS_UNKNOWN)
+
+    def is_online(self, folder):
+        return self.get_status(folder) == STATUS_ONLINE
+
+    def device_of(self, folder):
+        return self.devices.get(folder)
+
+    def probe_all(self, folders):
+        for folder in folders:
+            self.probe(folder)
+
+    def recheck(self):
+        # 在线的文件夹也定期检测：会话中途掉线的挂载点不能一直被当作在线
+        for folder in list(self.status):
+            self.probe(folder)
+
+    def report_failure(self, folder):
+        # 文件夹上的文件操作出错：不等定期复查，立即重新检测（卡住超时即判为离线）
+        self.probe(folder)
+
+    def forget(self, folder):
+        self.status.pop(folder, None)
+        self.checked_at.pop(folder, None)
+        self.devices.pop(folder, None)
+        self._tokens.pop(folder, None)
+        self.confirmed.discard(folder)
+        self.save_cache()
+
+    def probe(self, folder):
+        # 同一文件夹上一次检测仍卡住时不再叠加新线程
+        if folder in self._in_flight:
+            return
+        token = self._tokens.get(folder, 0) + 1
+        self._tokens[folder] = token
+        self._in_flight.add(folder)
+        if self.get_status(folder) == STATUS_UNKNOWN:
+            self._set_status(folder, STATUS_CHECKING)
+        threading.Thread(
+            target=self._run_probe, args=(folder, token), daemon=True, name="folder-probe"
+        ).start()
+        QTimer.singleShot(self.timeout_ms, lambda: self._on_timeout(folder, token))
+
+    def _run_probe(self, folder, token):
+        try:
+            device = probe_folder(folder)
+        except OSError:
+            device = None
+        self._probe_finished.emit(folder, token, device)
+
+    def _on_probe_finished(self, folder, token, device):
+        self._in_flight.discard(folder)
+        if folder not in self._tokens:
+            return
+        ok = device is not None
+        if ok:
+            self.devices[folder] = device
+        # 超时后才返回的结果依然有效（例如 NAS 刚刚唤醒）
+        self.checked_at[folder] = time.time()
+        was_online = self.status.get(folder) == STATUS_ONLINE
+        first = folder not in self.confirmed
+        # 先登记为已确认，status_changed 的处理函数看到的就是本次会话的结果
+        self.confirmed.add(folder)
+        self._set_status(folder, STATUS_ONLINE if ok else STATUS_OFFLINE)
+        if first or was_online != ok:
+            self.probed.emit(folder, ok)
+
+    def _on_timeout(self, folder, token):
+        if folder in self._in_flight and self._tokens.get(folder) == token:
+            self.checked_at[folder] = time.time()
+            was_online = self.status.get(folder) == STATUS_ONLINE
+            first = folder not in self.confirmed
+            self.confirmed.add(folder)
+            self._set_status(folder, STATUS_OFFLINE)
+            if first or was_online:
+                self.probed.emit(folder, False)
+
+    def _set_status(self, folder, status):
+        if self.status.get(folder) == status:
+            return
+        self.status[folder] = status
+        if status in (STATUS_ONLINE, STATUS_OFFLINE):
+            self.save_cache()
+        self.status_changed.emit(folder, status)
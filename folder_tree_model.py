@@ -0,0 +1,211 @@
+# folder_tree_model.py - 按需逐层展开的文件夹树模型（QTreeView 使用）
+import os
+import threading
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex, pyqtSignal
+from PyQt5.QtGui import QBrush, QColor
+from sort_keys import natural_key
+
+try:
+    from ui_components import VIDEO_PATH_ROLE
+except ImportError:
+    VIDEO_PATH_ROLE = Qt.UserRole + 1
+
+
+class _Node:
+    __slots__ = ('parent', 'rel_dir', 'path', 'name', 'children', 'fetched', 'row')
+
+    def __init__(self, parent, name, rel_dir=None, path=None, row=0):
+        self.parent = parent
+        self.name = name
+        self.rel_dir = rel_dir      # 目录节点
+        self.path = path            # 视频节点
+        self.children = []
+        self.fetched = False
+        self.row = row
+
+    @property
+    def is_dir(self):
+        return self.rel_dir is not None
+
+
+class FolderTreeModel(QAbstractItemModel):
+    # 展开时核对到了磁盘上的变化，通知主窗口刷新筛选/计数
+    index_changed = pyqtSignal()
+    # 后台核对一层目录的结果：(scan_index, rel_dir, read_dir 的结果)
+    _dir_read = pyqtSignal(object, str, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.scan_index = None
+        self.online = False
+        self.matches = set()
+        self.sorted_matches = []
+        self.filtering = False
+        self._root = _Node(None, "")
+        # 正在后台核对的 (id(scan_index), rel_dir)，卡住的挂载点上不重复开线程
+        self._reading = set()
+        self._dir_read.connect(self._on_dir_read)
+
+    def set_source(self, scan_index, online, matches, filtering):
+        self.beginResetModel()
+        self.scan_index = scan_index
+        self.online = online
+        self._set_matches(matches, filtering)
+        self._root = _Node(None, "", rel_dir="")
+        self.endResetModel()
+
+    def set_matches(self, matches, filtering):
+        # 筛选条件变化：已展开的节点保持不变，只刷新显示与可见的文件
+        self.layoutAboutToBeChanged.emit()
+        self._set_matches(matches, filtering)
+        alive = set()
+        self._refetch(self._root, alive)
+        old = self.persistentIndexList()
+        new = []
+        for index in old:
+            node = index.internalPointer()
+            if id(node) in alive:
+                new.append(self.createIndex(node.row, index.column(), node))
+            else:
+                new.append(QModelIndex())
+        self.changePersistentIndexList(old, new)
+        self.layoutChanged.emit()
+
+    def _set_matches(self, matches, filtering):
+        self.matches = matches
+        self.sorted_matches = sorted(matches)
+        self.filtering = filtering
+
+    def _refetch(self, node, alive):
+        # 重建已展开节点的子项列表（只涉及用户展开过的层级）
+        if not node.fetched:
+            return
+        old = {(c.rel_dir, c.path): c for c in node.children}
+        node.children = []
+        for child in self._child_nodes(node):
+            kept = old.get((child.rel_dir, child.path))
+            if kept is not None:
+                kept.row = child.row
+                child = kept
+            node.children.append(child)
+            alive.add(id(child))
+            self._refetch(child, alive)
+
+    def _child_nodes(self, node):
+        listing = self.scan_index.children(node.rel_dir)
+        if listing is None:
+            return []
+        subdirs, files = listing
+        nodes = []
+        for name in sorted(subdirs, key=natural_key):
+            rel = os.path.join(node.rel_dir, name) if node.rel_dir else name
+            nodes.append(_Node(node, name, rel_dir=rel, row=len(nodes)))
+        for name in sorted(files, key=natural_key):
+            path = self.scan_index.full_path(node.rel_dir, name)
+            if path in self.matches:
+                nodes.append(_Node(node, name, path=path, row=len(nodes)))
+        return nodes
+
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else self._root
+
+    # === QAbstractItemModel 接口 ===
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if 0 <= row < len(node.children):
+            return self.createIndex(row, column, node.children[row])
+        return QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self._root:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        return len(self.node(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.node(parent)
+        if not node.is_dir:
+            return False
+        if not node.fetched:
+            return self.scan_index is not None
+        return bool(node.children)
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        return node.is_dir and not node.fetched and self.scan_index is not None
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        node.fetched = True
+        # 先显示索引中的子项，磁盘核对放到后台线程，慢速或卡住的挂载点不会冻结界面
+        children = self._child_nodes(node)
+        if children:
+            self.beginInsertRows(parent, 0, len(children) - 1)
+            node.children = children
+            self.endInsertRows()
+        if self.online:
+            self._read_dir_async(node.rel_dir)
+
+    def _read_dir_async(self, rel_dir):
+        scan_index = self.scan_index
+        key = (id(scan_index), rel_dir)
+        if key in self._reading:
+            return
+        self._reading.add(key)
+        known_mtime, current = scan_index.dir_state(rel_dir)
+        threading.Thread(
+            target=self._run_read, args=(scan_index, rel_dir, known_mtime, current),
+            daemon=True, name="tree-refresh"
+        ).start()
+
+    def _run_read(self, scan_index, rel_dir, known_mtime, current):
+        try:
+            result = scan_index.read_dir(rel_dir, known_mtime, current)
+        except OSError:
+            result = None
+        self._dir_read.emit(scan_index, rel_dir, result)
+
+    def _on_dir_read(self, scan_index, rel_dir, result):
+        self._reading.discard((id(scan_index), rel_dir))
+        if result is None:
+            return
+        before = scan_index.children(rel_dir)
+        before = (list(before[0]), dict(before[1])) if before else None
+        scan_index.apply_dir(rel_dir, result)
+        after = scan_index.children(rel_dir)
+        after = (list(after[0]), dict(after[1])) if after else None
+        # 主窗口收到后重新加载列表并调用 set_matches，已展开的节点随之重建
+        if before != after:
+            self.index_changed.emit()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            if not node.is_dir:
+                return node.name
+            total = self.scan_index.subtree_count(node.rel_dir)
+            if self.filtering:
+                matched = self.scan_index.match_count(node.rel_dir, self.sorted_matches)
+                return f"📁 {node.name}  ({matched}/{total})"
+            return f"📁 {node.name}  ({total})"
+        if role == VIDEO_PATH_ROLE:
+            return node.path
+        if role == Qt.ForegroundRole and node.is_dir and self.filtering:
+            if not self.scan_index.match_count(node.rel_dir, self.sorted_matches):
+                return QBrush(QColor("#999"))
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
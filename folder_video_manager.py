@@ -1,625 +1,1667 @@
-# folder_video_manager.py
-import os
-import json
-from pathlib import Path
-from PyQt5.QtWidgets import (
-    QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QListWidget, QLabel,
-    QFileDialog, QMessageBox, QListWidgetItem, QScrollArea, QCheckBox, QInputDialog,
-    QApplication, QMenu, QDialog, QDialogButtonBox
-)
-from PyQt5.QtCore import Qt, QSize, QTimer
-from PyQt5.QtGui import QFont
-from video_player import VideoPlayer
-from data_manager import DataManager
-
-# --- 尝试从 ui_components 导入，若失败则内联定义 ---
-try:
-    from ui_components import VIDEO_PATH_ROLE, VIDEO_EXTENSIONS
-except ImportError:
-    from PyQt5.QtCore import Qt
-    VIDEO_PATH_ROLE = Qt.UserRole + 1
-    VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv', '.webm', '.m4v'}
-
-SAVE_DIR = "Save"
-PLAYBACK_STATE_FILE = os.path.join(SAVE_DIR, "video_playback_state.json")
-os.makedirs(SAVE_DIR, exist_ok=True)
-
-
-class TagSelectionDialog(QDialog):
-    def __init__(self, available_tags, parent=None, title="选择标签"):
-        super().__init__(parent)
-        self.setWindowTitle(title)
-        self.setModal(True)
-        self.resize(300, 400)
-        layout = QVBoxLayout(self)
-
-        self.list_widget = QListWidget()
-        for tag in sorted(available_tags):
-            item = QListWidgetItem(tag)
-            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-            item.setCheckState(Qt.Unchecked)
-            self.list_widget.addItem(item)
-        layout.addWidget(self.list_widget)
-
-        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
-        button_box.accepted.connect(self.accept)
-        button_box.rejected.connect(self.reject)
-        layout.addWidget(button_box)
-
-    def get_selected_tags(self):
-        selected = []
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            if item.checkState() == Qt.Checked:
-                selected.append(item.text())
-        return selected
-
-
-class FolderVideoManager(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("文件夹视频管理器 (Final V22)")
-        self.resize(1400, 750)
-        self.data_manager = DataManager()
-        self.selected_filter_tags = set()
-        self.current_folder = None
-        self.video_player = None
-        self.current_selected_video_path = None
-        self.is_fullscreen_mode = False
-        self.playback_states = self.load_playback_states()
-
-        central = QWidget()
-        self.setCentralWidget(central)
-        self.main_layout = QHBoxLayout(central)
-        self.main_layout.setSpacing(10)
-        self.main_layout.setContentsMargins(10, 10, 10, 10)
-
-        # 左侧面板
-        self.left_panel = QWidget()
-        left_layout = QVBoxLayout(self.left_panel)
-        left_layout.setContentsMargins(0, 0, 0, 0)
-        self.list_widget = QListWidget()
-        self.list_widget.setMinimumWidth(280)
-        self.list_widget.setMaximumWidth(280)
-        self.list_widget.setSelectionMode(QListWidget.ExtendedSelection)
-        self.list_widget.itemDoubleClicked.connect(self.on_item_double_clicked)
-        self.list_widget.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.list_widget.customContextMenuRequested.connect(self.on_right_click)
-        self.list_widget.setFont(QFont("SimHei", 12))
-        left_layout.addWidget(self.list_widget)
-        self.main_layout.addWidget(self.left_panel)
-
-        # 视频占位
-        self.placeholder = QWidget()
-        self.placeholder.setStyleSheet("background-color: #000;")
-        self.main_layout.addWidget(self.placeholder, stretch=3)
-
-        # 右侧面板
-        self.right_panel = QWidget()
-        right_layout = QVBoxLayout(self.right_panel)
-        right_layout.setContentsMargins(0, 0, 0, 0)
-        right_layout.setSpacing(10)
-
-        self.current_video_name_label = QLabel("当前未选择任何视频文件")
-        self.current_video_name_label.setFont(QFont("SimHei", 12))
-        self.current_video_name_label.setStyleSheet("color: #333;")
-        self.current_video_name_label.setWordWrap(True)
-        right_layout.addWidget(self.current_video_name_label)
-
-        self.current_video_tags_label = QLabel("当前视频标签")
-        self.current_video_tags_label.setFont(QFont("SimHei", 12, QFont.Bold))
-        right_layout.addWidget(self.current_video_tags_label)
-        self.current_tags_scroll = QScrollArea()
-        self.current_tags_scroll.setWidgetResizable(True)
-        self.current_tags_widget = QWidget()
-        self.current_tags_layout = QVBoxLayout(self.current_tags_widget)
-        self.current_tags_layout.setContentsMargins(5, 5, 5, 5)
-        self.current_tags_layout.setSpacing(5)
-        self.current_tags_layout.setAlignment(Qt.AlignTop)
-        self.current_tags_scroll.setWidget(self.current_tags_widget)
-        right_layout.addWidget(self.current_tags_scroll, stretch=1)
-
-        tag_header_layout = QHBoxLayout()
-        self.global_tags_label = QLabel("全局已知标签列表")
-        self.global_tags_label.setFont(QFont("SimHei", 12, QFont.Bold))
-        tag_header_layout.addWidget(self.global_tags_label)
-        add_global_tag_btn = QPushButton("+")
-        add_global_tag_btn.setFixedSize(24, 24)
-        add_global_tag_btn.setStyleSheet("""
-            QPushButton {
-                background: #4CAF50;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                font-size: 12px;
-            }
-            QPushButton:hover {
-                background: #45a049;
-            }
-        """)
-        add_global_tag_btn.clicked.connect(self.add_new_global_tag)
-        tag_header_layout.addWidget(add_global_tag_btn)
-        tag_header_layout.addStretch()
-        right_layout.addLayout(tag_header_layout)
-
-        self.global_tags_scroll = QScrollArea()
-        self.global_tags_scroll.setWidgetResizable(True)
-        self.global_tags_widget = QWidget()
-        self.global_tags_layout = QVBoxLayout(self.global_tags_widget)
-        self.global_tags_layout.setContentsMargins(5, 5, 5, 5)
-        self.global_tags_layout.setSpacing(5)
-        self.global_tags_layout.setAlignment(Qt.AlignTop)
-        self.global_tags_scroll.setWidget(self.global_tags_widget)
-        right_layout.addWidget(self.global_tags_scroll, stretch=2)
-
-        self.main_layout.addWidget(self.right_panel, stretch=1)
-
-        toolbar = self.addToolBar("工具栏")
-        toolbar.setIconSize(QSize(24, 24))
-        self.back_action = toolbar.addAction("← 返回上级目录", self.go_back)
-        self.back_action.setEnabled(False)
-        toolbar.addSeparator()
-        toolbar.addAction("添加视频文件夹", self.add_folder)
-        toolbar.addAction("删除视频文件夹", self.delete_folder)
-
-        self.show_folder_list()
-        self.update_global_tags_list()
-
-    def load_playback_states(self):
-        if os.path.exists(PLAYBACK_STATE_FILE):
-            try:
-                with open(PLAYBACK_STATE_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"[WARN] 读取播放状态失败: {e}")
-                return {}
-        return {}
-
-    def save_playback_states(self):
-        try:
-            with open(PLAYBACK_STATE_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.playback_states, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"[WARN] 保存播放状态失败: {e}")
-
-    def update_current_context_ui(self):
-        selected_items = self.list_widget.selectedItems()
-        if selected_items and self.current_folder is not None:
-            from ui_components import VIDEO_PATH_ROLE
-            path = selected_items[0].data(VIDEO_PATH_ROLE)
-            if path and os.path.isfile(path):
-                self.current_selected_video_path = path
-                filename = os.path.basename(path)
-                self.current_video_name_label.setText(f"当前选中视频文件: {filename}")
-                tags = self.data_manager.all_videos_info.get(path, {}).get('tags', [])
-                self.update_current_tags_ui(tags)
-                return
-        self.current_selected_video_path = None
-        self.current_video_name_label.setText("当前未选择任何视频文件")
-        self.update_current_tags_ui([])
-
-    def update_current_tags_ui(self, tags):
-        while self.current_tags_layout.count():
-            child = self.current_tags_layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-        for tag in sorted(tags):
-            container = QWidget()
-            container_layout = QHBoxLayout(container)
-            container_layout.setContentsMargins(0, 0, 0, 0)
-            label = QLabel(tag)
-            label.setFont(QFont("SimHei", 12))
-            label.setStyleSheet("""
-                background-color: #e0e0e0;
-                border: 1px solid #aaa;
-                border-radius: 6px;
-                padding: 4px 8px;
-                color: #333;
-            """)
-            remove_btn = QPushButton("×")
-            remove_btn.setFixedSize(16, 16)
-            remove_btn.setStyleSheet("""
-                QPushButton {
-                    background: #ff6666;
-                    color: white;
-                    border: none;
-                    border-radius: 8px;
-                    font-size: 10px;
-                }
-                QPushButton:hover {
-                    background: #cc3333;
-                }
-            """)
-            remove_btn.clicked.connect(lambda _, t=tag: self.remove_tag_from_current_video(t))
-            container_layout.addWidget(label)
-            container_layout.addWidget(remove_btn)
-            self.current_tags_layout.addWidget(container)
-        self.current_tags_layout.addStretch()
-
-    def update_global_tags_list(self):
-        while self.global_tags_layout.count():
-            child = self.global_tags_layout.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-        for tag in sorted(self.data_manager.all_known_tags):
-            row = QWidget()
-            row_layout = QHBoxLayout(row)
-            row_layout.setContentsMargins(0, 0, 0, 0)
-            cb = QCheckBox(tag)
-            cb.setFont(QFont("SimHei", 12))
-            cb.setChecked(tag in self.selected_filter_tags)
-            cb.stateChanged.connect(lambda state, t=tag: self.toggle_filter_tag(t, state == Qt.Checked))
-            row_layout.addWidget(cb)
-            add_btn = QPushButton("+")
-            add_btn.setFixedSize(24, 24)
-            add_btn.setStyleSheet("""
-                QPushButton {
-                    background: #4CAF50;
-                    color: white;
-                    border: none;
-                    border-radius: 4px;
-                    font-size: 12px;
-                }
-                QPushButton:hover {
-                    background: #45a049;
-                }
-            """)
-            add_btn.clicked.connect(lambda _, t=tag: self.add_tag_to_current_video(t))
-            row_layout.addWidget(add_btn)
-            edit_btn = QPushButton("✏️")
-            edit_btn.setFixedSize(24, 24)
-            edit_btn.clicked.connect(lambda _, t=tag: self.rename_global_tag(t))
-            row_layout.addWidget(edit_btn)
-            delete_btn = QPushButton("🗑️")
-            delete_btn.setFixedSize(24, 24)
-            delete_btn.clicked.connect(lambda _, t=tag: self.delete_global_tag(t))
-            row_layout.addWidget(delete_btn)
-            self.global_tags_layout.addWidget(row)
-        self.global_tags_layout.addStretch()
-
-    def add_tag_to_current_video(self, tag):
-        if not self.current_selected_video_path:
-            QMessageBox.warning(self, "无选中视频", "请先选择一个视频文件。")
-            return
-        video_path = self.current_selected_video_path
-        if video_path not in self.data_manager.all_videos_info:
-            self.data_manager.all_videos_info[video_path] = {'tags': []}
-        tags = set(self.data_manager.all_videos_info[video_path].get('tags', []))
-        tags.add(tag)
-        self.data_manager.all_videos_info[video_path]['tags'] = list(tags)
-        self.data_manager.save_labels(self.data_manager.all_videos_info)
-        self.update_current_context_ui()
-
-    def remove_tag_from_current_video(self, tag):
-        if not self.current_selected_video_path:
-            return
-        video_path = self.current_selected_video_path
-        if video_path in self.data_manager.all_videos_info:
-            tags = set(self.data_manager.all_videos_info[video_path].get('tags', []))
-            tags.discard(tag)
-            self.data_manager.all_videos_info[video_path]['tags'] = list(tags)
-            self.data_manager.save_labels(self.data_manager.all_videos_info)
-            self.update_current_context_ui()
-            self.update_global_tags_list()
-
-    def add_new_global_tag(self):
-        tag, ok = QInputDialog.getText(self, "添加新标签", "请输入新标签名称：")
-        if ok and tag.strip():
-            tag = tag.strip()
-            if tag in self.data_manager.all_known_tags:
-                QMessageBox.warning(self, "标签已存在", f"标签 '{tag}' 已存在于全局标签列表中。")
-                return
-            self.data_manager.all_known_tags.add(tag)
-            self.data_manager.save_all_known_tags(self.data_manager.all_known_tags)
-            self.update_global_tags_list()
-
-    def rename_global_tag(self, old_tag):
-        new_tag, ok = QInputDialog.getText(self, "重命名标签", "请输入新标签名称：", text=old_tag)
-        if ok and new_tag.strip():
-            new_tag = new_tag.strip()
-            if new_tag == old_tag:
-                return
-            if new_tag in self.data_manager.all_known_tags:
-                QMessageBox.warning(self, "标签已存在", f"标签 '{new_tag}' 已存在。")
-                return
-            self.data_manager.all_known_tags.discard(old_tag)
-            self.data_manager.all_known_tags.add(new_tag)
-            for video_info in self.data_manager.all_videos_info.values():
-                tags = set(video_info.get('tags', []))
-                if old_tag in tags:
-                    tags.discard(old_tag)
-                    tags.add(new_tag)
-                    video_info['tags'] = list(tags)
-            self.data_manager.save_all_known_tags(self.data_manager.all_known_tags)
-            self.data_manager.save_labels(self.data_manager.all_videos_info)
-            self.update_global_tags_list()
-            self.update_current_context_ui()
-
-    def delete_global_tag(self, tag_to_delete):
-        reply = QMessageBox.question(
-            self, '确认删除', f"确定要永久删除全局标签 '{tag_to_delete}' 吗？\n该标签将从所有视频中移除。",
-            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
-        )
-        if reply == QMessageBox.Yes:
-            self.data_manager.all_known_tags.discard(tag_to_delete)
-            for video_info in self.data_manager.all_videos_info.values():
-                tags = set(video_info.get('tags', []))
-                tags.discard(tag_to_delete)
-                video_info['tags'] = list(tags)
-            self.data_manager.save_all_known_tags(self.data_manager.all_known_tags)
-            self.data_manager.save_labels(self.data_manager.all_videos_info)
-            self.update_global_tags_list()
-            self.update_current_context_ui()
-
-    def toggle_filter_tag(self, tag, checked):
-        if checked:
-            self.selected_filter_tags.add(tag)
-        else:
-            self.selected_filter_tags.discard(tag)
-        if self.current_folder:
-            self.show_video_list(self.current_folder)
-
-    def show_folder_list(self):
-        self.current_folder = None
-        self.back_action.setEnabled(False)
-        self.list_widget.clear()
-        for folder in self.data_manager.folders:
-            item = QListWidgetItem(folder)
-            item.setData(VIDEO_PATH_ROLE, folder)
-            self.list_widget.addItem(item)
-
-    def show_video_list(self, folder_path):
-        self.current_folder = folder_path
-        self.back_action.setEnabled(True)
-        self.list_widget.clear()
-        videos = []
-        if os.path.isdir(folder_path):
-            for p in Path(folder_path).rglob('*'):
-                if p.suffix.lower() in VIDEO_EXTENSIONS:
-                    full_path = str(p.resolve())
-                    videos.append(full_path)
-        if self.selected_filter_tags:
-            filtered = []
-            for v in videos:
-                tags = self.data_manager.all_videos_info.get(v, {}).get('tags', [])
-                if self.selected_filter_tags.issubset(set(tags)):
-                    filtered.append(v)
-            videos = filtered
-        for video_path in sorted(videos):
-            item = QListWidgetItem(os.path.basename(video_path))
-            item.setData(VIDEO_PATH_ROLE, video_path)
-            self.list_widget.addItem(item)
-
-    def go_back(self):
-        self.selected_filter_tags.clear()
-        self.show_folder_list()
-
-    def release_video_player(self):
-        if self.video_player:
-            state = self.video_player.get_current_state()
-            if state and state['path']:
-                self.playback_states[state['path']] = state
-                self.save_playback_states()
-            try:
-                self.video_player.player.stop()
-            except:
-                pass
-            self.video_player.update_timer.stop()
-            self.main_layout.removeWidget(self.video_player)
-            self.video_player.setParent(None)
-            self.video_player.deleteLater()
-            self.video_player = None
-            self.main_layout.insertWidget(1, self.placeholder, stretch=3)
-            self.update_current_context_ui()
-
-    def on_item_double_clicked(self, item):
-        path = item.data(VIDEO_PATH_ROLE)
-        if not path:
-            return
-        if self.current_folder is None:
-            if os.path.isdir(path):
-                self.show_video_list(path)
-                return
-        if os.path.isfile(path):
-            self.open_video(path)
-
-    # === 精准查找相邻视频 ===
-    def _find_adjacent_video(self, direction):
-        if self.current_folder is None or not self.video_player or not self.video_player.video_path:
-            return None
-
-        current_path = self.video_player.video_path
-        items = []
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            item_path = item.data(VIDEO_PATH_ROLE)
-            if os.path.isfile(item_path):  # 只考虑视频文件
-                items.append(item_path)
-
-        try:
-            idx = items.index(current_path)
-        except ValueError:
-            return None
-
-        new_idx = idx + direction
-        if 0 <= new_idx < len(items):
-            return items[new_idx]
-        return None
-
-    def play_prev_video(self):
-        prev_path = self._find_adjacent_video(-1)
-        if prev_path:
-            self.open_video(prev_path)
-
-    def play_next_video(self):
-        next_path = self._find_adjacent_video(1)
-        if next_path:
-            self.open_video(next_path)
-
-    def open_video(self, video_path):
-        if self.video_player:
-            state = self.video_player.get_current_state()
-            if state and state['path']:
-                self.playback_states[state['path']] = state
-                self.save_playback_states()
-
-        if self.video_player is None:
-            self.main_layout.removeWidget(self.placeholder)
-            self.placeholder.setParent(None)
-            self.video_player = VideoPlayer()
-            self.video_player.play_pause_requested.connect(self.video_player.toggle_play_pause)
-            self.video_player.volume_changed.connect(self.video_player.set_volume)
-            self.video_player.seek_requested.connect(self.video_player.seek_to)
-            self.video_player.fullscreen_requested.connect(self.toggle_fullscreen)
-            self.video_player.close_requested.connect(self.release_video_player)
-            self.video_player.prev_video_requested.connect(self.play_prev_video)
-            self.video_player.next_video_requested.connect(self.play_next_video)
-            self.main_layout.insertWidget(1, self.video_player, stretch=3)
-
-        state = self.playback_states.get(video_path, {})
-        resume_time = state.get('time_ms', 0)
-        volume = state.get('volume', 100)
-        speed = state.get('speed', 1.0)
-        was_playing = state.get('playing', True)
-
-        self.video_player.load_video(video_path, resume_time, volume, speed)
-        self.video_player.setFocus()
-        self.update_current_context_ui()
-
-        if not was_playing:
-            QTimer.singleShot(300, lambda: self.video_player.toggle_play_pause())
-
-        # 高亮当前播放项（单选）
-        for i in range(self.list_widget.count()):
-            item = self.list_widget.item(i)
-            if item.data(VIDEO_PATH_ROLE) == video_path:
-                self.list_widget.setCurrentItem(item)
-                break
-
-    def closeEvent(self, event):
-        if self.video_player:
-            state = self.video_player.get_current_state()
-            if state and state['path']:
-                self.playback_states[state['path']] = state
-                self.save_playback_states()
-        event.accept()
-
-    def add_folder(self):
-        folder = QFileDialog.getExistingDirectory(self, "选择要添加的视频文件夹")
-        if folder:
-            folder = os.path.normpath(folder)
-            if folder not in self.data_manager.folders and os.path.exists(folder):
-                self.data_manager.folders.append(folder)
-                self.show_folder_list()
-                self.data_manager.save_folders(self.data_manager.folders)
-
-    def delete_folder(self):
-        if self.current_folder is not None:
-            return
-        current = self.list_widget.currentItem()
-        if not current:
-            return
-        index = self.list_widget.row(current)
-        if 0 <= index < len(self.data_manager.folders):
-            folder_to_remove = self.data_manager.folders[index]
-            reply = QMessageBox.question(self, '确认删除', f"确定要从列表中移除文件夹 '{folder_to_remove}' 吗？\n此操作不会删除硬盘上的实际文件。",
-                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-            if reply == QMessageBox.Yes:
-                del self.data_manager.folders[index]
-                self.show_folder_list()
-                self.data_manager.save_folders(self.data_manager.folders)
-
-    def toggle_fullscreen(self):
-        if self.is_fullscreen_mode:
-            self.showNormal()
-            self.is_fullscreen_mode = False
-            self.left_panel.show()
-            self.right_panel.show()
-            self.placeholder.hide()
-            self.main_layout.setContentsMargins(10, 10, 10, 10)
-        else:
-            self.is_fullscreen_mode = True
-            self.left_panel.hide()
-            self.right_panel.hide()
-            self.placeholder.hide()
-            self.main_layout.setContentsMargins(0, 0, 0, 0)
-            self.showFullScreen()
-            if self.video_player:
-                self.video_player.setFocus()
-
-    # === 右键菜单：添加/删除标签 ===
-    def on_right_click(self, position):
-        if self.current_folder is None:
-            return
-
-        selected_items = self.list_widget.selectedItems()
-        if not selected_items:
-            return
-
-        menu = QMenu(self)
-        add_tag_action = menu.addAction("添加标签")
-        remove_tag_action = menu.addAction("删除标签")
-        action = menu.exec_(self.list_widget.mapToGlobal(position))
-
-        if action == add_tag_action:
-            self.show_add_tag_dialog_for_selection(selected_items)
-        elif action == remove_tag_action:
-            self.show_remove_tag_dialog_for_selection(selected_items)
-
-    def show_add_tag_dialog_for_selection(self, selected_items):
-        if not self.data_manager.all_known_tags:
-            QMessageBox.information(self, "无可用标签", "当前没有可用的全局标签，请先添加标签。")
-            return
-
-        dialog = TagSelectionDialog(self.data_manager.all_known_tags, self, "选择要添加的标签")
-        if dialog.exec_() == QDialog.Accepted:
-            selected_tags = dialog.get_selected_tags()
-            if not selected_tags:
-                return
-
-            video_paths = []
-            for item in selected_items:
-                path = item.data(VIDEO_PATH_ROLE)
-                if path and os.path.isfile(path):
-                    video_paths.append(path)
-
-            for video_path in video_paths:
-                if video_path not in self.data_manager.all_videos_info:
-                    self.data_manager.all_videos_info[video_path] = {'tags': []}
-                existing_tags = set(self.data_manager.all_videos_info[video_path].get('tags', []))
-                existing_tags.update(selected_tags)
-                self.data_manager.all_videos_info[video_path]['tags'] = list(existing_tags)
-
-            self.data_manager.save_labels(self.data_manager.all_videos_info)
-            self.update_current_context_ui()
-            self.update_global_tags_list()
-
-    def show_remove_tag_dialog_for_selection(self, selected_items):
-        all_tags_in_selection = set()
-        video_paths = []
-        for item in selected_items:
-            path = item.data(VIDEO_PATH_ROLE)
-            if path and os.path.isfile(path):
-                video_paths.append(path)
-                tags = self.data_manager.all_videos_info.get(path, {}).get('tags', [])
-                all_tags_in_selection.update(tags)
-
-        if not all_tags_in_selection:
-            QMessageBox.information(self, "无可删除标签", "选中的视频没有标签。")
-            return
-
-        dialog = TagSelectionDialog(all_tags_in_selection, self, "选择要删除的标签")
-        if dialog.exec_() == QDialog.Accepted:
-            tags_to_remove = dialog.get_selected_tags()
-            if not tags_to_remove:
-                return
-
-            for video_path in video_paths:
-                if video_path in self.data_manager.all_videos_info:
-                    existing_tags = set(self.data_manager.all_videos_info[video_path].get('tags', []))
-                    existing_tags.difference_update(tags_to_remove)
-                    self.data_manager.all_videos_info[video_path]['tags'] = list(existing_tags)
-
-            self.data_manager.save_labels(self.data_manager.all_videos_info)
-            self.update_current_context_ui()
-            self.update_global_tags_list()
\ No newline at end of file
+# folder_video_manager.py
+import os
+import json
+import time
+from pathlib import Path
+from PyQt5.QtWidgets import (
+    QMainWindow, QWidget, QHBoxLayout, QVBoxLayout, QPushButton, QListWidget, QLabel,
+    QFileDialog, QMessageBox, QListWidgetItem, QScrollArea, QCheckBox,
+    QApplication, QMenu, QDialog, QComboBox, QTreeView, QAbstractItemView, QPlainTextEdit,
+    QInputDialog
+)
+from PyQt5.QtCore import Qt, QSize, QTimer, QItemSelectionModel
+from PyQt5.QtGui import QFont, QBrush, QColor
+from video_player import VideoPlayer
+from data_manager import DataManager
+from tag_index import FacetCounter
+from tag_hierarchy import TagHierarchyError
+from folder_health import FolderHealthMonitor, STATUS_ONLINE, STATUS_TEXT
+from offline_queue import PendingOperationQueue
+from scan_scheduler import ScanScheduler, STATE_TEXT, STATE_QUEUED, STATE_SCANNING
+from sort_keys import SORT_MODES, SORT_NAME, SORT_DURATION, SORT_LAST_PLAYED, SORT_TAG_COUNT, ListingTable
+from folder_tree_model import FolderTreeModel
+from duplicate_dialog import DuplicatesDialog
+from tag_completer import TagUsage, TagCompleter
+from tag_picker import TagPickerDialog, TagInputDialog
+from watch_history import WatchHistory
+from history_dialog import HistoryDialog
+from auto_tag_dialog import AutoTagRulesDialog
+from scan_rules_dialog import ScanRulesDialog
+from smart_folders import SmartFolderStore, SMART_PREFIX
+from smart_folder_dialog import SmartFolderDialog
+from file_ops import BatchFileMover, recover_interrupted, pending_migration
+from segments import SegmentStore, SegmentError
+from segment_dialog import SegmentSearchDialog
+from grid_player import GridPlayer
+from sprite_sheets import SpriteCache, SpriteSheetWorker, move_sprite_sheets, PRIORITY_PLAYING, PRIORITY_PREFETCH
+from file_ops_dialog import FileOpsDialog, MODE_MOVE, MODE_RENAME
+from log_utils import get_logger, dump_ring_buffer
+from local_api import (
+    LocalApiServer, HOST as API_HOST, DEFAULT_PORT as API_DEFAULT_PORT,
+    load_settings as load_api_settings, save_settings as save_api_settings, ensure_token as ensure_api_token
+)
+from ui_state import load_ui_state, save_ui_state, load_listing_snapshot, save_listing_snapshot
+from memory_diagnostics import (
+    SnapshotHistory, build_report, save_report, standard_leak_checks, format_leak_checks
+)
+
+# --- 尝试从 ui_components 导入，若失败则内联定义 ---
+try:
+    from ui_components import VIDEO_PATH_ROLE, VIDEO_EXTENSIONS
+except ImportError:
+    from PyQt5.QtCore import Qt
+    VIDEO_PATH_ROLE = Qt.UserRole + 1
+    VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv', '.webm', '.m4v'}
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+PLAYBACK_STATE_FILE = os.path.join(SAVE_DIR, "video_playback_state.json")
+os.makedirs(SAVE_DIR, exist_ok=True)
+
+
+class FolderVideoManager(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("文件夹视频管理器 (Final V22)")
+        self.resize(1400, 750)
+        # 上次批量移动/重命名在中途退出：先把已移动的文件移回原处，再加载以原路径为键的数据
+        recovered = recover_interrupted()
+        self.data_manager = DataManager()
+        self.selected_filter_tags = set()
+        self.current_folder = None
+        self.video_player = None
+        self.grid_player = None
+        self.current_selected_video_path = None
+        self.is_fullscreen_mode = False
+        self.playback_states = self.load_playback_states()
+        self.watch_history = WatchHistory()
+        if self.watch_history.created:
+            self.watch_history.import_playback_states(self.playback_states)
+        self.current_folder_videos = []
+        self.global_tag_checkboxes = {}
+        self.global_tag_rows = {}
+        # 全局标签面板中折叠起来的父标签
+        self.collapsed_tags = set()
+        # 标签选择/输入共用同一个补全索引与最近/常用统计
+        self.tag_usage = TagUsage()
+        self.tag_completer = TagCompleter(self.tag_usage)
+        self.facets = FacetCounter(self.data_manager.tag_index, self.data_manager.get_tags)
+        self.data_manager.add_tag_listener(self.facets.update_path)
+        self.data_manager.add_tag_listener(self.on_tags_changed_for_sort)
+        # 智能文件夹：物化的结果集随标签修改、扫描变化、播放记录增量更新
+        self.smart_folders = SmartFolderStore(self.data_manager, self.watch_history)
+        self.smart_folders.load()
+        self.smart_folders.on_changed = lambda: QTimer.singleShot(0, self.apply_smart_folder_changes)
+        self.data_manager.add_tag_listener(self.smart_folders.on_tags)
+        self.data_manager.add_scan_listener(self.smart_folders.on_scan_delta)
+        self.smart_items = {}
+        # 片段标签：每个视频的时间段标签，全库按标签/时长建索引
+        self.segments = SegmentStore()
+        self.segments.load()
+        # 进度条悬停预览：后台生成每个视频的缩略图拼图，查看时按 LRU 缓存
+        self.sprite_cache = SpriteCache()
+        self.sprite_worker = SpriteSheetWorker(parent=self)
+        self.sprite_worker.ready.connect(self.sprite_cache.invalidate)
+        self.listing = None
+        self.current_index = None
+        self.sort_mode = SORT_NAME
+        self.tree_mode = False
+        self.folder_items = {}
+        self.offline_view = False
+        # 当前文件夹的状态还是上次会话缓存的结果：本次会话首次检测返回前不扫描、不同步旁注文件
+        self.awaiting_probe = False
+        self.pending_ops = PendingOperationQueue()
+        # 查找重复视频前等待首次扫描完成的文件夹
+        self.duplicate_scans = set()
+        self.folder_health = FolderHealthMonitor(parent=self)
+        self.folder_health.status_changed.connect(self.on_folder_status_changed)
+        self.folder_health.probed.connect(self.on_folder_probed)
+        self.data_manager.on_io_error = self.folder_health.report_failure
+        # 所有扫描经由调度器：按磁盘排队，正在浏览的文件夹优先
+        self.scan_scheduler = ScanScheduler(
+            self.data_manager.scan_indexes, device_of=self.folder_health.device_of, parent=self
+        )
+        self.scan_scheduler.progress.connect(self.on_scan_progress)
+        self.scan_scheduler.finished.connect(self.on_scan_finished)
+        self.scan_scheduler.failed.connect(self.on_scan_failed)
+
+        central = QWidget()
+        self.setCentralWidget(central)
+        self.main_layout = QHBoxLayout(central)
+        self.main_layout.setSpacing(10)
+        self.main_layout.setContentsMargins(10, 10, 10, 10)
+
+        # 左侧面板
+        self.left_panel = QWidget()
+        left_layout = QVBoxLayout(self.left_panel)
+        left_layout.setContentsMargins(0, 0, 0, 0)
+        self.sort_combo = QComboBox()
+        self.sort_combo.setFont(QFont("SimHei", 11))
+        for mode, text, _ in SORT_MODES:
+            self.sort_combo.addItem(f"排序: {text}", mode)
+        self.sort_combo.currentIndexChanged.connect(self.on_sort_mode_changed)
+        left_layout.addWidget(self.sort_combo)
+        self.list_widget = QListWidget()
+        self.list_widget.setMinimumWidth(280)
+        self.list_widget.setMaximumWidth(280)
+        self.list_widget.setSelectionMode(QListWidget.ExtendedSelection)
+        self.list_widget.itemDoubleClicked.connect(self.on_item_double_clicked)
+        self.list_widget.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.list_widget.customContextMenuRequested.connect(self.on_right_click)
+        self.list_widget.setFont(QFont("SimHei", 12))
+        left_layout.addWidget(self.list_widget)
+
+        # 树状浏览：逐层展开，目录显示子树视频数/命中数
+        self.tree_model = FolderTreeModel(self)
+        self.tree_model.index_changed.connect(lambda: QTimer.singleShot(0, self.refresh_listing_from_index))
+        self.tree_view = QTreeView()
+        self.tree_view.setModel(self.tree_model)
+        self.tree_view.setHeaderHidden(True)
+        self.tree_view.setMinimumWidth(280)
+        self.tree_view.setMaximumWidth(280)
+        self.tree_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.tree_view.doubleClicked.connect(lambda index: self.activate_path(index.data(VIDEO_PATH_ROLE)))
+        self.tree_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.tree_view.customContextMenuRequested.connect(self.on_right_click)
+        self.tree_view.setFont(QFont("SimHei", 12))
+        self.tree_view.hide()
+        left_layout.addWidget(self.tree_view)
+        self.main_layout.addWidget(self.left_panel)
+
+        # 视频占位
+        self.placeholder = QWidget()
+        self.placeholder.setStyleSheet("background-color: #000;")
+        self.main_layout.addWidget(self.placeholder, stretch=3)
+
+        # 右侧面板
+        self.right_panel = QWidget()
+        right_layout = QVBoxLayout(self.right_panel)
+        right_layout.setContentsMargins(0, 0, 0, 0)
+        right_layout.setSpacing(10)
+
+        self.current_video_name_label = QLabel("当前未选择任何视频文件")
+        self.current_video_name_label.setFont(QFont("SimHei", 12))
+        self.current_video_name_label.setStyleSheet("color: #333;")
+        self.current_video_name_label.setWordWrap(True)
+        right_layout.addWidget(self.current_video_name_label)
+
+        self.current_video_tags_label = QLabel("当前视频标签")
+        self.current_video_tags_label.setFont(QFont("SimHei", 12, QFont.Bold))
+        right_layout.addWidget(self.current_video_tags_label)
+        self.current_tags_scroll = QScrollArea()
+        self.current_tags_scroll.setWidgetResizable(True)
+        self.current_tags_widget = QWidget()
+        self.current_tags_layout = QVBoxLayout(self.current_tags_widget)
+        self.current_tags_layout.setContentsMargins(5, 5, 5, 5)
+        self.current_tags_layout.setSpacing(5)
+        self.current_tags_layout.setAlignment(Qt.AlignTop)
+        self.current_tags_scroll.setWidget(self.current_tags_widget)
+        right_layout.addWidget(self.current_tags_scroll, stretch=1)
+
+        tag_header_layout = QHBoxLayout()
+        self.global_tags_label = QLabel("全局已知标签列表")
+        self.global_tags_label.setFont(QFont("SimHei", 12, QFont.Bold))
+        tag_header_layout.addWidget(self.global_tags_label)
+        add_global_tag_btn = QPushButton("+")
+        add_global_tag_btn.setFixedSize(24, 24)
+        add_global_tag_btn.setStyleSheet("""
+            QPushButton {
+                background: #4CAF50;
+                color: white;
+                border: none;
+                border-radius: 4px;
+                font-size: 12px;
+            }
+            QPushButton:hover {
+                background: #45a049;
+            }
+        """)
+        add_global_tag_btn.clicked.connect(self.add_new_global_tag)
+        tag_header_layout.addWidget(add_global_tag_btn)
+        tag_header_layout.addStretch()
+        right_layout.addLayout(tag_header_layout)
+
+        self.global_tags_scroll = QScrollArea()
+        self.global_tags_scroll.setWidgetResizable(True)
+        self.global_tags_widget = QWidget()
+        self.global_tags_layout = QVBoxLayout(self.global_tags_widget)
+        self.global_tags_layout.setContentsMargins(5, 5, 5, 5)
+        self.global_tags_layout.setSpacing(5)
+        self.global_tags_layout.setAlignment(Qt.AlignTop)
+        self.global_tags_scroll.setWidget(self.global_tags_widget)
+        right_layout.addWidget(self.global_tags_scroll, stretch=2)
+
+        self.main_layout.addWidget(self.right_panel, stretch=1)
+
+        toolbar = self.addToolBar("工具栏")
+        toolbar.setIconSize(QSize(24, 24))
+        self.back_action = toolbar.addAction("← 返回上级目录", self.go_back)
+        self.back_action.setEnabled(False)
+        toolbar.addSeparator()
+        toolbar.addAction("添加视频文件夹", self.add_folder)
+        toolbar.addAction("删除视频文件夹", self.delete_folder)
+        toolbar.addAction("新建智能文件夹", self.add_smart_folder)
+        toolbar.addSeparator()
+        self.tree_mode_action = toolbar.addAction("树状浏览", self.toggle_tree_mode)
+        self.tree_mode_action.setCheckable(True)
+        toolbar.addAction("查找重复视频", self.find_duplicates)
+        toolbar.addAction("观看记录", self.show_watch_history)
+        toolbar.addAction("片段", self.show_segments)
+        toolbar.addAction("宫格预览", self.show_grid_for_selection)
+        toolbar.addAction("自动标签规则", self.edit_auto_tag_rules)
+        toolbar.addAction("导出调试日志", self.export_debug_log)
+        self.api_action = toolbar.addAction("本地 API", self.toggle_local_api)
+        self.api_action.setCheckable(True)
+
+        # 调试菜单：内存诊断
+        self.memory_snapshots = SnapshotHistory()
+        debug_menu = self.menuBar().addMenu("调试")
+        debug_menu.addAction("内存报告", self.show_memory_report)
+        debug_menu.addAction("记录内存快照并与上一次对比", self.take_memory_snapshot)
+        debug_menu.addAction("泄漏检查 (播放器 / 标签面板)", self.run_leak_checks)
+
+        # 可选的本机 HTTP/JSON 接口（默认关闭）
+        self.api_settings = load_api_settings()
+        self.local_api = LocalApiServer(
+            self.data_manager, self.api_settings.get('port', API_DEFAULT_PORT), on_mutated=self.on_api_mutated,
+            token=ensure_api_token(self.api_settings)
+        )
+        if self.api_settings.get('enabled'):
+            self.api_action.setChecked(self.local_api.start())
+
+        # 上次批量移动/重命名在迁移各个存储时中断：文件已在新位置，把迁移重跑一遍
+        migrated = pending_migration()
+        if migrated:
+            self.apply_file_moves(migrated)
+            BatchFileMover().finish()
+
+        # 回到上次离开时的界面：先按快照画出列表，扫描索引在下一轮事件循环中加载
+        ui_state = load_ui_state()
+        self.collapsed_tags = set(ui_state.get('collapsed_tags', []))
+        if not self.restore_ui_state(ui_state):
+            self.show_folder_list()
+        self.update_global_tags_list()
+        self.folder_health.probe_all(self.data_manager.folders)
+        if recovered:
+            self.statusBar().showMessage(f"上次的批量移动/重命名未完成，已把 {recovered} 个文件移回原处")
+        elif migrated:
+            self.statusBar().showMessage(f"上次的批量移动/重命名未完成，已为 {len(migrated)} 个文件继续迁移标签与播放进度")
+
+        # 定期合并其他进程/脚本对同一存储的修改
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self.sync_with_store)
+        self.sync_timer.start(2000)
+
+    def load_playback_states(self):
+        if os.path.exists(PLAYBACK_STATE_FILE):
+            try:
+                with open(PLAYBACK_STATE_FILE, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                log.warning("读取播放状态失败: %s", e)
+                return {}
+        return {}
+
+    def save_playback_states(self):
+        try:
+            with open(PLAYBACK_STATE_FILE, 'w', encoding='utf-8') as f:
+                json.dump(self.playback_states, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            log.warning("保存播放状态失败: %s", e)
+
+    def store_current_playback_state(self):
+        state = self.video_player.get_current_state()
+        if state and state['path']:
+            state['last_played'] = time.time()
+            self.playback_states[state['path']] = state
+            self.save_playback_states()
+            if self.watch_history.end(state['time_ms'], state['duration_ms']):
+                self.smart_folders.on_played(state['path'])
+            if self.listing is not None and state['path'] in self.listing.position:
+                self.listing.invalidate(SORT_LAST_PLAYED, SORT_DURATION)
+
+    def active_view(self):
+        return self.tree_view if self.tree_view.isVisible() else self.list_widget
+
+    def selected_video_paths(self):
+        if self.current_folder is None:
+            return []
+        if self.active_view() is self.tree_view:
+            paths = [index.data(VIDEO_PATH_ROLE) for index in self.tree_view.selectionModel().selectedIndexes()]
+        else:
+            paths = [item.data(VIDEO_PATH_ROLE) for item in self.list_widget.selectedItems()]
+        return [p for p in paths if self.is_video_entry(p)]
+
+    def update_current_context_ui(self):
+        selected_paths = self.selected_video_paths()
+        if selected_paths:
+            path = selected_paths[0]
+            self.current_selected_video_path = path
+            filename = os.path.basename(path)
+            self.current_video_name_label.setText(f"当前选中视频文件: {filename}")
+            self.update_current_tags_ui(self.data_manager.get_tags(path))
+            return
+        self.current_selected_video_path = None
+        self.current_video_name_label.setText("当前未选择任何视频文件")
+        self.update_current_tags_ui([])
+
+    def update_current_tags_ui(self, tags):
+        while self.current_tags_layout.count():
+            child = self.current_tags_layout.takeAt(0)
+            if child.widget():
+                child.widget().deleteLater()
+        for tag in sorted(tags):
+            container = QWidget()
+            container_layout = QHBoxLayout(container)
+            container_layout.setContentsMargins(0, 0, 0, 0)
+            label = QLabel(tag)
+            label.setFont(QFont("SimHei", 12))
+            label.setStyleSheet("""
+                background-color: #e0e0e0;
+                border: 1px solid #aaa;
+                border-radius: 6px;
+                padding: 4px 8px;
+                color: #333;
+            """)
+            remove_btn = QPushButton("×")
+            remove_btn.setFixedSize(16, 16)
+            remove_btn.setStyleSheet("""
+                QPushButton {
+                    background: #ff6666;
+                    color: white;
+                    border: none;
+                    border-radius: 8px;
+                    font-size: 10px;
+                }
+                QPushButton:hover {
+                    background: #cc3333;
+                }
+            """)
+            remove_btn.clicked.connect(lambda _, t=tag: self.remove_tag_from_current_video(t))
+            container_layout.addWidget(label)
+            container_layout.addWidget(remove_btn)
+            self.current_tags_layout.addWidget(container)
+        self.current_tags_layout.addStretch()
+
+    def update_global_tags_list(self):
+        while self.global_tags_layout.count():
+            child = self.global_tags_layout.takeAt(0)
+            if child.widget():
+                child.widget().deleteLater()
+        self.global_tag_checkboxes = {}
+        self.global_tag_rows = {}
+        self.tag_completer.refresh(self.data_manager.all_known_tags)
+        # 按层级深度优先排列，子标签缩进显示在父标签之下
+        hierarchy = self.data_manager.tag_hierarchy
+        stack = list(reversed(hierarchy.roots(self.data_manager.all_known_tags)))
+        while stack:
+            tag = stack.pop()
+            self.global_tags_layout.addWidget(self._global_tag_row(tag, hierarchy))
+            stack.extend(sorted(hierarchy.children_of(tag), reverse=True))
+        self.global_tags_layout.addStretch()
+        self.apply_tag_collapse()
+        self.update_facet_counts()
+
+    def _global_tag_row(self, tag, hierarchy):
+        row = QWidget()
+        row_layout = QHBoxLayout(row)
+        row_layout.setContentsMargins(hierarchy.depth(tag) * 18, 0, 0, 0)
+        if hierarchy.has_children(tag):
+            toggle_btn = QPushButton("▸" if tag in self.collapsed_tags else "▾")
+            toggle_btn.setFixedSize(18, 24)
+            toggle_btn.setFlat(True)
+            toggle_btn.clicked.connect(lambda _, t=tag, b=toggle_btn: self.toggle_tag_collapsed(t, b))
+            row_layout.addWidget(toggle_btn)
+        else:
+            row_layout.addSpacing(18)
+        cb = QCheckBox(tag)
+        cb.setFont(QFont("SimHei", 12))
+        cb.setChecked(tag in self.selected_filter_tags)
+        cb.stateChanged.connect(lambda state, t=tag: self.toggle_filter_tag(t, state == Qt.Checked))
+        row_layout.addWidget(cb)
+        self.global_tag_checkboxes[tag] = cb
+        add_btn = QPushButton("+")
+        add_btn.setFixedSize(24, 24)
+        add_btn.setStyleSheet("""
+            QPushButton {
+                background: #4CAF50;
+                color: white;
+                border: none;
+                border-radius: 4px;
+                font-size: 12px;
+            }
+            QPushButton:hover {
+                background: #45a049;
+            }
+        """)
+        add_btn.clicked.connect(lambda _, t=tag: self.add_tag_to_current_video(t))
+        row_layout.addWidget(add_btn)
+        edit_btn = QPushButton("✏️")
+        edit_btn.setFixedSize(24, 24)
+        edit_btn.clicked.connect(lambda _, t=tag: self.rename_global_tag(t))
+        row_layout.addWidget(edit_btn)
+        delete_btn = QPushButton("🗑️")
+        delete_btn.setFixedSize(24, 24)
+        delete_btn.clicked.connect(lambda _, t=tag: self.delete_global_tag(t))
+        row_layout.addWidget(delete_btn)
+        row.setContextMenuPolicy(Qt.CustomContextMenu)
+        row.customContextMenuRequested.connect(lambda pos, t=tag, r=row: self.show_global_tag_menu(t, r.mapToGlobal(pos)))
+        self.global_tag_rows[tag] = row
+        return row
+
+    def toggle_tag_collapsed(self, tag, button):
+        if tag in self.collapsed_tags:
+            self.collapsed_tags.discard(tag)
+            button.setText("▾")
+        else:
+            self.collapsed_tags.add(tag)
+            button.setText("▸")
+        self.apply_tag_collapse()
+
+    def apply_tag_collapse(self):
+        # 只切换可见性，不重建控件
+        hierarchy = self.data_manager.tag_hierarchy
+        for tag, row in self.global_tag_rows.items():
+            row.setVisible(self.collapsed_tags.isdisjoint(hierarchy.ancestors(tag)))
+
+    def show_global_tag_menu(self, tag, global_pos):
+        hierarchy = self.data_manager.tag_hierarchy
+        menu = QMenu(self)
+        parent_action = menu.addAction("设置父标签…")
+        top_action = menu.addAction("移到顶层")
+        top_action.setEnabled(hierarchy.parent_of(tag) is not None)
+        action = menu.exec_(global_pos)
+        if action == parent_action:
+            candidates = sorted(self.data_manager.all_known_tags - hierarchy.subtree(tag))
+            if not candidates:
+                return
+            current = hierarchy.parent_of(tag)
+            parent, ok = QInputDialog.getItem(
+                self, "设置父标签", f"'{tag}' 的父标签（按父标签筛选时包含其所有子标签）：", candidates,
+                candidates.index(current) if current in candidates else 0, False
+            )
+            if ok and parent:
+                self.set_global_tag_parent(tag, parent)
+        elif action == top_action:
+            self.set_global_tag_parent(tag, None)
+
+    def set_global_tag_parent(self, tag, parent):
+        try:
+            self.data_manager.set_tag_parent(tag, parent)
+        except TagHierarchyError as e:
+            QMessageBox.warning(self, "无法设置父标签", str(e))
+            return
+        self.refresh_after_hierarchy_change()
+
+    def refresh_after_hierarchy_change(self):
+        # 层级变化会改变父标签覆盖的视频：重新计算筛选结果与各标签计数
+        self.smart_folders.sync_hierarchy()
+        self.refresh_player_segments()
+        self.facets.reset(self.facets.view, self.selected_filter_tags)
+        if self.current_folder is not None and self.listing is not None:
+            self.render_video_list()
+        self.refresh_after_tag_change()
+
+    def update_facet_counts(self):
+        # 只改文字和可用状态，不重建控件；结果为 0 的标签置灰
+        in_folder = self.current_folder is not None
+        for tag, cb in self.global_tag_checkboxes.items():
+            checked = tag in self.selected_filter_tags
+            if in_folder:
+                count = self.facets.count(tag)
+                cb.setText(f"{tag} ({count})")
+                cb.setEnabled(checked or count > 0)
+            else:
+                cb.setText(tag)
+                cb.setEnabled(True)
+            if cb.isChecked() != checked:
+                cb.blockSignals(True)
+                cb.setChecked(checked)
+                cb.blockSignals(False)
+
+    def add_tag_to_current_video(self, tag):
+        if not self.current_selected_video_path:
+            QMessageBox.warning(self, "无选中视频", "请先选择一个视频文件。")
+            return
+        self.tag_usage.record([tag])
+        if self.data_manager.add_tags([self.current_selected_video_path], [tag]):
+            self.refresh_after_tag_change(global_list=False)
+
+    def remove_tag_from_current_video(self, tag):
+        if not self.current_selected_video_path:
+            return
+        if self.data_manager.remove_tags([self.current_selected_video_path], [tag]):
+            self.refresh_after_tag_change()
+
+    def add_new_global_tag(self):
+        tag, ok = TagInputDialog.get_tag(self.tag_completer, self, "添加新标签", "请输入新标签名称：")
+        if ok and tag.strip():
+            tag = tag.strip()
+            if not self.data_manager.add_known_tag(tag):
+                QMessageBox.warning(self, "标签已存在", f"标签 '{tag}' 已存在于全局标签列表中。")
+                return
+            self.update_global_tags_list()
+
+    def rename_global_tag(self, old_tag):
+        new_tag, ok = TagInputDialog.get_tag(
+            self.tag_completer, self, "重命名标签", "请输入新标签名称：", text=old_tag
+        )
+        if ok and new_tag.strip():
+            new_tag = new_tag.strip()
+            if new_tag == old_tag:
+                return
+            if new_tag in self.data_manager.all_known_tags:
+                QMessageBox.warning(self, "标签已存在", f"标签 '{new_tag}' 已存在。")
+                return
+            if old_tag in self.selected_filter_tags:
+                self.selected_filter_tags.discard(old_tag)
+                self.selected_filter_tags.add(new_tag)
+            self.data_manager.rename_tag(old_tag, new_tag)
+            self.tag_usage.rename(old_tag, new_tag)
+            self.smart_folders.rename_tag(old_tag, new_tag)
+            if self.segments.rename_tag(old_tag, new_tag):
+                self.segments.save()
+            self.refresh_after_hierarchy_change()
+
+    def delete_global_tag(self, tag_to_delete):
+        reply = QMessageBox.question(
+            self, '确认删除', f"确定要永久删除全局标签 '{tag_to_delete}' 吗？\n该标签将从所有视频中移除。",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        with_children = False
+        descendants = self.data_manager.tag_hierarchy.descendants(tag_to_delete)
+        if descendants:
+            reply = QMessageBox.question(
+                self, '子标签', f"'{tag_to_delete}' 下还有 {len(descendants)} 个子标签，是否一起删除？\n"
+                                f"选择“否”则子标签移到上一级并保留。",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel, QMessageBox.No
+            )
+            if reply == QMessageBox.Cancel:
+                return
+            with_children = reply == QMessageBox.Yes
+        doomed = {tag_to_delete} | (set(descendants) if with_children else set())
+        self.selected_filter_tags -= doomed
+        self.data_manager.delete_tag(tag_to_delete, with_children)
+        for tag in doomed:
+            self.tag_usage.forget(tag)
+        self.smart_folders.forget_tags(doomed)
+        if self.segments.forget_tags(doomed):
+            self.segments.save()
+        self.refresh_after_hierarchy_change()
+
+    def sync_with_store(self):
+        self.smart_folders.save_if_dirty()
+        changed, tags_changed = self.data_manager.sync()
+        if tags_changed:
+            self.refresh_after_hierarchy_change()
+        elif self.current_selected_video_path in changed:
+            self.refresh_after_tag_change(global_list=False)
+        elif not changed.isdisjoint(self.facets.view):
+            self.update_facet_counts()
+
+    def refresh_after_tag_change(self, global_list=True):
+        # 一次批量操作之后只刷新一次界面
+        self.update_current_context_ui()
+        if global_list:
+            self.update_global_tags_list()
+        else:
+            self.update_facet_counts()
+
+    def toggle_filter_tag(self, tag, checked):
+        if checked:
+            self.selected_filter_tags.add(tag)
+            self.tag_usage.record([tag])
+        else:
+            self.selected_filter_tags.discard(tag)
+        if self.current_folder:
+            # 复用已扫描的文件列表，只重新计算筛选结果
+            self.facets.set_filter(self.selected_filter_tags)
+            self.render_video_list()
+            self.update_facet_counts()
+
+    def show_folder_list(self):
+        self.save_current_index()
+        if self.current_folder is not None and self.folder_health.is_online(self.current_folder):
+            self.data_manager.sync_sidecar(self.current_folder)
+        self.data_manager.close_folder()
+        self.current_index = None
+        self.current_folder = None
+        self.back_action.setEnabled(False)
+        self.tree_view.hide()
+        self.list_widget.show()
+        self.list_widget.clear()
+        self.folder_items = {}
+        for folder in self.data_manager.folders:
+            item = QListWidgetItem(folder)
+            item.setData(VIDEO_PATH_ROLE, folder)
+            self.list_widget.addItem(item)
+            self.folder_items[folder] = item
+            self.update_folder_item(folder)
+        # 智能文件夹排在真实文件夹之后，删除文件夹按行号对应 folders 的逻辑不受影响
+        self.smart_items = {}
+        for smart in self.smart_folders.ordered():
+            item = QListWidgetItem()
+            item.setData(VIDEO_PATH_ROLE, smart.key)
+            item.setForeground(QBrush(QColor("#1565c0")))
+            self.list_widget.addItem(item)
+            self.smart_items[smart.id] = item
+            self.update_smart_item(smart)
+        self.current_folder_videos = []
+        self.listing = None
+        self.facets.clear()
+        self.update_facet_counts()
+
+    def update_folder_item(self, folder):
+        item = self.folder_items.get(folder)
+        if item is None:
+            return
+        status = self.folder_health.get_status(folder)
+        if status == STATUS_ONLINE:
+            text = folder
+            scan = self.scan_scheduler.state_of(folder)
+            if scan is not None and scan[0] == STATE_SCANNING:
+                text = f"{folder}  [{STATE_TEXT[STATE_SCANNING]} {scan[2]}]"
+            elif scan is not None and scan[0] == STATE_QUEUED:
+                text = f"{folder}  [{STATE_TEXT[STATE_QUEUED]}]"
+            item.setText(text)
+            item.setForeground(QBrush(QColor("#000")))
+        else:
+            item.setText(f"{folder}  [{STATUS_TEXT[status]}]")
+            item.setForeground(QBrush(QColor("#999")))
+
+    def on_folder_status_changed(self, folder, status):
+        if self.current_folder is None:
+            self.update_folder_item(folder)
+        elif folder == self.current_folder and self.offline_view and status == STATUS_ONLINE:
+            # 正在浏览离线快照的文件夹重新上线：按目录 mtime 增量核对
+            self.show_video_list(folder)
+        if status == STATUS_ONLINE:
+            changed = self.data_manager.sync_sidecar(folder)
+            if changed and self.current_folder is not None:
+                self.refresh_after_tag_change()
+            self.run_pending_operations(folder)
+
+    def on_folder_probed(self, folder, ok):
+        # 检测可访问后在后台增量核对一遍，正在浏览的文件夹会插到队列最前面
+        if ok:
+            self.scan_scheduler.request(folder)
+        else:
+            self.scan_scheduler.cancel(folder)
+        if folder == self.current_folder and self.awaiting_probe and self.current_smart() is None:
+            self.show_video_list(folder, warm=True)
+
+    # === 扫描调度进度 ===
+    def on_scan_progress(self, root, dirs, files):
+        if self.current_folder is None:
+            self.update_folder_item(root)
+        elif root == self.current_folder and not self.offline_view:
+            state = self.scan_scheduler.state_of(root)
+            if state is not None and state[0] == STATE_SCANNING:
+                self.statusBar().showMessage(f"正在扫描: 已核对 {dirs} 个目录，发现 {files} 个视频")
+            elif state is not None and state[0] == STATE_QUEUED:
+                self.statusBar().showMessage("等待同一磁盘上的其他扫描完成…")
+
+    def on_scan_finished(self, root, added, removed, changed):
+        self.duplicate_scan_done(root)
+        if added or removed or changed:
+            self.local_api.notify('scan', root=root, added=len(added), removed=len(removed), changed=len(changed))
+        if self.current_folder is None:
+            self.update_folder_item(root)
+            return
+        if added or changed:
+            # 自动打标签可能新增了全局标签
+            self.update_global_tags_list()
+        if root == self.current_folder and not self.offline_view:
+            self.statusBar().clearMessage()
+            self.data_manager.open_folder(root, self.current_index.scan_root)
+            if added or removed or changed or self.listing is None or not self.listing.paths:
+                self.refresh_listing_from_index()
+
+    def on_scan_failed(self, root, message):
+        self.duplicate_scan_done(root)
+        self.folder_health.report_failure(root)
+        if self.current_folder is None:
+            self.update_folder_item(root)
+        elif root == self.current_folder:
+            self.statusBar().showMessage(f"扫描失败: {message}")
+
+    def run_pending_operations(self, folder):
+        for op in self.pending_ops.take(folder):
+            if op['op'] == 'play':
+                path = op['args']['path']
+                reply = QMessageBox.question(
+                    self, '文件夹已重新连接', f"文件夹 '{folder}' 已重新连接，是否播放之前排队的视频？\n{os.path.basename(path)}",
+                    QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+                )
+                if reply == QMessageBox.Yes and os.path.isfile(path):
+                    self.open_video(path)
+
+    def is_video_entry(self, path):
+        # 当前列表中的视频（离线快照中的条目也算），不访问磁盘
+        return bool(path) and self.current_folder is not None and path in self.facets.view
+
+    def show_video_list(self, folder_path, warm=False):
+        # warm: 列表中已是快照内容，只应用差异，保留选中项和滚动位置
+        self.save_current_index()
+        self.current_folder = folder_path
+        self.back_action.setEnabled(True)
+        self.sort_combo.setEnabled(not self.tree_mode)
+        index = self.data_manager.scan_indexes.get(folder_path)
+        self.current_index = index
+        self.offline_view = not self.folder_health.is_online(folder_path)
+        self.awaiting_probe = folder_path not in self.folder_health.confirmed
+        if self.awaiting_probe:
+            # 缓存的在线状态可能已经过期（例如 NAS 已休眠），先显示快照，检测结果由 on_folder_probed 接手
+            self.statusBar().showMessage("正在检测文件夹是否可访问…")
+        elif self.offline_view:
+            scanned = time.strftime("%Y-%m-%d %H:%M", time.localtime(index.scanned_at))
+            self.statusBar().showMessage(f"文件夹离线，正在浏览 {scanned} 的索引快照（可查看和编辑标签）")
+        elif self.tree_mode:
+            # 树状浏览不做整棵树的递归扫描，展开某一层时才核对该层目录
+            self.statusBar().clearMessage()
+        else:
+            # 先显示上次的索引快照，扫描完成后再应用变化
+            self.statusBar().clearMessage()
+            self.scan_scheduler.prioritize(folder_path)
+        self.data_manager.open_folder(folder_path, index.scan_root)
+        if not self.offline_view and not self.awaiting_probe:
+            self.data_manager.sync_sidecar(folder_path)
+        self.load_listing_from_index()
+        self.render_video_list(reset=not warm)
+        self.update_facet_counts()
+
+    def load_listing_from_index(self):
+        self.set_listing(self.current_index.table())
+
+    def set_listing(self, listing):
+        self.listing = listing
+        self.listing.set_dynamic_key(SORT_DURATION, self._duration_key)
+        self.listing.set_dynamic_key(SORT_LAST_PLAYED, self._last_played_key)
+        self.listing.set_dynamic_key(SORT_TAG_COUNT, self._tag_count_key)
+        videos = self.listing.paths
+        self.current_folder_videos = videos
+        self.facets.reset(videos, self.selected_filter_tags)
+
+    def refresh_listing_from_index(self):
+        # 树状浏览展开时发现目录内容有变化
+        if self.current_folder is None or self.current_index is None:
+            return
+        self.load_listing_from_index()
+        self.render_video_list()
+        self.update_facet_counts()
+
+    def save_current_index(self):
+        if self.current_index is not None and self.current_index.dirty:
+            self.current_index.save()
+
+    def toggle_tree_mode(self, checked):
+        self.tree_mode = checked
+        if self.current_smart() is not None:
+            # 智能文件夹没有目录结构，始终按列表显示
+            return
+        self.sort_combo.setEnabled(not checked)
+        if self.current_folder is not None:
+            self.show_video_list(self.current_folder)
+
+    def render_video_list(self, reset=False):
+        if self.tree_mode and self.current_index is not None:
+            self.list_widget.hide()
+            self.tree_view.show()
+            filtering = bool(self.selected_filter_tags)
+            if reset:
+                self.tree_model.set_source(self.current_index, not self.offline_view, self.facets.result, filtering)
+            else:
+                self.tree_model.set_matches(self.facets.result, filtering)
+            return
+        self.tree_view.hide()
+        self.list_widget.show()
+        paths = self.listing.ordered(self.sort_mode, self.facets.result)
+        if reset or not self._apply_listing_diff(paths):
+            self.list_widget.clear()
+            for video_path in paths:
+                self.list_widget.addItem(self._video_item(video_path))
+
+    def _video_item(self, video_path):
+        item = QListWidgetItem(os.path.basename(video_path))
+        item.setData(VIDEO_PATH_ROLE, video_path)
+        if self.offline_view:
+            item.setForeground(QBrush(QColor("#999")))
+        return item
+
+    def _apply_listing_diff(self, paths):
+        # 只删除消失的行、插入新增的行，选中项和滚动位置不变；
+        # 保留下来的行相对顺序变了（例如换了排序方式）或差异过大时返回 False，由调用方重建
+        lw = self.list_widget
+        shown = [lw.item(row).data(VIDEO_PATH_ROLE) for row in range(lw.count())]
+        wanted = set(paths)
+        kept = [p for p in shown if p in wanted]
+        kept_set = set(kept)
+        churn = len(shown) - len(kept) + len(paths) - len(kept)
+        if churn > max(len(paths), len(shown)) // 2 + 16:
+            return False
+        if kept != [p for p in paths if p in kept_set]:
+            return False
+        for row in range(len(shown) - 1, -1, -1):
+            if shown[row] not in wanted:
+                lw.takeItem(row)
+        for row, video_path in enumerate(paths):
+            if video_path not in kept_set:
+                lw.insertItem(row, self._video_item(video_path))
+        return True
+
+    # === 界面状态：退出时保存，启动时先按快照恢复，再在后台核对 ===
+    def save_ui_state(self):
+        state = {
+            'folder': self.current_folder,
+            'filter_tags': sorted(self.selected_filter_tags),
+            'sort_mode': self.sort_mode,
+            'tree_mode': self.tree_mode,
+            'selection': self.selected_video_paths()[:1000],
+            'top': None,
+            'collapsed_tags': sorted(self.collapsed_tags & self.data_manager.all_known_tags),
+        }
+        shown = []
+        if self.current_folder is not None and not self.tree_mode and self.current_smart() is None:
+            top = self.list_widget.itemAt(0, 0)
+            state['top'] = top.data(VIDEO_PATH_ROLE) if top is not None else None
+            shown = [self.list_widget.item(row).data(VIDEO_PATH_ROLE) for row in range(self.list_widget.count())]
+        save_ui_state(state)
+        save_listing_snapshot(self.current_folder if shown else None, shown)
+
+    def restore_ui_state(self, state):
+        folder = state.get('folder')
+        smart = self.smart_folders.get(folder)
+        if smart is None and (not folder or folder not in self.data_manager.folders):
+            return False
+        sort_row = self.sort_combo.findData(state.get('sort_mode', SORT_NAME))
+        if sort_row >= 0:
+            self.sort_combo.blockSignals(True)
+            self.sort_combo.setCurrentIndex(sort_row)
+            self.sort_combo.blockSignals(False)
+            self.sort_mode = self.sort_combo.itemData(sort_row)
+        self.tree_mode = bool(state.get('tree_mode'))
+        self.tree_mode_action.setChecked(self.tree_mode)
+        self.sort_combo.setEnabled(not self.tree_mode)
+        self.selected_filter_tags = set(state.get('filter_tags', [])) & self.data_manager.all_known_tags
+        selection = state.get('selection', [])
+        top = state.get('top')
+        if smart is not None:
+            # 智能文件夹的结果集本身就是物化的，不需要快照
+            self.show_smart_folder(folder)
+            self._restore_selection(selection, top)
+            return True
+        snapshot = None if self.tree_mode else load_listing_snapshot(folder)
+        if snapshot is None:
+            self.show_video_list(folder)
+            self._restore_selection(selection, top)
+            return True
+        # 快照直接画出上次的列表；扫描索引的加载与核对放到第一帧之后
+        self.current_folder = folder
+        self.back_action.setEnabled(True)
+        self.offline_view = not self.folder_health.is_online(folder)
+        self.tree_view.hide()
+        self.list_widget.show()
+        self.list_widget.clear()
+        for video_path in snapshot:
+            self.list_widget.addItem(self._video_item(video_path))
+        self._restore_selection(selection, top)
+        self.statusBar().showMessage("正在核对上次的列表…")
+        QTimer.singleShot(0, lambda: self._finish_warm_start(folder))
+        return True
+
+    def _finish_warm_start(self, folder):
+        if self.current_folder != folder:
+            return
+        self.show_video_list(folder, warm=True)
+        self.update_current_context_ui()
+
+    def _restore_selection(self, selection, top):
+        if (self.tree_mode and self.current_smart() is None) or not (selection or top):
+            return
+        wanted = set(selection)
+        first = anchor = None
+        for row in range(self.list_widget.count()):
+            item = self.list_widget.item(row)
+            path = item.data(VIDEO_PATH_ROLE)
+            if path in wanted:
+                item.setSelected(True)
+                first = first or item
+            if path == top:
+                anchor = item
+        if first is not None:
+            self.list_widget.setCurrentItem(first, QItemSelectionModel.NoUpdate)
+        if anchor is not None:
+            self.list_widget.scrollToItem(anchor, QAbstractItemView.PositionAtTop)
+
+    # === 排序：各模式的顺序数组缓存在 ListingTable 中，切换模式或筛选时只重排下标 ===
+    def on_sort_mode_changed(self, index):
+        self.sort_mode = self.sort_combo.itemData(index)
+        if self.current_folder is not None and self.listing is not None:
+            self.render_video_list()
+
+    def _duration_key(self, path):
+        return self.playback_states.get(path, {}).get('duration_ms', 0)
+
+    def _last_played_key(self, path):
+        return self.playback_states.get(path, {}).get('last_played', 0)
+
+    def _tag_count_key(self, path):
+        return len(self.data_manager.get_tags(path))
+
+    def on_tags_changed_for_sort(self, path, old_tags, new_tags):
+        if self.listing is not None and len(old_tags) != len(new_tags) and path in self.listing.position:
+            self.listing.invalidate(SORT_TAG_COUNT)
+
+    def go_back(self):
+        self.selected_filter_tags.clear()
+        self.show_folder_list()
+
+    def release_video_player(self):
+        if self.video_player:
+            self.store_current_playback_state()
+            self.video_player.update_timer.stop()
+            self.video_player.release_vlc()
+            self.main_layout.removeWidget(self.video_player)
+            self.video_player.setParent(None)
+            self.video_player.deleteLater()
+            self.video_player = None
+            self.main_layout.insertWidget(1, self.placeholder, stretch=3)
+            self.update_current_context_ui()
+
+    def on_item_double_clicked(self, item):
+        self.activate_path(item.data(VIDEO_PATH_ROLE))
+
+    def activate_path(self, path):
+        if not path:
+            return
+        if self.current_folder is None:
+            if path.startswith(SMART_PREFIX):
+                self.show_smart_folder(path)
+                return
+            # 不在界面线程里访问可能已离线的挂载点，依据后台检测结果判断
+            if not self.folder_health.is_online(path):
+                self.folder_health.probe(path)
+                if not self.data_manager.scan_indexes.get(path).has_snapshot():
+                    QMessageBox.warning(self, "文件夹不可用", f"文件夹 '{path}' 当前不可用或仍在检测中，且没有可浏览的索引快照。")
+                    return
+            self.show_video_list(path)
+            return
+        if not self.is_video_entry(path):
+            return
+        root = self.data_manager.labels.root_for(path) if self.current_smart() else self.current_folder
+        if not self.folder_health.is_online(root):
+            reply = QMessageBox.question(
+                self, '文件夹离线', "该视频所在文件夹当前离线，是否在重新连接后提示播放？",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+            )
+            if reply == QMessageBox.Yes:
+                self.pending_ops.enqueue(root, 'play', path=path)
+            return
+        self.open_video(path)
+
+    # === 精准查找相邻视频 ===
+    def _find_adjacent_video(self, direction):
+        if self.current_folder is None or not self.video_player or not self.video_player.video_path:
+            return None
+
+        current_path = self.video_player.video_path
+        # 与列表显示顺序一致（树状浏览时同样按当前排序模式）
+        items = self.listing.ordered(self.sort_mode, self.facets.result)
+
+        try:
+            idx = items.index(current_path)
+        except ValueError:
+            return None
+
+        new_idx = idx + direction
+        if 0 <= new_idx < len(items):
+            return items[new_idx]
+        return None
+
+    def play_prev_video(self):
+        prev_path = self._find_adjacent_video(-1)
+        if prev_path:
+            self.open_video(prev_path)
+
+    def play_next_video(self):
+        next_path = self._find_adjacent_video(1)
+        if next_path:
+            self.open_video(next_path)
+
+    def open_video(self, video_path, start_ms=None):
+        self.close_grid_preview()
+        if self.video_player:
+            self.store_current_playback_state()
+
+        if self.video_player is None:
+            self.main_layout.removeWidget(self.placeholder)
+            self.placeholder.setParent(None)
+            self.video_player = VideoPlayer()
+            self.video_player.play_pause_requested.connect(self.video_player.toggle_play_pause)
+            self.video_player.volume_changed.connect(self.video_player.set_volume)
+            self.video_player.fullscreen_requested.connect(self.toggle_fullscreen)
+            self.video_player.close_requested.connect(self.release_video_player)
+            self.video_player.prev_video_requested.connect(self.play_prev_video)
+            self.video_player.next_video_requested.connect(self.play_next_video)
+            self.video_player.segment_marked.connect(self.add_segment)
+            self.video_player.set_preview_source(self.sprite_cache.frame)
+            self.main_layout.insertWidget(1, self.video_player, stretch=3)
+
+        state = self.playback_states.get(video_path, {})
+        resume_time = state.get('time_ms', 0)
+        volume = state.get('volume', 100)
+        speed = state.get('speed', 1.0)
+        was_playing = state.get('playing', True)
+        if start_ms is not None:
+            # 从片段开头播放
+            resume_time, was_playing = start_ms, True
+
+        self.video_player.load_video(video_path, resume_time, volume, speed, paused=not was_playing)
+        self.video_player.set_segments(self.segments.for_video(video_path))
+        self.watch_history.begin(video_path, resume_time)
+        self.video_player.setFocus()
+        self.update_current_context_ui()
+        # 当前视频优先生成拼图，顺带预生成下一个
+        self.sprite_worker.request(video_path, PRIORITY_PLAYING)
+        next_path = self._find_adjacent_video(1)
+        if next_path:
+            self.sprite_worker.request(next_path, PRIORITY_PREFETCH)
+
+        # 高亮当前播放项（单选）
+        for i in range(self.list_widget.count()):
+            item = self.list_widget.item(i)
+            if item.data(VIDEO_PATH_ROLE) == video_path:
+                self.list_widget.setCurrentItem(item)
+                break
+
+    def closeEvent(self, event):
+        if self.video_player:
+            self.store_current_playback_state()
+        self.close_grid_preview()
+        self.scan_scheduler.shutdown()
+        self.sprite_worker.shutdown()
+        self.local_api.stop()
+        self.save_ui_state()
+        self.save_current_index()
+        self.smart_folders.save_if_dirty()
+        self.data_manager.export_sidecars(self.folder_health.is_online)
+        self.watch_history.close()
+        event.accept()
+
+    def add_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择要添加的视频文件夹")
+        if folder:
+            folder = os.path.normpath(folder)
+            if folder not in self.data_manager.folders and os.path.exists(folder):
+                self.data_manager.folders.append(folder)
+                self.folder_health.probe(folder)
+                self.show_folder_list()
+                self.data_manager.save_folders(self.data_manager.folders)
+                self.local_api.notify('folders')
+
+    def delete_folder(self):
+        if self.current_folder is not None:
+            return
+        current = self.list_widget.currentItem()
+        if not current:
+            return
+        index = self.list_widget.row(current)
+        if 0 <= index < len(self.data_manager.folders):
+            folder_to_remove = self.data_manager.folders[index]
+            reply = QMessageBox.question(self, '确认删除', f"确定要从列表中移除文件夹 '{folder_to_remove}' 吗？\n此操作不会删除硬盘上的实际文件。",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply == QMessageBox.Yes:
+                del self.data_manager.folders[index]
+                self.folder_health.forget(folder_to_remove)
+                self.scan_scheduler.cancel(folder_to_remove)
+                self.duplicate_scan_done(folder_to_remove)
+                self.data_manager.scan_indexes.forget(folder_to_remove)
+                self.pending_ops.discard_root(folder_to_remove)
+                self.show_folder_list()
+                self.data_manager.save_folders(self.data_manager.folders)
+                self.local_api.notify('folders')
+
+    def show_watch_history(self):
+        HistoryDialog(self.watch_history, self.play_from_history, self).exec_()
+
+    def play_from_history(self, path, start_ms=None):
+        if start_ms is not None and self.video_player and self.video_player.video_path == path:
+            self.video_player.jump_to(start_ms)
+            return
+        root = self.data_manager.labels.root_for(path)
+        if root and not self.folder_health.is_online(root):
+            QMessageBox.warning(self, "文件夹不可用", f"文件夹 '{root}' 当前不可用，无法播放该视频。")
+            return
+        if not os.path.isfile(path):
+            QMessageBox.warning(self, "文件不存在", f"视频文件已被移动或删除：\n{path}")
+            return
+        self.open_video(path, start_ms)
+
+    # === 片段标签：播放时按 I / O 标记，片段对话框中按标签和时长查询 ===
+    def show_segments(self):
+        current = self.video_player.video_path if self.video_player else None
+        SegmentSearchDialog(
+            self.segments, self.data_manager.tag_hierarchy.subtree, self.play_from_history,
+            self.refresh_player_segments, current, self
+        ).exec_()
+
+    def add_segment(self, start_ms, end_ms):
+        path = self.video_player.video_path if self.video_player else None
+        if not path:
+            return
+        fmt = self.video_player.format_time
+        tag, ok = TagInputDialog.get_tag(
+            self.tag_completer, self, "添加片段标签", f"片段 {fmt(start_ms)} - {fmt(end_ms)} 的标签："
+        )
+        tag = tag.strip()
+        if not ok or not tag:
+            return
+        try:
+            self.segments.add(path, start_ms, end_ms, tag)
+        except SegmentError as e:
+            QMessageBox.warning(self, "无法添加片段", str(e))
+            return
+        self.segments.save()
+        self.tag_usage.record([tag])
+        if self.data_manager.add_known_tag(tag):
+            self.update_global_tags_list()
+        self.refresh_player_segments()
+        self.video_player.setFocus()
+
+    # === 宫格预览 ===
+    def show_grid_for_selection(self):
+        # 选中多个视频时预览选中的，否则预览当前列表（翻页浏览）
+        paths = self.selected_video_paths()
+        if len(paths) < 2 and self.listing is not None and self.current_folder is not None:
+            paths = self.listing.ordered(self.sort_mode, self.facets.result)
+        paths = [p for p in paths if self.is_video_entry(p)]
+        if len(paths) < 2:
+            QMessageBox.information(self, "宫格预览", "请先打开一个文件夹，或选中至少两个视频。")
+            return
+        self.show_grid_preview(paths)
+
+    def show_grid_preview(self, paths):
+        self.close_grid_preview()
+        self.release_video_player()
+        # 与列表显示顺序一致
+        if self.listing is not None:
+            paths = self.listing.ordered(self.sort_mode, set(paths))
+        self.main_layout.removeWidget(self.placeholder)
+        self.placeholder.setParent(None)
+        self.grid_player = GridPlayer(paths, self.playback_states, self.data_manager.get_tags)
+        self.grid_player.states_changed.connect(self.store_grid_states)
+        self.grid_player.close_requested.connect(lambda: QTimer.singleShot(0, self.close_grid_preview))
+        self.grid_player.open_requested.connect(
+            lambda path, ms: QTimer.singleShot(0, lambda: self.open_video(path, ms))
+        )
+        self.grid_player.tag_requested.connect(self.tag_grid_tile)
+        self.main_layout.insertWidget(1, self.grid_player, stretch=3)
+        self.grid_player.setFocus()
+
+    def close_grid_preview(self):
+        if self.grid_player is None:
+            return
+        # release 时发出各格子的播放状态
+        self.grid_player.release()
+        self.main_layout.removeWidget(self.grid_player)
+        self.grid_player.setParent(None)
+        self.grid_player.deleteLater()
+        self.grid_player = None
+        self.main_layout.insertWidget(1, self.placeholder, stretch=3)
+
+    def store_grid_states(self, states):
+        now = time.time()
+        for state in states:
+            state['last_played'] = now
+            self.playback_states[state['path']] = state
+        self.save_playback_states()
+        if self.listing is not None:
+            self.listing.invalidate(SORT_LAST_PLAYED, SORT_DURATION)
+
+    def tag_grid_tile(self, path):
+        dialog = TagPickerDialog(self.tag_completer, self, f"给 {os.path.basename(path)} 添加标签")
+        if dialog.exec_() == QDialog.Accepted:
+            tags = dialog.get_selected_tags()
+            if tags:
+                self.tag_usage.record(tags)
+                if self.data_manager.add_tags([path], tags):
+                    self.refresh_after_tag_change()
+        if self.grid_player is not None:
+            self.grid_player.refresh_tags()
+            self.grid_player.setFocus()
+
+    def refresh_player_segments(self):
+        if self.video_player and self.video_player.video_path:
+            self.video_player.set_segments(self.segments.for_video(self.video_player.video_path))
+
+    # === 自动打标签规则 ===
+    def edit_auto_tag_rules(self):
+        AutoTagRulesDialog(
+            self.data_manager.auto_tagger.rules, self.on_auto_tag_rules_saved,
+            self.auto_tag_entries, self.apply_auto_tag_results, self
+        ).exec_()
+
+    def on_auto_tag_rules_saved(self, tagger):
+        self.data_manager.auto_tagger = tagger
+
+    def auto_tag_entries(self):
+        # 离线文件夹也用索引快照中的条目，标签本身不需要访问磁盘
+        entries = []
+        for folder in self.data_manager.folders:
+            index = self.data_manager.scan_indexes.get(folder)
+            if index.has_snapshot():
+                table = index.table()
+                entries.extend(zip(table.paths, table.sizes))
+        return entries
+
+    def apply_auto_tag_results(self, results):
+        changed = self.data_manager.apply_auto_tags(results)
+        self.refresh_after_tag_change()
+        return len(changed)
+
+    def export_debug_log(self):
+        try:
+            path = dump_ring_buffer()
+        except OSError as e:
+            QMessageBox.warning(self, "导出失败", f"导出调试日志失败: {e}")
+            return
+        QMessageBox.information(self, "已导出", f"最近的日志已保存到:\n{os.path.abspath(path)}")
+
+    # === 本地 API ===
+    def toggle_local_api(self, checked):
+        if checked:
+            if not self.local_api.start():
+                self.api_action.setChecked(False)
+                QMessageBox.warning(self, "本地 API", f"无法监听 {API_HOST}:{self.local_api.port}: {self.local_api.error}")
+                return
+            self.statusBar().showMessage(f"本地 API 已启动: http://{API_HOST}:{self.local_api.port}/api/", 5000)
+        else:
+            self.local_api.stop()
+        self.api_settings['enabled'] = checked
+        self.api_settings.setdefault('port', self.local_api.port)
+        save_api_settings(self.api_settings)
+
+    def on_api_mutated(self, ops, changed):
+        for op in ops:
+            if op['op'] == 'rename':
+                self.tag_usage.rename(op['from'], op['to'])
+                self.smart_folders.rename_tag(op['from'], op['to'])
+                self.segments.rename_tag(op['from'], op['to'])
+                if op['from'] in self.selected_filter_tags:
+                    self.selected_filter_tags.discard(op['from'])
+                    self.selected_filter_tags.add(op['to'])
+            elif op['op'] == 'delete':
+                self.tag_usage.forget(op['tag'])
+                self.smart_folders.forget_tags({op['tag']})
+                self.segments.forget_tags({op['tag']})
+                self.selected_filter_tags.discard(op['tag'])
+        if any(op['op'] in ('rename', 'delete') for op in ops):
+            self.segments.save_if_dirty()
+            self.refresh_after_hierarchy_change()
+        else:
+            self.refresh_after_tag_change()
+
+    # === 内存诊断 ===
+    def show_text_report(self, title, text):
+        dialog = QDialog(self)
+        dialog.setWindowTitle(title)
+        dialog.resize(760, 560)
+        layout = QVBoxLayout(dialog)
+        view = QPlainTextEdit(text)
+        view.setReadOnly(True)
+        view.setFont(QFont("Consolas", 10))
+        layout.addWidget(view)
+        path = save_report(text)
+        layout.addWidget(QLabel(f"已保存到 {os.path.abspath(path)}"))
+        dialog.exec_()
+
+    def show_memory_report(self):
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            text = build_report(self, self.memory_snapshots)
+        finally:
+            QApplication.restoreOverrideCursor()
+        self.show_text_report("内存报告", text)
+
+    def take_memory_snapshot(self):
+        label = self.memory_snapshots.take()
+        diff = self.memory_snapshots.diff()
+        if diff:
+            self.show_text_report("内存快照对比", "\n".join(diff))
+        else:
+            self.statusBar().showMessage(f"已记录内存快照 {label}，再记录一次即可对比", 5000)
+
+    def run_leak_checks(self):
+        n, ok = QInputDialog.getInt(self, "泄漏检查", "每项操作的循环次数:", 20, 1, 1000)
+        if not ok:
+            return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            checks = standard_leak_checks(self, n)
+        finally:
+            QApplication.restoreOverrideCursor()
+        self.show_text_report("泄漏检查", "\n".join(["泄漏检查:"] + format_leak_checks(checks)))
+
+    # === 重复视频：在所有在线文件夹的扫描索引中查找，合并各副本的标签与播放进度 ===
+    def find_duplicates(self):
+        # 还没有扫描快照的在线文件夹先交给扫描调度器，全部结束后再开始检测
+        waiting = [
+            folder for folder in self.data_manager.folders
+            if self.folder_health.is_online(folder)
+            and not self.data_manager.scan_indexes.get(folder).has_snapshot()
+        ]
+        if waiting:
+            self.duplicate_scans = set(waiting)
+            for folder in waiting:
+                self.scan_scheduler.request(folder)
+            self.statusBar().showMessage(f"正在扫描 {len(waiting)} 个文件夹，完成后开始查找重复视频…")
+            return
+        self.open_duplicates_dialog()
+
+    def duplicate_scan_done(self, root):
+        if root not in self.duplicate_scans:
+            return
+        self.duplicate_scans.discard(root)
+        if not self.duplicate_scans:
+            self.statusBar().clearMessage()
+            self.open_duplicates_dialog()
+
+    def open_duplicates_dialog(self):
+        # 嵌套注册的文件夹会列出同一个文件，按路径去重
+        entries = {}
+        for folder in self.data_manager.folders:
+            if not self.folder_health.is_online(folder):
+                continue
+            index = self.data_manager.scan_indexes.get(folder)
+            if not index.has_snapshot():
+                continue
+            table = index.table()
+            for path, size, mtime in zip(table.paths, table.sizes, table.mtimes):
+                entries.setdefault(path, (path, size, mtime))
+        entries = list(entries.values())
+        if not entries:
+            QMessageBox.information(self, "没有可检测的视频", "当前没有在线且已扫描的视频文件夹。")
+            return
+        DuplicatesDialog(entries, self.merge_duplicate_groups, self).exec_()
+
+    def merge_duplicate_groups(self, groups):
+        # 所有副本共享合并后的标签；播放进度取最近播放过的那一份。整体只落盘一次
+        with self.data_manager.batch():
+            for paths in groups:
+                tags = []
+                for path in paths:
+                    tags.extend(self.data_manager.get_tags(path))
+                if tags:
+                    self.data_manager.add_tags(paths, tags)
+        states_changed = False
+        for paths in groups:
+            states = [self.playback_states[p] for p in paths if p in self.playback_states]
+            if not states:
+                continue
+            latest = max(states, key=lambda st: st.get('last_played', 0))
+            for path in paths:
+                self.playback_states[path] = dict(latest, path=path)
+            states_changed = True
+        if states_changed:
+            self.save_playback_states()
+            if self.listing is not None:
+                self.listing.invalidate(SORT_LAST_PLAYED, SORT_DURATION)
+        self.refresh_after_tag_change()
+
+    def toggle_fullscreen(self):
+        if self.is_fullscreen_mode:
+            self.showNormal()
+            self.is_fullscreen_mode = False
+            self.left_panel.show()
+            self.right_panel.show()
+            self.placeholder.hide()
+            self.main_layout.setContentsMargins(10, 10, 10, 10)
+        else:
+            self.is_fullscreen_mode = True
+            self.left_panel.hide()
+            self.right_panel.hide()
+            self.placeholder.hide()
+            self.main_layout.setContentsMargins(0, 0, 0, 0)
+            self.showFullScreen()
+            if self.video_player:
+                self.video_player.setFocus()
+
+    # === 右键菜单：添加/删除标签 ===
+    def on_right_click(self, position):
+        if self.current_folder is None:
+            self.show_folder_menu(position)
+            return
+
+        video_paths = self.selected_video_paths()
+        if not video_paths:
+            return
+
+        menu = QMenu(self)
+        add_tag_action = menu.addAction("添加标签")
+        remove_tag_action = menu.addAction("删除标签")
+        grid_action = menu.addAction("宫格预览") if len(video_paths) > 1 else None
+        menu.addSeparator()
+        move_action = menu.addAction("移动到文件夹…")
+        rename_action = menu.addAction("批量重命名…")
+        action = menu.exec_(self.active_view().viewport().mapToGlobal(position))
+
+        if action == add_tag_action:
+            self.show_add_tag_dialog_for_selection(video_paths)
+        elif action == remove_tag_action:
+            self.show_remove_tag_dialog_for_selection(video_paths)
+        elif action is not None and action == grid_action:
+            self.show_grid_preview(video_paths)
+        elif action == move_action:
+            self.batch_file_op(video_paths, MODE_MOVE)
+        elif action == rename_action:
+            self.batch_file_op(video_paths, MODE_RENAME)
+
+    def show_folder_menu(self, position):
+        item = self.list_widget.itemAt(position)
+        if item is None:
+            return
+        folder = item.data(VIDEO_PATH_ROLE)
+        if folder.startswith(SMART_PREFIX):
+            self.show_smart_folder_menu(folder, self.list_widget.viewport().mapToGlobal(position))
+            return
+        menu = QMenu(self)
+        sidecar_action = menu.addAction("在文件夹内保存标签副本")
+        sidecar_action.setCheckable(True)
+        sidecar_action.setChecked(self.data_manager.labels.has_sidecar(folder))
+        rules_action = menu.addAction("扫描规则…")
+        action = menu.exec_(self.list_widget.viewport().mapToGlobal(position))
+        if action == rules_action:
+            self.edit_scan_rules(folder)
+            return
+        if action != sidecar_action:
+            return
+        if not self.folder_health.is_online(folder):
+            QMessageBox.warning(self, "文件夹离线", f"文件夹 '{folder}' 当前不可用，请在重新连接后再设置。")
+            return
+        # 副本保存在文件夹根目录的 .video_tags.json 中，换电脑或换盘符后打开即可导入
+        self.data_manager.set_sidecar(folder, sidecar_action.isChecked())
+
+    # === 批量移动/重命名：文件在工作线程池中移动，完成后各个存储在界面线程中一次性改用新路径 ===
+    def batch_file_op(self, paths, mode):
+        roots = {self.data_manager.labels.root_for(p) for p in paths}
+        offline = [r for r in roots if not self.folder_health.is_online(r)]
+        if offline:
+            QMessageBox.warning(self, "文件夹离线", f"文件夹 '{offline[0]}' 当前不可用，请在重新连接后再操作。")
+            return
+        # 按列表当前的显示顺序编号
+        paths = self.listing.ordered(self.sort_mode, set(paths)) if self.listing is not None else paths
+        mtimes = {p: stat[1] for p in paths for stat in [self.data_manager.stat_of(p)] if stat}
+        if self.video_player and self.video_player.video_path in paths:
+            # 正在播放的文件在 Windows 上无法移动
+            self.release_video_player()
+        if self.grid_player and not set(paths).isdisjoint(self.grid_player.paths):
+            self.close_grid_preview()
+        start_dir = self.current_folder if self.current_smart() is None else ""
+        FileOpsDialog(paths, mode, self.apply_file_moves, mtimes, start_dir, self).exec_()
+
+    def apply_file_moves(self, mapping):
+        if not mapping:
+            return
+        # 标签记录与扫描索引（整批一次提交），播放进度（一次写入），观看记录（一个事务）
+        self.data_manager.move_paths(mapping)
+        moved_states = False
+        for src, dst in mapping.items():
+            state = self.playback_states.pop(src, None)
+            if state is not None:
+                self.playback_states[dst] = dict(state, path=dst)
+                moved_states = True
+        if moved_states:
+            self.save_playback_states()
+        self.watch_history.rename_paths(mapping)
+        if self.segments.rename_paths(mapping):
+            self.segments.save()
+        self.smart_folders.on_moved(mapping)
+        self.smart_folders.save_if_dirty()
+        move_sprite_sheets(mapping)
+        for src in mapping:
+            self.sprite_cache.invalidate(src)
+        self.local_api.notify('moved', count=len(mapping))
+        smart = self.current_smart()
+        if smart is not None:
+            self.load_listing_from_smart(smart)
+        elif self.current_index is not None:
+            self.load_listing_from_index()
+        else:
+            return
+        self.render_video_list()
+        self.refresh_after_tag_change()
+
+    # === 智能文件夹 ===
+    def current_smart(self):
+        return self.smart_folders.get(self.current_folder)
+
+    def update_smart_item(self, smart):
+        item = self.smart_items.get(smart.id)
+        if item is not None:
+            item.setText(f"🔍 {smart.name}  ({len(smart.members)})")
+            item.setToolTip(smart.query.describe())
+
+    def show_smart_folder(self, key):
+        # 只读取物化的结果集，不扫描也不重新求值
+        smart = self.smart_folders.get(key)
+        if smart is None:
+            return
+        self.save_current_index()
+        self.smart_folders.expire(smart)
+        self.current_folder = key
+        self.current_index = None
+        self.offline_view = False
+        self.back_action.setEnabled(True)
+        self.sort_combo.setEnabled(True)
+        self.data_manager.open_roots({self.data_manager.labels.root_for(p) for p in smart.members})
+        self.statusBar().showMessage(f"智能文件夹 “{smart.name}”：{smart.query.describe()}")
+        self.load_listing_from_smart(smart)
+        self.render_video_list(reset=True)
+        self.update_facet_counts()
+
+    def load_listing_from_smart(self, smart):
+        self.set_listing(ListingTable([(p, size, mtime) for p, (size, mtime) in smart.members.items()]))
+
+    def apply_smart_folder_changes(self):
+        changed = self.smart_folders.take_changed()
+        if not changed:
+            return
+        if self.current_folder is None:
+            for smart_id in changed:
+                smart = self.smart_folders.folders.get(smart_id)
+                if smart is not None:
+                    self.update_smart_item(smart)
+            return
+        smart = self.current_smart()
+        if smart is not None and smart.id in changed:
+            # 新结果按差异应用到列表，选中项和滚动位置不变
+            self.load_listing_from_smart(smart)
+            self.render_video_list()
+            self.update_facet_counts()
+
+    def add_smart_folder(self):
+        dialog = SmartFolderDialog(self.data_manager.folders, self.data_manager.all_known_tags, parent=self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        self.smart_folders.create(dialog.result_name, dialog.result_query)
+        self.smart_folders.save()
+        if self.current_folder is None:
+            self.show_folder_list()
+
+    def show_smart_folder_menu(self, key, global_pos):
+        smart = self.smart_folders.get(key)
+        if smart is None:
+            return
+        menu = QMenu(self)
+        edit_action = menu.addAction("编辑智能文件夹…")
+        delete_action = menu.addAction("删除智能文件夹")
+        action = menu.exec_(global_pos)
+        if action == edit_action:
+            dialog = SmartFolderDialog(
+                self.data_manager.folders, self.data_manager.all_known_tags, smart.name, smart.query, self
+            )
+            if dialog.exec_() == QDialog.Accepted:
+                self.smart_folders.update(smart, dialog.result_name, dialog.result_query)
+                self.smart_folders.save()
+                self.show_folder_list()
+        elif action == delete_action:
+            reply = QMessageBox.question(
+                self, '确认删除', f"确定要删除智能文件夹 '{smart.name}' 吗？\n视频本身不受影响。",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+            )
+            if reply == QMessageBox.Yes:
+                self.smart_folders.delete(smart)
+                self.smart_folders.save()
+                self.show_folder_list()
+
+    def edit_scan_rules(self, folder):
+        registry = self.data_manager.scan_indexes
+        dialog = ScanRulesDialog(folder, registry.rules_for(folder), self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        registry.set_rules(folder, dialog.result_rules)
+        # 规则变化后所有目录重新列出一次，被排除的视频从列表中移除
+        if self.folder_health.is_online(folder):
+            self.scan_scheduler.request(folder)
+
+    def show_add_tag_dialog_for_selection(self, video_paths):
+        if not self.data_manager.all_known_tags:
+            QMessageBox.information(self, "无可用标签", "当前没有可用的全局标签，请先添加标签。")
+            return
+
+        dialog = TagPickerDialog(self.tag_completer, self, "选择要添加的标签")
+        if dialog.exec_() == QDialog.Accepted:
+            selected_tags = dialog.get_selected_tags()
+            if not selected_tags:
+                return
+
+            self.tag_usage.record(selected_tags)
+            with self.data_manager.batch():
+                changed = self.data_manager.add_tags(video_paths, selected_tags)
+            if changed:
+                self.refresh_after_tag_change()
+
+    def show_remove_tag_dialog_for_selection(self, video_paths):
+        all_tags_in_selection = set()
+        for path in video_paths:
+            all_tags_in_selection.update(self.data_manager.get_tags(path))
+
+        if not all_tags_in_selection:
+            QMessageBox.information(self, "无可删除标签", "选中的视频没有标签。")
+            return
+
+        completer = TagCompleter(self.tag_usage)
+        completer.refresh(all_tags_in_selection)
+        dialog = TagPickerDialog(completer, self, "选择要删除的标签")
+        if dialog.exec_() == QDialog.Accepted:
+            tags_to_remove = dialog.get_selected_tags()
+            if not tags_to_remove:
+                return
+
+            with self.data_manager.batch():
+                changed = self.data_manager.remove_tags(video_paths, tags_to_remove)
+            if changed:
+                self.refresh_after_tag_change()
\ No newline at end of file
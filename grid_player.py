@@ -0,0 +1,360 @@
+# grid_player.py - 宫格预览：同时播放多个视频（最多 3x3，可翻页），快速过一遍并用键盘给焦点格子打标签
+#
+# 所有格子共用一个 vlc.Instance（单线程解码、跳过环路滤波，画面按格子大小输出）。
+# 同一时刻真正在解码的格子不超过 max_decoders 个：按最近获得焦点的顺序分配，焦点格子总在其中；
+# 其余格子暂停在当前画面，宫格不可见（被隐藏/窗口最小化）时全部暂停。只有焦点格子出声音。
+# 换页和关闭时各格子的播放位置交给主窗口写入 playback_states。
+import os
+import sys
+import math
+from PyQt5.QtWidgets import QWidget, QFrame, QVBoxLayout, QGridLayout, QLabel
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont, QKeyEvent
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+GRID_MAX_TILES = 9
+# 同时解码的格子数：不随宫格变大而增加
+DEFAULT_DECODERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+BUDGET_INTERVAL_MS = 500
+SEEK_STEP_MS = 10000
+
+FOCUSED_STYLE = "QFrame { border: 2px solid #2196F3; background-color: #000; }"
+NORMAL_STYLE = "QFrame { border: 2px solid #222; background-color: #000; }"
+
+
+class GridTile(QFrame):
+    clicked = pyqtSignal(object)
+    double_clicked = pyqtSignal(object)
+
+    def __init__(self, instance, parent=None):
+        super().__init__(parent)
+        self.setStyleSheet(NORMAL_STYLE)
+        self.instance = instance
+        self.path = None
+        self.media = None
+        self.base_state = {}
+        self.tags = []
+        self.paused_by_user = False
+        self.focused = False
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(2, 2, 2, 2)
+        layout.setSpacing(0)
+        self.video = QWidget()
+        self.video.setStyleSheet("background-color: #000;")
+        layout.addWidget(self.video, stretch=1)
+        self.label = QLabel()
+        self.label.setFont(QFont("SimHei", 9))
+        self.label.setStyleSheet("color: white; background-color: #222; border: none; padding: 1px 4px;")
+        layout.addWidget(self.label)
+        self.player = None
+        if instance is not None:
+            try:
+                self.player = instance.media_player_new()
+                if sys.platform.startswith('win'):
+                    self.player.set_hwnd(int(self.video.winId()))
+                elif sys.platform.startswith('darwin'):
+                    self.player.set_nsobject(int(self.video.winId()))
+                else:
+                    self.player.set_xwindow(int(self.video.winId()))
+                self.player.video_set_key_input(False)
+                self.player.video_set_mouse_input(False)
+                self.player.audio_set_mute(True)
+            except Exception as e:
+                log.error("创建宫格播放器失败: %s", e)
+                self.player = None
+
+    def load(self, path, state, tags, start_playing):
+        self.unload()
+        self.path = path
+        self.base_state = dict(state)
+        self.tags = sorted(tags)
+        self.paused_by_user = False
+        if self.player is not None:
+            try:
+                self.media = self.instance.media_new(path)
+                resume = state.get('time_ms', 0)
+                if resume > 0:
+                    self.media.add_option(f":start-time={resume / 1000:.3f}")
+                # 不在解码预算内的格子只解出第一帧就停住
+                if not start_playing:
+                    self.media.add_option(":start-paused")
+                self.player.set_media(self.media)
+                self.player.audio_set_volume(state.get('volume', 100))
+                self.player.play()
+            except Exception as e:
+                log.error("宫格加载视频失败 %s: %s", path, e)
+        self.update_label()
+
+    def unload(self):
+        if self.player is not None and self.media is not None:
+            self.player.stop()
+            self.media.release()
+        self.media = None
+        self.path = None
+        self.tags = []
+        self.update_label()
+
+    def release(self):
+        self.unload()
+        if self.player is not None:
+            self.player.release()
+            self.player = None
+
+    def finished(self):
+        if self.player is None or self.media is None:
+            return True
+        from vlc import State
+        return self.player.get_state() in (State.Ended, State.Error)
+
+    def set_decoding(self, on):
+        # 按播放器的实际状态收敛：打开中的媒体稍后才进入播放，下一轮再暂停
+        if self.player is None or self.media is None:
+            return
+        if on != bool(self.player.is_playing()):
+            self.player.set_pause(0 if on else 1)
+
+    def set_focused(self, focused):
+        self.focused = focused
+        self.setStyleSheet(FOCUSED_STYLE if focused else NORMAL_STYLE)
+        if self.player is not None:
+            self.player.audio_set_mute(not focused)
+
+    def time_ms(self):
+        if self.player is None or self.media is None:
+            return 0
+        return max(0, self.player.get_time())
+
+    def seek_by(self, delta_ms):
+        if self.player is None or self.media is None:
+            return
+        duration = self.media.get_duration()
+        target = max(0, self.time_ms() + delta_ms)
+        if duration > 0:
+            target = min(target, duration - 1000)
+        self.player.set_time(int(target))
+
+    def state(self):
+        # 与主播放器的 get_current_state 格式相同；音量、倍速沿用原有记录
+        if self.path is None or self.media is None:
+            return None
+        duration = self.media.get_duration()
+        if duration <= 0:
+            return None
+        return dict(self.base_state, path=self.path, time_ms=self.time_ms(), duration_ms=duration,
+                    playing=not self.paused_by_user)
+
+    def update_label(self):
+        if self.path is None:
+            self.label.setText("")
+            return
+        s = self.time_ms() // 1000
+        text = f"{s // 60}:{s % 60:02d}  {os.path.basename(self.path)}"
+        if self.tags:
+            text += "  [" + "、".join(self.tags) + "]"
+        if self.paused_by_user:
+            text = "⏸ " + text
+        self.label.setText(self.label.fontMetrics().elidedText(text, Qt.ElideMiddle, max(60, self.width() - 8)))
+
+    def mousePressEvent(self, event):
+        self.clicked.emit(self)
+        super().mousePressEvent(event)
+
+    def mouseDoubleClickEvent(self, event):
+        self.double_clicked.emit(self)
+        super().mouseDoubleClickEvent(event)
+
+
+class GridPlayer(QWidget):
+    close_requested = pyqtSignal()
+    # 在主播放器中打开：(路径, 起始毫秒)
+    open_requested = pyqtSignal(str, int)
+    # 给焦点格子的视频打标签
+    tag_requested = pyqtSignal(str)
+    # 换页/关闭时各格子的播放状态 [state, ...]
+    states_changed = pyqtSignal(list)
+
+    def __init__(self, paths, playback_states, get_tags, max_decoders=DEFAULT_DECODERS, parent=None):
+        super().__init__(parent)
+        self.paths = list(paths)
+        self.playback_states = playback_states
+        self.get_tags = get_tags
+        self.max_decoders = max(1, max_decoders)
+        self.page_size = max(1, min(GRID_MAX_TILES, len(self.paths)))
+        self.page = 0
+        self.focus_index = 0
+        # 最近获得焦点的格子下标，越靠前越优先分到解码名额
+        self.recent = []
+        self.instance = None
+        try:
+            import vlc
+            self.instance = vlc.Instance(
+                "--quiet",
+                "--no-xlib",
+                "--no-video-title-show",
+                "--disable-screensaver",
+                "--no-embedded-video",
+                "--no-keyboard-events",
+                "--no-sub-autodetect-file",
+                "--avcodec-threads=1",
+                "--avcodec-skiploopfilter=4",
+            )
+        except Exception as e:
+            log.error("VLC 初始化失败（宫格只显示文件名）: %s", e)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(2)
+        self.status_label = QLabel()
+        self.status_label.setFont(QFont("SimHei", 10))
+        self.status_label.setStyleSheet("color: white; background-color: #222; padding: 2px 6px;")
+        layout.addWidget(self.status_label)
+        grid = QGridLayout()
+        grid.setContentsMargins(0, 0, 0, 0)
+        grid.setSpacing(2)
+        self.columns = math.ceil(math.sqrt(self.page_size))
+        self.tiles = []
+        for i in range(self.page_size):
+            tile = GridTile(self.instance, self)
+            tile.clicked.connect(self.on_tile_clicked)
+            tile.double_clicked.connect(self.on_tile_double_clicked)
+            grid.addWidget(tile, i // self.columns, i % self.columns)
+            self.tiles.append(tile)
+        layout.addLayout(grid, stretch=1)
+        self.setStyleSheet("background-color: #000;")
+        self.setFocusPolicy(Qt.StrongFocus)
+
+        self.budget_timer = QTimer(self)
+        self.budget_timer.setInterval(BUDGET_INTERVAL_MS)
+        self.budget_timer.timeout.connect(self.enforce_budget)
+        self.load_page(0)
+        self.budget_timer.start()
+
+    def page_count(self):
+        return (len(self.paths) + self.page_size - 1) // self.page_size
+
+    def collect_states(self):
+        return [s for s in (tile.state() for tile in self.tiles) if s is not None]
+
+    def load_page(self, page):
+        if not 0 <= page < self.page_count():
+            return
+        states = self.collect_states()
+        if states:
+            self.states_changed.emit(states)
+        self.page = page
+        batch = self.paths[page * self.page_size:(page + 1) * self.page_size]
+        self.recent = list(range(len(batch)))
+        for i, tile in enumerate(self.tiles):
+            if i < len(batch):
+                path = batch[i]
+                tile.load(path, self.playback_states.get(path, {}), self.get_tags(path), i < self.max_decoders)
+            else:
+                tile.unload()
+        self.set_focus_tile(0)
+
+    def set_focus_tile(self, index):
+        if not 0 <= index < len(self.tiles) or self.tiles[index].path is None:
+            return
+        self.focus_index = index
+        if index in self.recent:
+            self.recent.remove(index)
+        self.recent.insert(0, index)
+        for i, tile in enumerate(self.tiles):
+            tile.set_focused(i == index)
+        self.enforce_budget()
+
+    def focused_tile(self):
+        tile = self.tiles[self.focus_index] if self.tiles else None
+        return tile if tile is not None and tile.path is not None else None
+
+    def enforce_budget(self):
+        # 可见时按最近焦点顺序选出至多 max_decoders 个未暂停、未播完的格子解码，其余暂停
+        visible = self.isVisible() and not self.window().isMinimized()
+        allowed = set()
+        if visible:
+            for i in self.recent:
+                if len(allowed) >= self.max_decoders:
+                    break
+                tile = self.tiles[i]
+                if tile.path is not None and not tile.paused_by_user and not tile.finished():
+                    allowed.add(i)
+        for i, tile in enumerate(self.tiles):
+            tile.set_decoding(i in allowed)
+            if visible:
+                tile.update_label()
+        self.status_label.setText(
+            f"第 {self.page + 1}/{self.page_count()} 页 · 正在解码 {len(allowed)}/{self.max_decoders}"
+            "    方向键/数字 切换 · 空格 暂停 · J/L 快退/快进 · T 打标签 · 回车 打开 · PgUp/PgDn 翻页 · Esc 关闭"
+        )
+
+    def refresh_tags(self):
+        for tile in self.tiles:
+            if tile.path is not None:
+                tile.tags = sorted(self.get_tags(tile.path))
+                tile.update_label()
+
+    def release(self):
+        self.budget_timer.stop()
+        states = self.collect_states()
+        if states:
+            self.states_changed.emit(states)
+        for tile in self.tiles:
+            tile.release()
+        if self.instance is not None:
+            self.instance.release()
+            self.instance = None
+
+    def on_tile_clicked(self, tile):
+        self.set_focus_tile(self.tiles.index(tile))
+        self.setFocus()
+
+    def on_tile_double_clicked(self, tile):
+        if tile.path is not None:
+            self.open_requested.emit(tile.path, tile.time_ms())
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.enforce_budget()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.enforce_budget()
+
+    def keyPressEvent(self, event: QKeyEvent):
+        if event.isAutoRepeat():
+            return
+        key = event.key()
+        tile = self.focused_tile()
+        if key == Qt.Key_Left:
+            self.set_focus_tile(self.focus_index - 1)
+        elif key == Qt.Key_Right:
+            self.set_focus_tile(self.focus_index + 1)
+        elif key == Qt.Key_Up:
+            self.set_focus_tile(self.focus_index - self.columns)
+        elif key == Qt.Key_Down:
+            self.set_focus_tile(self.focus_index + self.columns)
+        elif Qt.Key_1 <= key <= Qt.Key_9:
+            self.set_focus_tile(key - Qt.Key_1)
+        elif key == Qt.Key_PageDown:
+            self.load_page(self.page + 1)
+        elif key == Qt.Key_PageUp:
+            self.load_page(self.page - 1)
+        elif key == Qt.Key_Escape:
+            self.close_requested.emit()
+        elif tile is None:
+            super().keyPressEvent(event)
+        elif key == Qt.Key_Space:
+            tile.paused_by_user = not tile.paused_by_user
+            self.enforce_budget()
+        elif key == Qt.Key_J:
+            tile.seek_by(-SEEK_STEP_MS)
+        elif key == Qt.Key_L:
+            tile.seek_by(SEEK_STEP_MS)
+        elif key == Qt.Key_T:
+            self.tag_requested.emit(tile.path)
+        elif key in (Qt.Key_Return, Qt.Key_Enter):
+            self.open_requested.emit(tile.path, tile.time_ms())
+        else:
+            super().keyPressEvent(event)
@@ -0,0 +1,73 @@
+# history_dialog.py - 观看记录对话框：继续观看 / 最常观看 / 未看完
+import os
+import time
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QLabel, QTabWidget, QListWidget, QListWidgetItem
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QFont
+
+try:
+    from ui_components import VIDEO_PATH_ROLE
+except ImportError:
+    VIDEO_PATH_ROLE = Qt.UserRole + 1
+
+VIEW_LIMIT = 50
+
+
+def _format_duration(ms):
+    s = max(0, ms) // 1000
+    return f"{s // 3600:d}:{s % 3600 // 60:02d}:{s % 60:02d}"
+
+
+class HistoryDialog(QDialog):
+    def __init__(self, history, play_callback, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("观看记录")
+        self.resize(640, 520)
+        self.history = history
+        self.play_callback = play_callback
+        layout = QVBoxLayout(self)
+
+        self.summary_label = QLabel()
+        self.summary_label.setFont(QFont("SimHei", 11))
+        layout.addWidget(self.summary_label)
+
+        self.tabs = QTabWidget()
+        self.views = [
+            ("继续观看", history.continue_watching),
+            ("最常观看", history.most_watched),
+            ("未看完", history.unfinished),
+            ("最近观看", history.recently_watched),
+        ]
+        for title, _ in self.views:
+            view = QListWidget()
+            view.setFont(QFont("SimHei", 11))
+            view.itemDoubleClicked.connect(self.on_item_double_clicked)
+            self.tabs.addTab(view, title)
+        self.tabs.currentChanged.connect(self.refresh_current)
+        layout.addWidget(self.tabs)
+        self.refresh_current()
+
+    def refresh_current(self, *_):
+        # 只查询当前标签页，每次都是索引上的前 K 条
+        completed, watched = self.history.completion()
+        ratio = completed * 100 // watched if watched else 0
+        self.summary_label.setText(f"看过 {watched} 个视频，已看完 {completed} 个（{ratio}%）")
+        index = self.tabs.currentIndex()
+        view = self.tabs.widget(index)
+        view.clear()
+        for row in self.views[index][1](VIEW_LIMIT):
+            item = QListWidgetItem(self._describe(row))
+            item.setData(VIDEO_PATH_ROLE, row['path'])
+            item.setToolTip(row['path'])
+            view.addItem(item)
+
+    def _describe(self, row):
+        name = os.path.basename(row['path'])
+        played = time.strftime("%Y-%m-%d %H:%M", time.localtime(row['last_played']))
+        progress = "已看完" if row['completed'] else f"{int(row['fraction'] * 100)}%"
+        return (f"{name}    {progress}  ·  {_format_duration(row['position_ms'])} / "
+                f"{_format_duration(row['duration_ms'])}  ·  {row['sessions']} 次  ·  {played}")
+
+    def on_item_double_clicked(self, item):
+        self.play_callback(item.data(VIDEO_PATH_ROLE))
+        self.accept()
@@ -0,0 +1,318 @@
+# label_shards.py - 按文件夹分片的视频标签存储（打开/查询时才加载，长时间不用的分片按 LRU 卸载）
+#
+#   Save/LabelShards.json   清单：{"version": 1, "shards": {root: {"file", "base", "sidecar", "tags": {tag: 视频数}}}}
+#                           启动时只读这个文件，全局标签与“哪些分片含有某标签”都从这里得到
+#   Save/Labels/<hash>.json 分片：一个 LabelStore，键为相对 base 的路径（统一用 '/' 分隔）
+#   <root>/.video_tags.json 可选的侧车副本，键与分片相同，随文件夹/移动硬盘一起迁移；
+#                           导出全部记录（不含本机的版本号），没有标签的记录作为墓碑保留
+#   Save/Labels/<hash>.sidecar.json  上次与侧车同步时的内容，导入时据此做三方合并
+# 不属于任何注册文件夹的旧记录放在 root 为 "" 的分片中，键仍为绝对路径。
+import os
+import json
+import hashlib
+from collections import OrderedDict
+from label_store import LabelStore, FileLock, write_json_atomic
+
+SAVE_DIR = "Save"
+SHARD_DIR = os.path.join(SAVE_DIR, "Labels")
+MANIFEST_FILE = os.path.join(SAVE_DIR, "LabelShards.json")
+SIDECAR_NAME = ".video_tags.json"
+MAX_LOADED_SHARDS = 8
+ORPHAN_ROOT = ""
+
+
+def shard_file(root):
+    name = hashlib.sha1(root.encode('utf-8')).hexdigest()[:16] if root else "orphan"
+    return os.path.join(SHARD_DIR, name + ".json")
+
+
+def synced_file(root):
+    return os.path.splitext(shard_file(root))[0] + ".sidecar.json"
+
+
+def portable(info):
+    # 版本号只在本机的日志中有意义，不能跨机器比较
+    record = {k: v for k, v in (info or {}).items() if k != 'version'}
+    record.setdefault('tags', [])
+    return record
+
+
+class LabelShard:
+    def __init__(self, root, base):
+        self.root = root
+        self.set_base(base)
+        self.store = LabelStore(shard_file(root))
+        self.tag_counts = {}
+        self.exported_generation = None
+
+    def set_base(self, base):
+        self.base = base
+        self._prefix = base if not base or base.endswith(os.sep) else base + os.sep
+
+    def rel(self, path):
+        if self._prefix and path.startswith(self._prefix):
+            return path[len(self._prefix):].replace(os.sep, '/')
+        return path
+
+    def abs(self, rel):
+        return self._prefix + rel.replace('/', os.sep) if self._prefix else rel
+
+    def count_tags(self, old_tags, new_tags):
+        for tag in old_tags:
+            n = self.tag_counts.get(tag, 0) - 1
+            if n > 0:
+                self.tag_counts[tag] = n
+            else:
+                self.tag_counts.pop(tag, None)
+        for tag in new_tags:
+            self.tag_counts[tag] = self.tag_counts.get(tag, 0) + 1
+
+    def recount(self):
+        self.tag_counts = {}
+        for info in self.store.records.values():
+            self.count_tags((), info.get('tags', []))
+
+
+class ShardedLabelStore:
+    def __init__(self, on_load=None, on_evict=None, max_loaded=MAX_LOADED_SHARDS):
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        self.lock = FileLock(os.path.splitext(MANIFEST_FILE)[0] + ".lock")
+        self.on_load = on_load or (lambda shard: None)
+        self.on_evict = on_evict or (lambda shard: None)
+        self.max_loaded = max_loaded
+        self.entries = {}
+        self.loaded = OrderedDict()
+        self.pinned = set()
+        self._prefixes = []
+
+    # === 清单 ===
+    def load_manifest(self):
+        self.entries = self._read_manifest()
+
+    def _read_manifest(self):
+        if not os.path.exists(MANIFEST_FILE):
+            return {}
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('shards', {})
+
+    def _write_entry(self, root, entry):
+        # 在锁内读最新清单，只替换本分片的条目，其他进程写入的条目保持不变
+        with self.lock:
+            entries = self._read_manifest()
+            entries[root] = entry
+            write_json_atomic(MANIFEST_FILE, {"version": 1, "shards": entries})
+        self.entries = entries
+
+    def _entry(self, root):
+        entry = self.entries.get(root)
+        if entry is None:
+            self.load_manifest()
+            entry = self.entries.get(root)
+        if entry is None:
+            entry = {"file": os.path.basename(shard_file(root)), "base": root, "sidecar": False, "tags": {}}
+        return entry
+
+    def all_tags(self):
+        tags = set()
+        for entry in self.entries.values():
+            tags.update(entry.get('tags', {}))
+        return tags
+
+    def roots_with_tag(self, tag):
+        self.load_manifest()
+        return [root for root, entry in self.entries.items() if entry.get('tags', {}).get(tag)]
+
+    # === 路径 -> 分片 ===
+    def set_roots(self, roots):
+        prefixes = []
+        for root in roots:
+            base = self._entry(root).get('base') or root
+            for prefix in {root, base}:
+                prefixes.append((prefix if prefix.endswith(os.sep) else prefix + os.sep, root))
+        prefixes.sort(key=lambda p: len(p[0]), reverse=True)
+        self._prefixes = prefixes
+
+    def root_for(self, path):
+        # 嵌套注册时取最深的那个文件夹
+        for prefix, root in self._prefixes:
+            if path.startswith(prefix):
+                return root
+        return ORPHAN_ROOT
+
+    def shard_for(self, path):
+        return self.shard(self.root_for(path))
+
+    def nested_roots(self, root):
+        prefix = root if root.endswith(os.sep) else root + os.sep
+        return sorted({r for p, r in self._prefixes if r == root or r.startswith(prefix)})
+
+    # === 加载与 LRU 卸载 ===
+    def shard(self, root):
+        shard = self.loaded.get(root)
+        if shard is not None:
+            self.loaded.move_to_end(root)
+            return shard
+        entry = self._entry(root)
+        shard = LabelShard(root, entry.get('base', root))
+        shard.store.load()
+        shard.recount()
+        shard.exported_generation = entry.get('sidecar_g')
+        self.loaded[root] = shard
+        if shard.tag_counts != entry.get('tags'):
+            self._write_entry(root, dict(entry, tags=dict(shard.tag_counts)))
+        self.on_load(shard)
+        return shard
+
+    def commit(self, shard, merge):
+        changes = shard.store.commit(merge=merge)
+        entry = self._entry(shard.root)
+        if shard.tag_counts != entry.get('tags'):
+            self._write_entry(shard.root, dict(entry, tags=dict(shard.tag_counts)))
+        return changes
+
+    def dirty_shards(self):
+        return [shard for shard in self.loaded.values() if shard.store.dirty]
+
+    def evict(self):
+        # 只卸载没有未提交修改、没有未导出侧车、且不在当前浏览范围内的分片
+        for root in list(self.loaded):
+            if len(self.loaded) <= self.max_loaded:
+                break
+            shard = self.loaded[root]
+            if root in self.pinned or shard.store.dirty or self._needs_export(shard):
+                continue
+            del self.loaded[root]
+            self.on_evict(shard)
+
+    def rebase(self, root, base):
+        # 文件夹解析出的真实路径变化（例如改成了符号链接）：键是相对路径，只需更新 base。
+        # 已加载的分片原地换 base 并按新路径重建索引，未提交的修改和未导出的侧车状态都保留
+        entry = self._entry(root)
+        if entry.get('base') == base:
+            return
+        self._write_entry(root, dict(entry, base=base))
+        shard = self.loaded.get(root)
+        if shard is not None:
+            self.on_evict(shard)
+            shard.set_base(base)
+            self.on_load(shard)
+        self.set_roots(dict.fromkeys(r for p, r in self._prefixes))
+
+    # === 侧车副本 ===
+    def sidecar_file(self, root):
+        return os.path.join(root, SIDECAR_NAME)
+
+    def set_sidecar(self, root, enabled):
+        self._write_entry(root, dict(self._entry(root), sidecar=enabled))
+
+    def has_sidecar(self, root):
+        return bool(self._entry(root).get('sidecar'))
+
+    def _needs_export(self, shard):
+        return self.has_sidecar(shard.root) and shard.exported_generation != shard.store.generation
+
+    def _read_synced(self, root):
+        path = synced_file(root)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def export_sidecar(self, root):
+        shard = self.loaded.get(root)
+        if shard is None or not self._needs_export(shard):
+            return False
+        snapshot = {rel: portable(info) for rel, info in shard.store.records.items()}
+        # 本地已删除的记录导出为墓碑，别处的副本才会跟着删除
+        for rel in self._read_synced(root):
+            snapshot.setdefault(rel, portable(None))
+        path = self.sidecar_file(root)
+        write_json_atomic(path, snapshot)
+        write_json_atomic(synced_file(root), snapshot)
+        shard.exported_generation = shard.store.generation
+        self._write_entry(root, dict(
+            self._entry(root), sidecar_mtime=os.path.getmtime(path), sidecar_g=shard.exported_generation
+        ))
+        return True
+
+    def import_sidecar(self, root, merge):
+        # 侧车文件比上次同步时新：与上次同步的内容逐条比较，别处改过的记录与本地修改做三方合并
+        # （merge(base, local, remote)），结果作为本地修改登记，随下一次提交写入分片
+        path = self.sidecar_file(root)
+        if not os.path.exists(path):
+            return None, []
+        entry = self._entry(root)
+        mtime = os.path.getmtime(path)
+        if mtime == entry.get('sidecar_mtime'):
+            return None, []
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        synced = self._read_synced(root)
+        shard = self.shard(root)
+        changes = []
+        for rel, info in records.items():
+            remote = portable(info)
+            base = synced.get(rel)
+            if remote == base:
+                continue
+            old = shard.store.records.get(rel)
+            local = portable(old)
+            if local == remote:
+                continue
+            # 本地自上次同步以来没改过就直接采用侧车的记录；首次同步（没有 base）时合并两边的标签
+            new = remote if local == portable(base) else portable(merge(base, local, remote))
+            if new == local:
+                continue
+            shard.store.touch(rel)
+            shard.store.records[rel] = new
+            changes.append((rel, old, new))
+        write_json_atomic(synced_file(root), {rel: portable(info) for rel, info in records.items()})
+        self._write_entry(root, dict(self._entry(root), sidecar=True, sidecar_mtime=mtime))
+        return shard, changes
+
+    # === 从单文件 AllMoviesLabel.json 迁移 ===
+    def migrate(self, legacy_file, roots):
+        # roots: {root: [可能的路径前缀, ...]}，第一个前缀作为该分片的 base
+        legacy = LabelStore(legacy_file)
+        with legacy.locked(), self.lock:
+            if os.path.exists(MANIFEST_FILE):
+                return False
+            legacy.load()
+            prefixes = sorted(
+                ((p if p.endswith(os.sep) else p + os.sep, root) for root, ps in roots.items() for p in ps),
+                key=lambda p: len(p[0]), reverse=True
+            )
+            shards = {}
+            for path, info in legacy.records.items():
+                for prefix, root in prefixes:
+                    if path.startswith(prefix):
+                        rel = path[len(prefix):].replace(os.sep, '/')
+                        break
+                else:
+                    root, rel = ORPHAN_ROOT, path
+                records = shards.setdefault(root, {})
+                if rel in records:
+                    # 同一视频曾以注册路径和真实路径各存过一份
+                    merged = records[rel]
+                    merged['tags'] = merged.get('tags', []) + [
+                        t for t in info.get('tags', []) if t not in merged.get('tags', [])
+                    ]
+                else:
+                    records[rel] = dict(info)
+            entries = {}
+            for root, records in shards.items():
+                write_json_atomic(shard_file(root), records, indent=4)
+                counts = {}
+                for info in records.values():
+                    for tag in info.get('tags', []):
+                        counts[tag] = counts.get(tag, 0) + 1
+                base = roots[root][0] if root in roots else root
+                entries[root] = {
+                    "file": os.path.basename(shard_file(root)), "base": base, "sidecar": False, "tags": counts
+                }
+            write_json_atomic(MANIFEST_FILE, {"version": 1, "shards": entries})
+            for path in (legacy.snapshot_file, legacy.journal_file):
+                if os.path.exists(path):
+                    os.replace(path, path + ".migrated")
+        self.entries = entries
+        return True
@@ -0,0 +1,334 @@
+# label_store.py - 多进程安全的视频标签存储（文件锁 + 版本号 + 增量日志）
+#
+# 存储由三个文件组成：
+#   AllMoviesLabel.json     快照：{path: {"tags": [...], "version": n}}，与旧格式兼容
+#   AllMoviesLabel.journal  追加日志：首行为 {"epoch", "base"} 头，之后每行一条记录变更 {"g", "path", "version", "info"}
+#   AllMoviesLabel.lock     写入时持有的排他锁
+# 每个进程记住自己读到的日志位置（generation + 字节偏移），检测到文件变化时只读取尾部的新增行。
+import os
+import sys
+import json
+import copy
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+COMPACT_EVERY = 2000
+
+
+class VersionConflict(Exception):
+    def __init__(self, paths, changes):
+        super().__init__(f"记录已被其他进程修改: {sorted(paths)[:5]}")
+        self.paths = paths
+        # 抛出前已合并进内存的远端变更，调用方仍需据此更新自己的索引
+        self.changes = changes
+
+
+class FileLock:
+    def __init__(self, path, timeout=10.0):
+        self.path = path
+        self.timeout = timeout
+        self._fh = None
+        self._depth = 0
+        # 同一进程内的多个线程先在这里排队，再竞争文件锁
+        self._thread_lock = threading.RLock()
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth:
+            self._depth += 1
+            return
+        fh = open(self.path, 'a+b')
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                self._lock_fh(fh)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    fh.close()
+                    self._thread_lock.release()
+                    raise TimeoutError(f"等待文件锁超时: {self.path}")
+                time.sleep(0.01)
+        self._fh = fh
+        self._depth = 1
+
+    def release(self):
+        self._depth -= 1
+        try:
+            if not self._depth:
+                try:
+                    self._unlock_fh(self._fh)
+                finally:
+                    self._fh.close()
+                    self._fh = None
+        finally:
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    if sys.platform.startswith('win'):
+        @staticmethod
+        def _lock_fh(fh):
+            import msvcrt
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+
+        @staticmethod
+        def _unlock_fh(fh):
+            import msvcrt
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        @staticmethod
+        def _lock_fh(fh):
+            import fcntl
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        @staticmethod
+        def _unlock_fh(fh):
+            import fcntl
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def write_json_atomic(path, data, indent=None):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class LabelStore:
+    def __init__(self, snapshot_file, compact_every=COMPACT_EVERY):
+        base = os.path.splitext(snapshot_file)[0]
+        self.snapshot_file = snapshot_file
+        self.journal_file = base + ".journal"
+        self.lock = FileLock(base + ".lock")
+        self.compact_every = compact_every
+        self.records = {}
+        self.versions = {}
+        self.generation = 0
+        # path -> 本地开始修改前的已提交记录（None 表示新记录）
+        self.dirty = {}
+        # path -> 本地修改期间收到的远端最新记录
+        self._remote = {}
+        self._epoch = None
+        self._offset = 0
+        self._stat = None
+
+    @contextmanager
+    def locked(self):
+        with self.lock:
+            yield self
+
+    # === 加载与增量同步 ===
+    def load(self):
+        with self.lock:
+            self._load_unlocked()
+
+    def _load_unlocked(self):
+        records = {}
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        self.records.clear()
+        self.records.update(records)
+        self.versions = {p: info.get('version', 0) for p, info in records.items()}
+        self.generation = 0
+        self._epoch = None
+        self._offset = 0
+        self._stat = None
+        self.dirty.clear()
+        self._remote.clear()
+        header = self._read_header()
+        if header:
+            self._epoch = header['epoch']
+            self.generation = header['base']
+            self._offset = header['_size']
+            self._read_tail()
+
+    def poll(self):
+        # 廉价变更检测：日志文件 stat 未变化则直接返回
+        if self._journal_stat() == self._stat:
+            return []
+        with self.lock:
+            return self._sync_unlocked()
+
+    def _sync_unlocked(self):
+        header = self._read_header()
+        if header is None:
+            self._stat = self._journal_stat()
+            return []
+        if header['epoch'] != self._epoch:
+            if header['base'] != self.generation:
+                # 其他进程压缩了日志且本进程落后，只能重新读取快照
+                return self._reload_keeping_dirty()
+            self._epoch = header['epoch']
+            self._offset = header['_size']
+        return self._read_tail()
+
+    def _reload_keeping_dirty(self):
+        before = dict(self.records)
+        dirty, local = dict(self.dirty), {p: self.records.get(p) for p in self.dirty}
+        self._load_unlocked()
+        changes = []
+        for path in set(before) | set(self.records):
+            if path in dirty:
+                continue
+            old, new = before.get(path), self.records.get(path)
+            if old != new:
+                changes.append((path, old, new))
+        for path, base in dirty.items():
+            current = self.records.get(path)
+            if (current or {}).get('version') != (base or {}).get('version'):
+                self._remote[path] = current
+            self.dirty[path] = base
+            if local[path] is None:
+                self.records.pop(path, None)
+            else:
+                self.records[path] = local[path]
+        return changes
+
+    def _journal_stat(self):
+        try:
+            st = os.stat(self.journal_file)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    def _read_header(self):
+        try:
+            with open(self.journal_file, 'rb') as f:
+                line = f.readline()
+        except FileNotFoundError:
+            return None
+        if not line.endswith(b'\n'):
+            return None
+        header = json.loads(line)
+        header['_size'] = len(line)
+        return header
+
+    def _read_tail(self):
+        changes = []
+        with open(self.journal_file, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            change = self._apply_remote(entry['path'], entry['version'], entry['info'])
+            if change:
+                changes.append(change)
+            self.generation = entry['g']
+        self._offset += end
+        self._stat = self._journal_stat()
+        return changes
+
+    def _apply_remote(self, path, version, info):
+        if version <= self.versions.get(path, -1):
+            return None
+        self.versions[path] = version
+        if path in self.dirty:
+            self._remote[path] = info
+            return None
+        old = self.records.get(path)
+        if info is None:
+            self.records.pop(path, None)
+        else:
+            self.records[path] = info
+        return (path, old, info)
+
+    # === 本地修改与乐观并发提交 ===
+    def touch(self, path):
+        if path not in self.dirty:
+            self.dirty[path] = copy.deepcopy(self.records.get(path))
+
+    def commit(self, merge=None):
+        # merge(base, local, remote) -> 合并后的记录；为 None 时遇到冲突抛出 VersionConflict
+        if not self.dirty:
+            return []
+        with self.lock:
+            changes = self._sync_unlocked()
+            if merge is None and self._remote:
+                raise VersionConflict(set(self._remote), changes)
+            lines = []
+            for path, base in self.dirty.items():
+                local = self.records.get(path)
+                if path in self._remote:
+                    merged = merge(base, local, self._remote.pop(path))
+                    changes.append((path, local, merged))
+                    local = merged
+                version = self.versions.get(path, 0) + 1
+                if local is None:
+                    self.records.pop(path, None)
+                else:
+                    local['version'] = version
+                    self.records[path] = local
+                self.versions[path] = version
+                self.generation += 1
+                lines.append(json.dumps(
+                    {"g": self.generation, "path": path, "version": version, "info": local},
+                    ensure_ascii=False
+                ))
+            self.dirty.clear()
+            self._append(lines)
+            if self.generation - self._header_base() >= self.compact_every:
+                self._compact_unlocked()
+        return changes
+
+    def _header_base(self):
+        header = self._read_header()
+        return header['base'] if header else 0
+
+    def _append(self, lines):
+        if self._read_header() is None:
+            self._write_journal_header(self.generation - len(lines))
+        with open(self.journal_file, 'ab') as f:
+            f.write(("\n".join(lines) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+        self._offset = os.path.getsize(self.journal_file)
+        self._stat = self._journal_stat()
+
+    def _write_journal_header(self, base):
+        self._epoch = uuid.uuid4().hex
+        header = (json.dumps({"epoch": self._epoch, "base": base}) + "\n").encode('utf-8')
+        tmp = f"{self.journal_file}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.journal_file)
+        self._offset = len(header)
+        self._stat = self._journal_stat()
+
+    def compact(self):
+        with self.lock:
+            self._sync_unlocked()
+            self._compact_unlocked()
+
+    def _compact_unlocked(self):
+        # 快照写入未提交修改前的记录，日志重置为新的 epoch
+        snapshot = dict(self.records)
+        for path, base in self.dirty.items():
+            if base is None:
+                snapshot.pop(path, None)
+            else:
+                snapshot[path] = base
+        for path, remote in self._remote.items():
+            if remote is None:
+                snapshot.pop(path, None)
+            else:
+                snapshot[path] = remote
+        write_json_atomic(self.snapshot_file, snapshot, indent=4)
+        self._write_journal_header(self.generation)
@@ -0,0 +1,487 @@
+# local_api.py - 可选的本机 HTTP/JSON 接口（asyncio，只监听 127.0.0.1），供其他本地工具查询和打标签
+#
+# 服务器在独立线程的事件循环中运行；所有对 DataManager 的访问都通过 UiBridge 投递到界面线程执行，
+# 不与界面并发修改数据，也不直接读写 Save/ 下的 JSON 文件。查询结果按变更序号缓存，
+# 翻页请求大多直接由缓存响应，不占用界面线程。
+#
+#   GET  /api/folders
+#   GET  /api/tags
+#   GET  /api/videos?tags=a,b&folder=...&offset=0&limit=100     分页，带 ETag，支持 If-None-Match
+#   GET  /api/videos.ndjson?tags=...&folder=...                  分块传输，每行一个 JSON
+#   POST /api/tags/batch  {"ops": [...]}                          批量增删/重命名/删除标签，整批落盘一次
+#   GET  /api/changes?since=序号&timeout=秒                       变更流（长轮询）
+#
+# 浏览器中的网页也能向 127.0.0.1 发请求：Host 不是 127.0.0.1/localhost:端口（DNS 重绑定）或带 Origin 头的
+# 请求一律拒绝；修改类请求还必须是 Content-Type: application/json，并带上
+# Authorization: Bearer <令牌>（令牌在首次使用时生成，保存在 Save/LocalApi.json 的 "token"）。
+import os
+import hmac
+import json
+import asyncio
+import hashlib
+import secrets
+import threading
+import concurrent.futures
+from collections import deque, OrderedDict
+from urllib.parse import urlsplit, parse_qs
+from PyQt5.QtCore import QObject, pyqtSignal
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+LOCAL_API_FILE = os.path.join(SAVE_DIR, "LocalApi.json")
+
+HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_PAGE = 100
+MAX_PAGE = 1000
+NDJSON_BATCH = 500
+MAX_BODY = 8 * 1024 * 1024
+MAX_HEADER = 64 * 1024
+CHANGE_LOG_SIZE = 10000
+MAX_POLL_SECONDS = 60
+QUERY_CACHE_SIZE = 32
+
+STATUS_TEXT = {
+    200: "OK", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+    404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 415: "Unsupported Media Type",
+    500: "Internal Server Error",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def load_settings():
+    try:
+        if os.path.exists(LOCAL_API_FILE):
+            with open(LOCAL_API_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        log.error("读取 %s 出错: %s", LOCAL_API_FILE, e)
+    return {}
+
+
+def save_settings(settings):
+    try:
+        write_json_atomic(LOCAL_API_FILE, settings, indent=4)
+    except Exception as e:
+        log.error("保存 %s 出错: %s", LOCAL_API_FILE, e)
+
+
+def ensure_token(settings):
+    # 每个安装一个令牌，首次调用时生成并写回设置文件
+    token = settings.get('token')
+    if not token:
+        token = settings['token'] = secrets.token_urlsafe(24)
+        save_settings(settings)
+    return token
+
+
+class UiBridge(QObject):
+    # 在界面线程创建；其他线程调用 call(fn) 得到 Future，fn 在界面线程的事件循环中执行
+    _submitted = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._submitted.connect(self._run)
+
+    def call(self, fn):
+        future = concurrent.futures.Future()
+        self._submitted.emit((fn, future))
+        return future
+
+    def _run(self, job):
+        fn, future = job
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+
+
+class ChangeFeed:
+    # 界面线程追加变更，服务器线程读取；每条变更有递增的序号
+    def __init__(self, capacity=CHANGE_LOG_SIZE):
+        self.seq = 0
+        self._events = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def on_tags(self, path, old_tags, new_tags):
+        added = [t for t in new_tags if t not in old_tags]
+        removed = [t for t in old_tags if t not in new_tags]
+        if added or removed:
+            self.append({'kind': 'tags', 'path': path, 'added': added, 'removed': removed})
+
+    def append(self, event):
+        with self._lock:
+            self.seq += 1
+            event['seq'] = self.seq
+            self._events.append(event)
+            waiters = list(self._waiters)
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(waiter.set)
+
+    def since(self, seq):
+        # (最新序号, 变更列表, 是否有遗漏)；since 早于保留范围时调用方应重新全量查询
+        with self._lock:
+            if not self._events or seq >= self.seq:
+                return self.seq, [], False
+            first = self._events[0]['seq']
+            missed = seq < first - 1
+            events = [e for e in self._events if e['seq'] > seq]
+            return self.seq, events, missed
+
+    async def wait(self, seq, timeout):
+        if self.seq > seq:
+            return
+        waiter = asyncio.Event()
+        key = (asyncio.get_running_loop(), waiter)
+        with self._lock:
+            self._waiters.add(key)
+        try:
+            if self.seq <= seq:
+                await asyncio.wait_for(waiter.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._waiters.discard(key)
+
+
+class LocalApiServer:
+    def __init__(self, data_manager, port=DEFAULT_PORT, on_mutated=None, bridge=None, token=None):
+        self.data_manager = data_manager
+        # port 为 0 时由系统分配，启动后改为实际端口
+        self.port = port
+        # 修改类请求需要的令牌；未提供时每次启动随机生成（外部工具无法修改数据）
+        self.token = token or secrets.token_urlsafe(24)
+        # on_mutated(ops, changed)：批量修改完成后在界面线程调用，用于刷新界面
+        self.on_mutated = on_mutated
+        self.bridge = bridge or UiBridge()
+        self.feed = ChangeFeed()
+        data_manager.add_tag_listener(self.feed.on_tags)
+        self._cache = OrderedDict()
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self.error = None
+
+    # === 生命周期 ===
+    def start(self):
+        if self._thread is not None:
+            return True
+        self._ready.clear()
+        self.error = None
+        self._thread = threading.Thread(target=self._serve, daemon=True, name="local-api")
+        self._thread.start()
+        self._ready.wait(5)
+        if self.error is not None:
+            self._thread = None
+            return False
+        log.info("本地 API 已启动: http://%s:%d/api/", HOST, self.port)
+        return True
+
+    def stop(self):
+        if self._thread is None:
+            return
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._thread = None
+        log.info("本地 API 已停止")
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def _serve(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        try:
+            self._server = loop.run_until_complete(
+                asyncio.start_server(self._handle, HOST, self.port, limit=MAX_HEADER, backlog=512)
+            )
+            self.port = self._server.sockets[0].getsockname()[1]
+        except OSError as e:
+            self.error = e
+            log.error("本地 API 启动失败 (%s:%d): %s", HOST, self.port, e)
+            self._ready.set()
+            loop.close()
+            return
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            # 保持连接（keep-alive / 长轮询）的处理协程直接取消
+            self._server.close()
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.close()
+            self._loop = None
+
+    def notify(self, kind, **details):
+        # 标签以外的变化（扫描结果、文件夹列表）同样推进序号，使缓存和 ETag 失效
+        self.feed.append(dict(details, kind=kind))
+
+    async def _ui(self, fn):
+        return await asyncio.wrap_future(self.bridge.call(fn))
+
+    # === HTTP ===
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send_json(writer, 413, {'error': "请求头过大"}, keep_alive=False)
+                    break
+                try:
+                    method, target, headers, length = self._parse_head(head)
+                except ApiError as e:
+                    await self._send_json(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                if length > MAX_BODY:
+                    await self._send_json(writer, 413, {'error': "请求体过大"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    await self._dispatch(writer, method, target, headers, body, keep_alive)
+                except ApiError as e:
+                    await self._send_json(writer, e.status, {'error': str(e)}, keep_alive=keep_alive)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    break
+                except Exception as e:
+                    log.exception("本地 API 处理 %s %s 出错", method, target)
+                    await self._send_json(writer, 500, {'error': str(e)}, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except Exception as e:
+            log.debug("本地 API 连接异常: %s", e)
+        finally:
+            writer.close()
+
+    def _parse_head(self, head):
+        lines = head.decode('latin-1').split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise ApiError(400, "请求行无效")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise ApiError(400, "Content-Length 无效")
+        return method.upper(), target, headers, length
+
+    async def _send(self, writer, status, body, content_type, headers=None, keep_alive=True):
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                 f"Content-Type: {content_type}",
+                 f"Content-Length: {len(body)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, data, headers=None, keep_alive=True):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8') if data is not None else b""
+        await self._send(writer, status, body, "application/json; charset=utf-8", headers, keep_alive)
+
+    def _check_request(self, method, headers):
+        if headers.get('host', '').lower() not in (f"{HOST}:{self.port}", f"localhost:{self.port}"):
+            raise ApiError(403, "Host 不是本机地址")
+        if 'origin' in headers:
+            raise ApiError(403, "不接受来自网页的请求")
+        if method == 'GET':
+            return
+        if headers.get('content-type', '').split(";")[0].strip().lower() != 'application/json':
+            raise ApiError(415, "请求体必须是 application/json")
+        scheme, _, token = headers.get('authorization', '').partition(" ")
+        if scheme.lower() != 'bearer' or not hmac.compare_digest(token.strip().encode(), self.token.encode()):
+            raise ApiError(401, "缺少或错误的令牌")
+
+    async def _dispatch(self, writer, method, target, headers, body, keep_alive):
+        self._check_request(method, headers)
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        routes = {
+            ('GET', '/api/folders'): self._get_folders,
+            ('GET', '/api/tags'): self._get_tags,
+            ('GET', '/api/videos'): self._get_videos,
+            ('GET', '/api/changes'): self._get_changes,
+            ('POST', '/api/tags/batch'): self._post_batch,
+        }
+        if method == 'GET' and url.path == '/api/videos.ndjson':
+            await self._stream_videos(writer, query, keep_alive)
+            return
+        handler = routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in routes):
+                raise ApiError(405, f"不支持的方法: {method}")
+            raise ApiError(404, f"没有这个接口: {url.path}")
+        status, data, extra = await handler(query, headers, body)
+        await self._send_json(writer, status, data, extra, keep_alive)
+
+    # === 查询 ===
+    @staticmethod
+    def _list_param(query, name):
+        values = []
+        for value in query.get(name, []):
+            values.extend(v.strip() for v in value.split(",") if v.strip())
+        return values
+
+    @staticmethod
+    def _int_param(query, name, default, low, high):
+        try:
+            value = int(query.get(name, [default])[0])
+        except ValueError:
+            raise ApiError(400, f"参数 {name} 必须是整数")
+        return max(low, min(high, value))
+
+    async def _get_folders(self, query, headers, body):
+        folders = await self._ui(lambda: list(self.data_manager.folders))
+        return 200, {'folders': folders}, None
+
+    async def _get_tags(self, query, headers, body):
+        tags = await self._ui(lambda: sorted(self.data_manager.all_known_tags))
+        return 200, {'tags': tags, 'seq': self.feed.seq}, None
+
+    async def _query(self, tags, folder):
+        # 结果按 (查询, 变更序号) 缓存，序号变化后自然失效；同一时刻的相同查询共用一次界面线程调用
+        key = (tuple(sorted(tags)), folder)
+        seq = self.feed.seq
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == seq:
+            self._cache.move_to_end(key)
+            task = cached[1]
+        else:
+            task = asyncio.ensure_future(self._ui(lambda: self.data_manager.query_videos(tags, folder)))
+            self._cache[key] = (seq, task)
+            while len(self._cache) > QUERY_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        try:
+            rows = await asyncio.shield(task)
+        except ValueError as e:
+            self._cache.pop(key, None)
+            raise ApiError(400, str(e))
+        return seq, rows
+
+    @staticmethod
+    def _item(row):
+        path, size, mtime, tags = row
+        return {'path': path, 'size': size, 'mtime_ns': mtime, 'tags': tags}
+
+    async def _get_videos(self, query, headers, body):
+        tags = self._list_param(query, 'tags')
+        folder = query.get('folder', [None])[0]
+        offset = self._int_param(query, 'offset', 0, 0, 1 << 31)
+        limit = self._int_param(query, 'limit', DEFAULT_PAGE, 1, MAX_PAGE)
+        digest = hashlib.sha1(repr((sorted(tags), folder, offset, limit)).encode('utf-8')).hexdigest()[:16]
+        etag = f'"{self.feed.seq}-{digest}"'
+        if headers.get('if-none-match') == etag:
+            return 304, None, {'ETag': etag}
+        seq, rows = await self._query(tags, folder)
+        etag = f'"{seq}-{digest}"'
+        page = rows[offset:offset + limit]
+        data = {
+            'total': len(rows),
+            'offset': offset,
+            'limit': limit,
+            'next': offset + limit if offset + limit < len(rows) else None,
+            'seq': seq,
+            'items': [self._item(row) for row in page],
+        }
+        return 200, data, {'ETag': etag}
+
+    async def _stream_videos(self, writer, query, keep_alive):
+        # 分块传输：大列表逐批写出，每批写完等待对端读取（背压）
+        tags = self._list_param(query, 'tags')
+        folder = query.get('folder', [None])[0]
+        seq, rows = await self._query(tags, folder)
+        head = ["HTTP/1.1 200 OK", "Content-Type: application/x-ndjson; charset=utf-8",
+                "Transfer-Encoding: chunked", f"X-Total-Count: {len(rows)}", f"ETag: \"{seq}\"",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1'))
+        for start in range(0, len(rows), NDJSON_BATCH):
+            chunk = "".join(
+                json.dumps(self._item(row), ensure_ascii=False) + "\n" for row in rows[start:start + NDJSON_BATCH]
+            ).encode('utf-8')
+            writer.write(f"{len(chunk):X}\r\n".encode('latin-1') + chunk + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _get_changes(self, query, headers, body):
+        since = self._int_param(query, 'since', self.feed.seq, 0, 1 << 62)
+        timeout = self._int_param(query, 'timeout', 0, 0, MAX_POLL_SECONDS)
+        if timeout:
+            await self.feed.wait(since, timeout)
+        seq, events, missed = self.feed.since(since)
+        return 200, {'seq': seq, 'reset': missed, 'changes': events}, None
+
+    # === 批量修改 ===
+    async def _post_batch(self, query, headers, body):
+        try:
+            payload = json.loads(body.decode('utf-8') or "{}")
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise ApiError(400, f"请求体不是有效的 JSON: {e}")
+        ops = payload.get('ops') if isinstance(payload, dict) else None
+        if not isinstance(ops, list) or not ops:
+            raise ApiError(400, "需要非空的 ops 列表")
+        ops = [self._validate_op(i, op) for i, op in enumerate(ops)]
+
+        def run():
+            changed = self.data_manager.apply_tag_ops(ops)
+            if self.on_mutated is not None:
+                self.on_mutated(ops, changed)
+            return len(changed)
+        try:
+            changed = await self._ui(run)
+        except ValueError as e:
+            # apply_tag_ops 在修改任何数据之前检查整批操作，失败时什么都没有执行
+            raise ApiError(400, str(e))
+        return 200, {'changed': changed, 'seq': self.feed.seq}, None
+
+    @staticmethod
+    def _validate_op(i, op):
+        def strings(name):
+            value = op.get(name)
+            if not isinstance(value, list) or not value or not all(isinstance(v, str) and v.strip() for v in value):
+                raise ApiError(400, f"ops[{i}].{name} 必须是非空字符串列表")
+            return [v.strip() if name == 'tags' else os.path.normpath(v) for v in value]
+
+        def string(name):
+            value = op.get(name)
+            if not isinstance(value, str) or not value.strip():
+                raise ApiError(400, f"ops[{i}].{name} 必须是非空字符串")
+            return value.strip()
+
+        kind = op.get('op') if isinstance(op, dict) else None
+        if kind in ('add', 'remove'):
+            return {'op': kind, 'paths': strings('paths'), 'tags': strings('tags')}
+        if kind == 'rename':
+            old, new = string('from'), string('to')
+            if old == new:
+                raise ApiError(400, f"ops[{i}].from 与 to 相同")
+            return {'op': kind, 'from': old, 'to': new}
+        if kind == 'delete':
+            return {'op': kind, 'tag': string('tag')}
+        raise ApiError(400, f"ops[{i}].op 必须是 add / remove / rename / delete")
@@ -0,0 +1,97 @@
+# log_utils.py - 日志：按模块分的 logger、按级别过滤、高频事件限流、内存环形缓冲（可导出用于问题反馈）
+#
+# 用法：
+#   from log_utils import get_logger
+#   log = get_logger(__name__)
+#   log.debug("窗口大小: %sx%s", w, h)   # 使用 % 占位符，级别未开启时不会格式化字符串
+# 级别由环境变量 VTM_LOG_LEVEL 控制（默认 INFO），例如 VTM_LOG_LEVEL=DEBUG python main.py
+import os
+import sys
+import time
+import logging
+import threading
+from collections import deque
+
+SAVE_DIR = "Save"
+LOG_DIR = os.path.join(SAVE_DIR, "Logs")
+ROOT_LOGGER = "vtm"
+RING_CAPACITY = 2000
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+
+class RingBufferHandler(logging.Handler):
+    # 只保存 LogRecord 本身，导出时才格式化
+    def __init__(self, capacity=RING_CAPACITY):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def dump(self, path):
+        formatter = logging.Formatter(LOG_FORMAT)
+        with self.lock:
+            records = list(self.records)
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(formatter.format(record) + "\n")
+
+
+class RateLimitFilter(logging.Filter):
+    # 同一调用位置在 interval 秒内只放行一条，被丢弃的条数附在下一条放行的消息后面
+    def __init__(self, interval=1.0):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._last.get(key, (0.0, 0))
+            if now - last < self.interval:
+                self._last[key] = (last, suppressed + 1)
+                return False
+            self._last[key] = (now, 0)
+        if suppressed:
+            record.msg = f"{record.msg} (已省略 {suppressed} 条)"
+        return True
+
+
+_ring = RingBufferHandler()
+_configured = False
+
+
+def setup_logging(level=None):
+    global _configured
+    if _configured:
+        return
+    _configured = True
+    level = level or os.environ.get("VTM_LOG_LEVEL", "INFO")
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    root.propagate = False
+    console = logging.StreamHandler(sys.stderr)
+    console.setFormatter(logging.Formatter(LOG_FORMAT, "%H:%M:%S"))
+    root.addHandler(console)
+    root.addHandler(_ring)
+
+
+def get_logger(name, rate_limit=None):
+    # name 一般传 __name__，也可以是 "模块.子类别"；rate_limit 为秒数时，该 logger 的每个调用位置按此间隔限流
+    if name == "__main__":
+        name = "main"
+    logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+    if rate_limit and not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+        logger.addFilter(RateLimitFilter(rate_limit))
+    return logger
+
+
+def dump_ring_buffer(path=None):
+    # 导出最近的日志，返回写入的文件路径
+    if path is None:
+        os.makedirs(LOG_DIR, exist_ok=True)
+        path = os.path.join(LOG_DIR, time.strftime("debug-%Y%m%d-%H%M%S.log"))
+    _ring.dump(path)
+    return path
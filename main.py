@@ -1,10 +1,23 @@
-# main.py - 程序启动入口
-import sys
-from PyQt5.QtWidgets import QApplication
-from folder_video_manager import FolderVideoManager
-
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = FolderVideoManager()
-    window.show()
+# main.py - 程序启动入口
+import sys
+from PyQt5.QtWidgets import QApplication
+from log_utils import setup_logging, get_logger
+from memory_diagnostics import start_from_env
+from folder_video_manager import FolderVideoManager
+
+log = get_logger(__name__)
+
+
+def log_uncaught(exc_type, exc, tb):
+    # 未捕获的异常也进入环形缓冲，导出的调试日志里能看到
+    log.critical("未捕获的异常", exc_info=(exc_type, exc, tb))
+
+
+if __name__ == "__main__":
+    setup_logging()
+    start_from_env()
+    sys.excepthook = log_uncaught
+    app = QApplication(sys.argv)
+    window = FolderVideoManager()
+    window.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,336 @@
+# memory_diagnostics.py - 内存诊断：tracemalloc 快照对比、各子系统大小估算、控件计数、泄漏检查
+#
+# 界面中通过菜单“调试”使用；也可以脚本方式生成报告（返回码非 0 表示泄漏检查未通过）：
+#   python memory_diagnostics.py --folder D:\Videos -n 20 -o report.txt
+# 启动时设置 VTM_TRACEMALLOC=帧数（例如 VTM_TRACEMALLOC=10）可从一开始就记录分配位置。
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from log_utils import get_logger
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+REPORT_DIR = os.path.join(SAVE_DIR, "Logs")
+
+TRACE_FRAMES = 10
+# deep_sizeof 最多遍历的对象数，超过后结果标记为下限
+SIZEOF_LIMIT = 5_000_000
+# 泄漏检查的默认阈值：N 次循环后的增长上限
+LEAK_MAX_BYTES = 512 * 1024
+LEAK_MAX_WIDGETS = 0
+# 脚本方式打开文件夹后，等待其后台扫描完成的上限（毫秒）
+SCAN_WAIT_MS = 120_000
+
+
+def start_from_env():
+    frames = os.environ.get("VTM_TRACEMALLOC")
+    if frames and not tracemalloc.is_tracing():
+        tracemalloc.start(int(frames) if frames.isdigit() else TRACE_FRAMES)
+        log.info("已开启 tracemalloc (%s 帧)", tracemalloc.get_traceback_limit())
+
+
+def process_rss():
+    # 进程常驻内存（字节），包括 Qt / VLC 等原生分配；取不到时返回 None
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def format_bytes(n):
+    if n is None:
+        return "未知"
+    for unit in ("B", "KB", "MB"):
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def deep_sizeof(obj, limit=SIZEOF_LIMIT):
+    # 估算 obj 及其引用的容器/字符串的总大小；共享对象只计一次。返回 (字节数, 是否完整)
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        if len(seen) >= limit:
+            return total, False
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        try:
+            total += sys.getsizeof(o)
+        except TypeError:
+            continue
+        if isinstance(o, (str, bytes, int, float, bool)) or o is None:
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            d = getattr(o, '__dict__', None)
+            if isinstance(d, dict):
+                stack.append(d)
+            for slot in getattr(type(o), '__slots__', ()):
+                if hasattr(o, slot):
+                    stack.append(getattr(o, slot))
+    return total, True
+
+
+# === tracemalloc 快照 ===
+class SnapshotHistory:
+    def __init__(self):
+        self.snapshots = []
+
+    def take(self, label=None):
+        if not tracemalloc.is_tracing():
+            # 临时开启只能看到此后的分配，结果里会注明
+            tracemalloc.start(TRACE_FRAMES)
+            log.info("已临时开启 tracemalloc")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        label = label or time.strftime("%H:%M:%S")
+        self.snapshots.append((label, snapshot))
+        return label
+
+    def diff(self, top=25, key_type='lineno'):
+        # 最近两次快照之间增长最多的分配位置
+        if len(self.snapshots) < 2:
+            return []
+        (old_label, old), (new_label, new) = self.snapshots[-2], self.snapshots[-1]
+        lines = [f"快照 {old_label} → {new_label}，增长最多的 {top} 处:"]
+        for stat in new.compare_to(old, key_type)[:top]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"  {format_bytes(stat.size_diff):>10} ({stat.count_diff:+d} 块)  "
+                f"{os.path.basename(frame.filename)}:{frame.lineno}"
+            )
+        return lines
+
+    def clear(self):
+        self.snapshots = []
+
+
+# === 子系统大小与控件数 ===
+def subsystem_sizes(window):
+    # name -> (字节数, 是否完整, 条目数)
+    dm = window.data_manager
+    sections = {
+        "标签记录 (已加载分片)": ([s.store.records for s in dm.labels.loaded.values()],
+                             sum(len(s.store.records) for s in dm.labels.loaded.values())),
+        "标签倒排索引": (dm.tag_index.postings, len(dm.tag_index.postings)),
+        "全局已知标签": (dm.all_known_tags, len(dm.all_known_tags)),
+        "播放状态": (window.playback_states, len(window.playback_states)),
+        "扫描索引 (已加载)": ([i.dirs for i in dm.scan_indexes.loaded()],
+                          sum(len(i.dirs) for i in dm.scan_indexes.loaded())),
+        "扫描排序表缓存": ([i._table for i in dm.scan_indexes.loaded() if i._table is not None],
+                      sum(1 for i in dm.scan_indexes.loaded() if i._table is not None)),
+        "当前列表筛选": (window.facets, len(window.facets.view)),
+        "标签补全索引": (window.tag_completer, len(window.tag_usage.stats)),
+        "观看记录路径缓存": (window.watch_history._video_ids, len(window.watch_history._video_ids)),
+    }
+    result = {}
+    for name, (obj, count) in sections.items():
+        size, complete = deep_sizeof(obj)
+        result[name] = (size, complete, count)
+    return result
+
+
+def widget_counts():
+    from PyQt5.QtWidgets import QApplication
+    return Counter(type(w).__name__ for w in QApplication.allWidgets())
+
+
+def flush_deferred_deletes():
+    # deleteLater 的控件要等事件循环处理 DeferredDelete 才会真正销毁
+    from PyQt5.QtCore import QCoreApplication, QEvent
+    QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+    QCoreApplication.processEvents()
+    gc.collect()
+
+
+# === 泄漏检查：重复 N 次某个操作，增长应当有界 ===
+def leak_check(name, action, n=20, warmup=3, max_bytes=LEAK_MAX_BYTES, max_widgets=LEAK_MAX_WIDGETS):
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(1)
+    try:
+        for _ in range(warmup):
+            action()
+        flush_deferred_deletes()
+        widgets_before = sum(widget_counts().values())
+        traced_before = tracemalloc.get_traced_memory()[0]
+        rss_before = process_rss()
+        for _ in range(n):
+            action()
+            flush_deferred_deletes()
+        widgets_after = sum(widget_counts().values())
+        traced_after = tracemalloc.get_traced_memory()[0]
+        rss_after = process_rss()
+    finally:
+        if started:
+            tracemalloc.stop()
+    growth = traced_after - traced_before
+    widget_growth = widgets_after - widgets_before
+    result = {
+        'name': name,
+        'n': n,
+        'python_growth': growth,
+        'widget_growth': widget_growth,
+        'rss_growth': None if rss_before is None or rss_after is None else rss_after - rss_before,
+        'ok': growth <= max_bytes and widget_growth <= max_widgets,
+    }
+    if not result['ok']:
+        log.warning("泄漏检查未通过 %s: Python 内存 +%s，控件 %+d", name, format_bytes(growth), widget_growth)
+    return result
+
+
+def standard_leak_checks(window, n=20):
+    # 播放器打开/关闭（需要当前列表中有视频）与标签面板重建
+    checks = []
+    path = window.current_selected_video_path or next(iter(window.current_folder_videos), None)
+    if path and os.path.isfile(path):
+        def cycle_player():
+            window.open_video(path)
+            window.release_video_player()
+        checks.append(leak_check("播放器打开/关闭", cycle_player, n))
+    else:
+        checks.append({'name': "播放器打开/关闭", 'skipped': "当前列表中没有可播放的视频"})
+
+    tags = window.data_manager.get_tags(path) if path else []
+
+    def rebuild_tag_panels():
+        window.update_global_tags_list()
+        window.update_current_tags_ui(tags)
+    checks.append(leak_check("标签面板重建", rebuild_tag_panels, n))
+    return checks
+
+
+def format_leak_checks(checks):
+    lines = []
+    for c in checks:
+        if 'skipped' in c:
+            lines.append(f"  {c['name']}: 跳过（{c['skipped']}）")
+            continue
+        status = "通过" if c['ok'] else "未通过"
+        lines.append(
+            f"  {c['name']} ×{c['n']}: {status}  Python 内存 {format_bytes(c['python_growth'])}，"
+            f"控件 {c['widget_growth']:+d}，常驻内存 {format_bytes(c['rss_growth'])}"
+        )
+    return lines
+
+
+def build_report(window, snapshots=None, leak_checks=None):
+    lines = [f"内存诊断报告 {time.strftime('%Y-%m-%d %H:%M:%S')}"]
+    traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+    lines.append(f"进程常驻内存: {format_bytes(process_rss())}")
+    lines.append(f"tracemalloc 跟踪的 Python 内存: {format_bytes(traced) if traced is not None else '未开启'}")
+    lines.append("")
+    lines.append("各子系统估算（含引用的容器与字符串，共享对象只计一次）:")
+    for name, (size, complete, count) in subsystem_sizes(window).items():
+        mark = "" if complete else " 以上"
+        lines.append(f"  {name:<20} {format_bytes(size):>10}{mark}  ({count} 项)")
+    lines.append("")
+    counts = widget_counts()
+    lines.append(f"控件总数: {sum(counts.values())}")
+    for cls, count in counts.most_common(12):
+        lines.append(f"  {cls:<24} {count}")
+    lines.append(f"  列表项 (QListWidgetItem): {window.list_widget.count()}")
+    if snapshots is not None and snapshots.snapshots:
+        lines.append("")
+        lines.extend(snapshots.diff() or [f"已记录 {len(snapshots.snapshots)} 个快照，再记录一个后可对比"])
+    if leak_checks:
+        lines.append("")
+        lines.append("泄漏检查:")
+        lines.extend(format_leak_checks(leak_checks))
+    return "\n".join(lines)
+
+
+def save_report(text, path=None):
+    if path is None:
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        path = os.path.join(REPORT_DIR, time.strftime("memory-%Y%m%d-%H%M%S.txt"))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text + "\n")
+    return path
+
+
+def wait_for_folder(window, folder, timeout_ms=SCAN_WAIT_MS):
+    # 文件夹的检测与扫描都在后台进行：等到该文件夹扫描结束（或检测为离线）后，列表里才有视频
+    from PyQt5.QtCore import QEventLoop, QTimer
+    loop = QEventLoop()
+
+    def on_scan_done(root, *args):
+        if root == folder:
+            loop.quit()
+
+    def on_probed(root, ok):
+        if root == folder and not ok:
+            loop.quit()
+
+    scheduler, health = window.scan_scheduler, window.folder_health
+    scheduler.finished.connect(on_scan_done)
+    scheduler.failed.connect(on_scan_done)
+    health.probed.connect(on_probed)
+    timer = QTimer()
+    timer.setSingleShot(True)
+    timer.timeout.connect(loop.quit)
+    timer.start(timeout_ms)
+    loop.exec_()
+    timed_out = not timer.isActive()
+    timer.stop()
+    scheduler.finished.disconnect(on_scan_done)
+    scheduler.failed.disconnect(on_scan_done)
+    health.probed.disconnect(on_probed)
+    if timed_out:
+        log.warning("等待文件夹 %s 扫描超时", folder)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="生成内存诊断报告")
+    parser.add_argument("--folder", help="先打开这个已注册的文件夹（用于播放器泄漏检查）")
+    parser.add_argument("-n", type=int, default=20, help="泄漏检查的循环次数，0 表示不检查")
+    parser.add_argument("-o", "--output", help="报告文件路径，默认写入 Save/Logs/")
+    args = parser.parse_args(argv)
+
+    from PyQt5.QtWidgets import QApplication
+    from log_utils import setup_logging
+    from folder_video_manager import FolderVideoManager
+    setup_logging()
+    tracemalloc.start(TRACE_FRAMES)
+    app = QApplication(sys.argv[:1])
+    window = FolderVideoManager()
+    if args.folder:
+        folder = os.path.normpath(args.folder)
+        window.show_video_list(folder)
+        wait_for_folder(window, folder)
+    app.processEvents()
+    checks = standard_leak_checks(window, args.n) if args.n > 0 else None
+    text = build_report(window, leak_checks=checks)
+    print(text)
+    print(f"\n已保存到 {save_report(text, args.output)}")
+    window.close()
+    return 0 if all(c.get('ok', True) for c in checks or ()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+# offline_queue.py - 文件夹离线期间需要访问实际文件的操作，排队到重新上线后执行
+import os
+import json
+import time
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+PENDING_OPS_FILE = os.path.join(SAVE_DIR, "PendingOps.json")
+
+
+class PendingOperationQueue:
+    def __init__(self):
+        self.ops = []
+        self.load()
+
+    def load(self):
+        try:
+            if os.path.exists(PENDING_OPS_FILE):
+                with open(PENDING_OPS_FILE, 'r', encoding='utf-8') as f:
+                    self.ops = json.load(f).get("ops", [])
+        except Exception as e:
+            log.error("读取 %s 出错: %s", PENDING_OPS_FILE, e)
+
+    def save(self):
+        try:
+            write_json_atomic(PENDING_OPS_FILE, {"ops": self.ops}, indent=4)
+        except Exception as e:
+            log.error("保存 %s 出错: %s", PENDING_OPS_FILE, e)
+
+    def enqueue(self, root, op, **args):
+        self.ops.append({'root': root, 'op': op, 'args': args, 'queued_at': time.time()})
+        self.save()
+
+    def pending(self, root):
+        return [op for op in self.ops if op['root'] == root]
+
+    def take(self, root):
+        taken = self.pending(root)
+        if taken:
+            self.ops = [op for op in self.ops if op['root'] != root]
+            self.save()
+        return taken
+
+    def discard_root(self, root):
+        self.take(root)
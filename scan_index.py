@@ -0,0 +1,505 @@
+# scan_index.py - 持久化的文件夹扫描索引（按目录 mtime 增量核对，离线时作为快照浏览）
+#
+# 每个已注册文件夹对应 Save/ScanIndex/<hash>.json：
+#   {"root": 注册路径, "scan_root": 解析后的真实路径, "scanned_at": 时间戳,
+#    "rules": 扫描规则指纹,
+#    "dirs": {相对目录: {"mtime": ns, "subdirs": [...], "files": {文件名: [size, mtime_ns]}}}}
+# 目录的 mtime 在其直接子项增删/改名时才会变化，未变化的目录直接复用上次的文件与子目录列表。
+# subdirs / files 是按扫描规则（scan_rules.py）剪枝之后的结果，规则变化后所有目录重新列出一次。
+# 规则变化后、完整扫描之前在树状浏览中单独重新列出的目录记在 "relisted": {"rules": 新指纹, "dirs": [...]}。
+import os
+import json
+import time
+import hashlib
+from bisect import bisect_left
+from label_store import write_json_atomic
+from sort_keys import ListingTable
+from scan_rules import ScanRules, load_scan_rules, save_scan_rules
+from log_utils import get_logger
+
+try:
+    from ui_components import VIDEO_EXTENSIONS
+except ImportError:
+    VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv', '.webm', '.m4v'}
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+SCAN_INDEX_DIR = os.path.join(SAVE_DIR, "ScanIndex")
+os.makedirs(SCAN_INDEX_DIR, exist_ok=True)
+PROGRESS_EVERY = 64
+
+
+class ScanCancelled(Exception):
+    def __init__(self, root, partial=None):
+        super().__init__(root)
+        # 取消前已列出的目录，作为下一次 begin_walk(seed=...) 的种子，重跑时不必从头列出
+        self.partial = partial
+
+
+class ScanIndex:
+    def __init__(self, root):
+        self.root = root
+        self.scan_root = None
+        self.scanned_at = 0
+        self.dirs = {}
+        self.rules = ScanRules()
+        self.rules_key = None
+        # 规则变化后已按新规则单独列出的目录，完整扫描之后清空
+        self.relisted_key = None
+        self.relisted = set()
+        self.file = os.path.join(
+            SCAN_INDEX_DIR, hashlib.sha1(root.encode('utf-8')).hexdigest()[:16] + ".json"
+        )
+        self.loaded = False
+        self.dirty = False
+        self._table = None
+        self._subtree = None
+        # 界面线程每修改一个目录条目就递增；_touched 记录各目录最近一次修改时的代数，
+        # apply_walk 据此保留遍历期间界面线程做过的修改
+        self.generation = 0
+        self._touched = {}
+        # on_delta(index, added, removed, changed)：扫描发现文件增删/变化时调用
+        self.on_delta = None
+
+    def load(self):
+        self.loaded = True
+        self._table = None
+        self._subtree = None
+        try:
+            if os.path.exists(self.file):
+                with open(self.file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.scan_root = data.get('scan_root')
+                self.scanned_at = data.get('scanned_at', 0)
+                self.rules_key = data.get('rules')
+                self.dirs = data.get('dirs', {})
+                relisted = data.get('relisted') or {}
+                self.relisted_key = relisted.get('rules')
+                self.relisted = set(relisted.get('dirs', []))
+        except Exception as e:
+            log.error("读取 %s 出错: %s", self.file, e)
+
+    def save(self):
+        data = {
+            'root': self.root,
+            'scan_root': self.scan_root,
+            'scanned_at': self.scanned_at,
+            'rules': self.rules_key,
+            'dirs': self.dirs,
+        }
+        if self.relisted_key is not None:
+            data['relisted'] = {'rules': self.relisted_key, 'dirs': sorted(self.relisted)}
+        try:
+            write_json_atomic(self.file, data)
+            self.dirty = False
+        except Exception as e:
+            log.error("保存 %s 出错: %s", self.file, e)
+
+    def has_snapshot(self):
+        return bool(self.dirs)
+
+    def full_path(self, rel_dir, name):
+        return self._join(self.scan_root, rel_dir, name)
+
+    @staticmethod
+    def _join(scan_root, rel_dir, name):
+        return os.path.join(scan_root, rel_dir, name) if rel_dir else os.path.join(scan_root, name)
+
+    def videos(self):
+        result = []
+        for rel_dir, entry in self.dirs.items():
+            for name in entry['files']:
+                result.append(self.full_path(rel_dir, name))
+        return result
+
+    def table(self):
+        # 排序键按条目预计算一次，扫描结果有变化时才重建
+        if self._table is None:
+            entries = []
+            for rel_dir, entry in self.dirs.items():
+                for name, (size, mtime) in entry['files'].items():
+                    entries.append((self.full_path(rel_dir, name), size, mtime))
+            self._table = ListingTable(entries)
+        return self._table
+
+    def stat_of(self, path):
+        # 返回缓存的 (size, mtime_ns)，不访问磁盘
+        rel_dir, name = os.path.split(os.path.relpath(path, self.scan_root))
+        entry = self.dirs.get(rel_dir)
+        if entry is None:
+            return None
+        return entry['files'].get(name)
+
+    # === 程序内移动/重命名：直接改写条目，目录 mtime 保持不变，下次扫描重新列出时不会报告增删 ===
+    # 条目只整体替换、不原地修改：工作线程中的遍历持有的是开始时的浅副本
+    def _locate(self, path):
+        if self.scan_root is None:
+            return None, None, None
+        rel = os.path.relpath(path, self.scan_root)
+        if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+            return None, None, None
+        rel_dir, name = os.path.split(rel)
+        return rel_dir, self.dirs.get(rel_dir), name
+
+    def pop_file(self, path):
+        rel_dir, entry, name = self._locate(path)
+        if entry is None or name not in entry['files']:
+            return None
+        entry = self._copy_entry(entry)
+        stat = entry['files'].pop(name)
+        self.dirs[rel_dir] = entry
+        self._moved(rel_dir)
+        return stat
+
+    def put_file(self, path, stat):
+        # 目标目录还没有列出过时不登记，留给下次扫描
+        rel_dir, entry, name = self._locate(path)
+        if entry is None:
+            return False
+        entry = self._copy_entry(entry)
+        entry['files'][name] = list(stat)
+        self.dirs[rel_dir] = entry
+        self._moved(rel_dir)
+        return True
+
+    def _moved(self, rel_dir):
+        self._touch(rel_dir)
+        self._table = None
+        self._subtree = None
+        self.dirty = True
+
+    def _touch(self, rel_dir):
+        self.generation += 1
+        self._touched[rel_dir] = self.generation
+
+    @staticmethod
+    def _copy_entry(entry):
+        return {'mtime': entry['mtime'], 'subdirs': list(entry['subdirs']), 'files': dict(entry['files'])}
+
+    def dir_mtimes(self):
+        return {rel_dir: entry['mtime'] for rel_dir, entry in self.dirs.items()}
+
+    # === 增量扫描：只重新列出 mtime 变化的目录 ===
+    def scan(self, cancel=None, progress=None):
+        return self.apply_walk(self.walk(cancel, progress))
+
+    def begin_walk(self, seed=None):
+        # 在界面线程调用：取出 walk 需要的索引状态副本
+        # seed 为上次被取消的遍历留下的 ScanCancelled.partial；其后界面线程改过的目录不再复用
+        if seed is not None:
+            seed = dict(seed, dirs={
+                rel: entry for rel, entry in seed['dirs'].items()
+                if self._touched.get(rel, 0) <= seed['generation']
+            })
+        return {
+            'scan_root': self.scan_root,
+            'rules': self.rules,
+            'rules_key': self.rules_key,
+            'relisted_key': self.relisted_key,
+            'relisted': set(self.relisted),
+            'dirs': dict(self.dirs),
+            'generation': self.generation,
+            'seed': seed,
+        }
+
+    def walk(self, cancel=None, progress=None, snapshot=None):
+        # 只读取磁盘和 begin_walk 取出的副本，不修改索引，可以在工作线程中执行；结果交给 apply_walk
+        # progress(已核对目录数, 已发现视频数) 每 PROGRESS_EVERY 个目录回调一次
+        if snapshot is None:
+            snapshot = self.begin_walk()
+        rules = snapshot['rules']
+        scan_root = os.path.realpath(self.root)
+        old_dirs = snapshot['dirs'] if scan_root == snapshot['scan_root'] else {}
+        key = rules.key()
+        reuse = key == snapshot['rules_key']
+        relisted = snapshot['relisted'] if key == snapshot['relisted_key'] else set()
+        seed = snapshot['seed']
+        seed = seed['dirs'] if seed and seed['scan_root'] == scan_root and seed['rules'] == key else {}
+        new_dirs = {}
+        added, removed, changed = set(), set(), set()
+        # 磁盘访问计数：stat 目录 / 列出目录 / 列举到的目录项 / stat 文件
+        io = {'dir_stats': 0, 'listed': 0, 'entries': 0, 'file_stats': 0}
+        # 按 (设备号, inode) 记录已进入的目录，符号链接或 Windows 目录联接成环时不会重复进入
+        visited = set()
+        files = 0
+        stack = ['']
+        while stack:
+            if cancel is not None and cancel():
+                raise ScanCancelled(self.root, {'scan_root': scan_root, 'rules': key,
+                                                'generation': snapshot['generation'], 'dirs': new_dirs})
+            rel_dir = stack.pop()
+            abs_dir = os.path.join(scan_root, rel_dir) if rel_dir else scan_root
+            try:
+                st = os.stat(abs_dir)
+            except OSError:
+                continue
+            io['dir_stats'] += 1
+            if st.st_ino:
+                node = (st.st_dev, st.st_ino)
+                if node in visited:
+                    log.info("跳过重复进入的目录（链接成环或多处挂载）: %s", abs_dir)
+                    continue
+                visited.add(node)
+            mtime = st.st_mtime_ns
+            cached = old_dirs.get(rel_dir)
+            seeded = seed.get(rel_dir)
+            if seeded is not None and seeded['mtime'] == mtime:
+                # 被抢占的上一次遍历已经列出过，只需与索引比较
+                entry = seeded
+                self._diff_files(rel_dir, cached, entry, added, removed, changed, scan_root)
+            elif (reuse or rel_dir in relisted) and cached is not None and cached['mtime'] == mtime:
+                entry = self._copy_entry(cached)
+            else:
+                entry = self._list_dir(abs_dir, mtime, rel_dir, rules, io)
+                self._diff_files(rel_dir, cached, entry, added, removed, changed, scan_root)
+            new_dirs[rel_dir] = entry
+            files += len(entry['files'])
+            if progress is not None and len(new_dirs) % PROGRESS_EVERY == 0:
+                progress(len(new_dirs), files)
+            for sub in entry['subdirs']:
+                stack.append(os.path.join(rel_dir, sub) if rel_dir else sub)
+        for rel_dir, entry in old_dirs.items():
+            if rel_dir not in new_dirs:
+                removed.update(self._join(scan_root, rel_dir, name) for name in entry['files'])
+        if progress is not None:
+            progress(len(new_dirs), files)
+        return {'scan_root': scan_root, 'rules': key, 'dirs': new_dirs, 'generation': snapshot['generation'],
+                'added': added, 'removed': removed, 'changed': changed, 'io': io}
+
+    def apply_walk(self, result):
+        added, removed, changed = result['added'], result['removed'], result['changed']
+        dirs = result['dirs']
+        # 遍历期间界面线程改过的目录（树状浏览核对、程序内移动）以索引中的条目为准，
+        # 这些改动已经通知过，遍历对这些目录报告的增删不再重复通知
+        stale = {rel for rel, g in self._touched.items() if g > result['generation']}
+        if stale and result['scan_root'] == self.scan_root:
+            for rel in stale:
+                entry = self.dirs.get(rel)
+                if entry is None:
+                    dirs.pop(rel, None)
+                else:
+                    dirs[rel] = entry
+            scan_root = result['scan_root']
+
+            def fresh(paths):
+                return {p for p in paths if os.path.dirname(os.path.relpath(p, scan_root)) not in stale}
+
+            added, removed, changed = fresh(added), fresh(removed), fresh(changed)
+        self._touched.clear()
+        self.scan_root = result['scan_root']
+        self.rules_key = result['rules']
+        self.relisted_key = None
+        self.relisted = set()
+        self.dirs = dirs
+        self.scanned_at = time.time()
+        self.dirty = True
+        self._subtree = None
+        if added or removed or changed:
+            self._table = None
+            self._notify_delta(added, removed, changed)
+        return added, removed, changed
+
+    # === 树状浏览：逐层按需核对目录，子树视频数在索引中增量维护 ===
+    def abs_dir(self, rel_dir):
+        return os.path.join(self.scan_root, rel_dir) if rel_dir else self.scan_root
+
+    def children(self, rel_dir):
+        # (子目录名列表, {文件名: [size, mtime]})；该目录尚未列出过时返回 None
+        entry = self.dirs.get(rel_dir)
+        if entry is None:
+            return None
+        return entry['subdirs'], entry['files']
+
+    def listed_under_rules(self, rel_dir):
+        # 该目录的缓存列表是否按当前规则得到
+        key = self.rules.key()
+        return key == self.rules_key or (key == self.relisted_key and rel_dir in self.relisted)
+
+    def dir_state(self, rel_dir):
+        # 界面线程调用：取出 read_dir 需要比较的缓存状态
+        cached = self.dirs.get(rel_dir)
+        return (cached['mtime'] if cached else None), self.listed_under_rules(rel_dir)
+
+    def read_dir(self, rel_dir, known_mtime, current):
+        # 只访问磁盘、不修改索引，可以在工作线程中执行；结果交给 apply_dir
+        # mtime 未变化且缓存按当前规则列出时返回 None
+        scan_root = self.scan_root or os.path.realpath(self.root)
+        abs_dir = os.path.join(scan_root, rel_dir) if rel_dir else scan_root
+        try:
+            mtime = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            return None
+        if current and known_mtime == mtime:
+            return None
+        return {'scan_root': scan_root, 'rules': self.rules.key(),
+                'entry': self._list_dir(abs_dir, mtime, rel_dir, self.rules)}
+
+    def refresh_dir(self, rel_dir):
+        # 同步版本：只核对这一层目录，mtime 未变化时不做任何列举
+        result = self.read_dir(rel_dir, *self.dir_state(rel_dir))
+        if result is None:
+            return set(), set(), set()
+        return self.apply_dir(rel_dir, result)
+
+    def apply_dir(self, rel_dir, result):
+        added, removed, changed = set(), set(), set()
+        if self.scan_root is None:
+            self.scan_root = result['scan_root']
+        elif self.scan_root != result['scan_root'] or self.rules.key() != result['rules']:
+            # 读取期间索引被重新扫描到别处或规则又变了，结果作废
+            return added, removed, changed
+        entry = result['entry']
+        cached = self.dirs.get(rel_dir)
+        self._diff_files(rel_dir, cached, entry, added, removed, changed)
+        counts = self.subtree_counts()
+        delta = len(entry['files']) - (len(cached['files']) if cached else 0)
+        if cached is not None:
+            for sub in set(cached['subdirs']).difference(entry['subdirs']):
+                sub_rel = os.path.join(rel_dir, sub) if rel_dir else sub
+                delta -= counts.get(sub_rel, 0)
+                removed.update(self._drop_subtree(sub_rel))
+        self.dirs[rel_dir] = entry
+        self._touch(rel_dir)
+        if result['rules'] != self.rules_key:
+            if result['rules'] != self.relisted_key:
+                self.relisted_key = result['rules']
+                self.relisted = set()
+            self.relisted.add(rel_dir)
+        counts.setdefault(rel_dir, 0)
+        node = rel_dir
+        while True:
+            counts[node] = counts.get(node, 0) + delta
+            if not node:
+                break
+            node = os.path.dirname(node)
+        self.dirty = True
+        if added or removed or changed:
+            self._table = None
+            self._notify_delta(added, removed, changed)
+        return added, removed, changed
+
+    def _notify_delta(self, added, removed, changed):
+        if self.on_delta is not None:
+            self.on_delta(self, added, removed, changed)
+
+    def _drop_subtree(self, rel_dir):
+        removed = set()
+        prefix = rel_dir + os.sep
+        for rel in [r for r in self.dirs if r == rel_dir or r.startswith(prefix)]:
+            entry = self.dirs.pop(rel)
+            self.relisted.discard(rel)
+            self._touch(rel)
+            removed.update(self.full_path(rel, name) for name in entry['files'])
+            if self._subtree is not None:
+                self._subtree.pop(rel, None)
+        return removed
+
+    def subtree_counts(self):
+        # 自底向上汇总一次，之后由 refresh_dir 沿祖先链增量修正
+        if self._subtree is None:
+            counts = {rel: len(entry['files']) for rel, entry in self.dirs.items()}
+            for rel in sorted(self.dirs, key=lambda r: r.count(os.sep) + bool(r), reverse=True):
+                if rel:
+                    parent = os.path.dirname(rel)
+                    counts[parent] = counts.get(parent, 0) + counts[rel]
+            self._subtree = counts
+        return self._subtree
+
+    def subtree_count(self, rel_dir):
+        return self.subtree_counts().get(rel_dir, 0)
+
+    def match_count(self, rel_dir, sorted_matches):
+        # sorted_matches 为排好序的命中路径；同一子树的路径在有序表中连续，二分即可计数
+        if not rel_dir:
+            return len(sorted_matches)
+        prefix = self.abs_dir(rel_dir) + os.sep
+        lo = bisect_left(sorted_matches, prefix)
+        hi = bisect_left(sorted_matches, prefix + '\U0010ffff', lo)
+        return hi - lo
+
+    def _list_dir(self, abs_dir, mtime, rel_dir, rules, io=None):
+        # 按规则剪枝：被排除 / 隐藏 / 超出深度的子目录不会出现在 subdirs 中，之后也不会被列出
+        files, subdirs = {}, []
+        prefix = rel_dir.replace(os.sep, '/') + '/' if rel_dir else ''
+        descend = rules.descends_into(rel_dir.count(os.sep) + 1 if rel_dir else 0)
+        follow = rules.follow_symlinks
+        try:
+            with os.scandir(abs_dir) as it:
+                if io is not None:
+                    io['listed'] += 1
+                for e in it:
+                    if io is not None:
+                        io['entries'] += 1
+                    name = e.name
+                    try:
+                        if e.is_dir(follow_symlinks=follow):
+                            if descend and not rules.hidden(e) and not rules.excluded(prefix + name, name, True):
+                                subdirs.append(name)
+                        elif os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS:
+                            if rules.hidden(e) or rules.excluded(prefix + name, name, False):
+                                continue
+                            st = e.stat()
+                            if io is not None:
+                                io['file_stats'] += 1
+                            if st.st_size >= rules.min_size:
+                                files[name] = [st.st_size, st.st_mtime_ns]
+                    except OSError:
+                        continue
+        except OSError as e:
+            log.warning("无法读取目录 %s: %s", abs_dir, e)
+        return {'mtime': mtime, 'subdirs': sorted(subdirs), 'files': files}
+
+    def _diff_files(self, rel_dir, old_entry, new_entry, added, removed, changed, scan_root=None):
+        scan_root = scan_root or self.scan_root
+        old_files = old_entry['files'] if old_entry else {}
+        for name, stat in new_entry['files'].items():
+            old = old_files.get(name)
+            if old is None:
+                added.add(self._join(scan_root, rel_dir, name))
+            elif old != stat:
+                changed.add(self._join(scan_root, rel_dir, name))
+        for name in old_files:
+            if name not in new_entry['files']:
+                removed.add(self._join(scan_root, rel_dir, name))
+
+
+class ScanIndexRegistry:
+    def __init__(self, on_delta=None):
+        self._indexes = {}
+        self.on_delta = on_delta
+        self.rules = load_scan_rules()
+
+    def get(self, root):
+        index = self._indexes.get(root)
+        if index is None:
+            index = ScanIndex(root)
+            index.load()
+            index.rules = self.rules_for(root)
+            index.on_delta = self.on_delta
+            self._indexes[root] = index
+        return index
+
+    def loaded(self):
+        return list(self._indexes.values())
+
+    def rules_for(self, root):
+        return self.rules.get(root) or ScanRules()
+
+    def set_rules(self, root, rules):
+        # 新规则在下一次扫描时生效
+        self.rules[root] = rules
+        save_scan_rules(self.rules)
+        index = self._indexes.get(root)
+        if index is not None:
+            index.rules = rules
+
+    def forget(self, root):
+        if self.rules.pop(root, None) is not None:
+            save_scan_rules(self.rules)
+        index = self._indexes.pop(root, None) or ScanIndex(root)
+        try:
+            if os.path.exists(index.file):
+                os.remove(index.file)
+        except OSError as e:
+            log.error("删除 %s 出错: %s", index.file, e)
@@ -0,0 +1,183 @@
+# scan_rules.py - 每个文件夹的扫描规则：gitignore 风格的排除模式、最大深度、最小文件大小、跳过隐藏/系统目录
+#
+# Save/ScanRules.json: {"rules": {注册路径: {"exclude": [...], "max_depth": n 或 null,
+#                                          "min_size_mb": x, "skip_hidden": bool, "follow_symlinks": bool}}}
+# 没有单独设置的文件夹使用默认规则。排除模式按 .gitignore 的写法：
+#   name        任意层级名为 name 的文件或目录        dir/    只匹配目录
+#   /a/b        相对文件夹根目录锚定                  *  ?  [..]  不跨越 '/'，**  可跨越多级目录
+#   !pattern    重新包含（后面的规则优先；已被排除的目录不会再进入，其下的内容无法重新包含）
+# 被排除的目录在进入之前就被剪掉，不会列出其中的任何内容。
+import os
+import re
+import json
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+SCAN_RULES_FILE = os.path.join(SAVE_DIR, "ScanRules.json")
+
+MB = 1024 * 1024
+DEFAULT_EXCLUDES = [
+    ".git/",
+    "node_modules/",
+    "@eaDir/",
+    ".@__thumb/",
+    "#recycle/",
+    "$RECYCLE.BIN/",
+    "System Volume Information/",
+]
+# Windows 下与 git 的 core.ignorecase 一致，不区分大小写
+_FLAGS = re.IGNORECASE if os.name == 'nt' else 0
+_HIDDEN_ATTRIBUTES = 0x2 | 0x4  # FILE_ATTRIBUTE_HIDDEN | FILE_ATTRIBUTE_SYSTEM
+
+
+class ScanRuleError(ValueError):
+    pass
+
+
+def _translate(pattern):
+    # gitignore 模式 -> 正则；返回 (正则, 是否匹配相对路径而不只是名字)
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            if pattern.startswith('**', i):
+                i += 2
+                if i < n and pattern[i] == '/':
+                    out.append('(?:.*/)?')
+                    i += 1
+                else:
+                    out.append('.*')
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = pattern.find(']', i + 2)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                out.append('[' + body + ']')
+                i = j + 1
+                continue
+        elif c == '\\' and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return '(?:' + ''.join(out) + r')\Z', anchored
+
+
+class ScanRules:
+    def __init__(self, exclude=None, max_depth=None, min_size_mb=0, skip_hidden=True, follow_symlinks=False):
+        self.exclude = list(DEFAULT_EXCLUDES if exclude is None else exclude)
+        self.max_depth = max_depth if max_depth is None else int(max_depth)
+        self.min_size_mb = float(min_size_mb or 0)
+        self.min_size = int(self.min_size_mb * MB)
+        self.skip_hidden = bool(skip_hidden)
+        self.follow_symlinks = bool(follow_symlinks)
+        # [(正则, 是否重新包含, 只匹配目录, 匹配相对路径)]，从后往前找第一条命中的
+        self._patterns = []
+        for line in self.exclude:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            regex, anchored = _translate(line)
+            try:
+                compiled = re.compile(regex, _FLAGS)
+            except re.error as e:
+                raise ScanRuleError(f"排除模式 {line!r} 无效: {e}") from e
+            self._patterns.append((compiled.match, negate, dir_only, anchored))
+        self._patterns.reverse()
+        self._key = json.dumps(self.to_dict(), sort_keys=True)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            exclude=data.get('exclude'),
+            max_depth=data.get('max_depth'),
+            min_size_mb=data.get('min_size_mb', 0),
+            skip_hidden=data.get('skip_hidden', True),
+            follow_symlinks=data.get('follow_symlinks', False),
+        )
+
+    def to_dict(self):
+        return {
+            'exclude': self.exclude,
+            'max_depth': self.max_depth,
+            'min_size_mb': self.min_size_mb,
+            'skip_hidden': self.skip_hidden,
+            'follow_symlinks': self.follow_symlinks,
+        }
+
+    def key(self):
+        # 规则的指纹，记录在扫描索引中；规则变化后不能再按 mtime 复用上次列出的目录
+        return self._key
+
+    def excluded(self, rel_path, name, is_dir):
+        # rel_path 为相对文件夹根目录、以 '/' 分隔的路径
+        for match, negate, dir_only, anchored in self._patterns:
+            if dir_only and not is_dir:
+                continue
+            if match(rel_path if anchored else name):
+                return not negate
+        return False
+
+    def descends_into(self, depth):
+        # depth 为当前目录的层级（根目录为 0）：是否还要列出其子目录
+        return self.max_depth is None or depth < self.max_depth
+
+    def hidden(self, entry):
+        if not self.skip_hidden:
+            return False
+        if entry.name.startswith('.'):
+            return True
+        if os.name == 'nt':
+            try:
+                # Windows 上 DirEntry.stat() 直接使用目录列举时得到的属性，不会额外访问磁盘
+                return bool(entry.stat(follow_symlinks=False).st_file_attributes & _HIDDEN_ATTRIBUTES)
+            except (OSError, AttributeError):
+                return False
+        return False
+
+
+def load_scan_rules():
+    # 注册路径 -> ScanRules；无效的条目记录日志后回退为默认规则
+    result = {}
+    try:
+        if os.path.exists(SCAN_RULES_FILE):
+            with open(SCAN_RULES_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f).get('rules', {})
+            for root, entry in data.items():
+                try:
+                    result[root] = ScanRules.from_dict(entry)
+                except (ScanRuleError, TypeError, ValueError) as e:
+                    log.error("文件夹 %s 的扫描规则无效，使用默认规则: %s", root, e)
+    except Exception as e:
+        log.error("读取 %s 出错: %s", SCAN_RULES_FILE, e)
+    return result
+
+
+def save_scan_rules(rules_by_root):
+    data = {root: rules.to_dict() for root, rules in rules_by_root.items()}
+    try:
+        write_json_atomic(SCAN_RULES_FILE, {"rules": data}, indent=4)
+    except Exception as e:
+        log.error("保存 %s 出错: %s", SCAN_RULES_FILE, e)
@@ -0,0 +1,74 @@
+# scan_rules_dialog.py - 单个文件夹的扫描规则设置对话框
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QFormLayout, QDialogButtonBox, QLabel, QPlainTextEdit, QSpinBox,
+    QDoubleSpinBox, QCheckBox, QPushButton, QMessageBox
+)
+from PyQt5.QtGui import QFont
+from scan_rules import ScanRules, ScanRuleError, DEFAULT_EXCLUDES
+
+
+class ScanRulesDialog(QDialog):
+    def __init__(self, folder, rules, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("扫描规则")
+        self.resize(520, 480)
+        self.result_rules = None
+
+        layout = QVBoxLayout(self)
+        title = QLabel(folder)
+        title.setFont(QFont("SimHei", 10, QFont.Bold))
+        title.setWordWrap(True)
+        layout.addWidget(title)
+        hint = QLabel("排除模式每行一条，写法同 .gitignore：name 匹配任意层级，dir/ 只匹配目录，"
+                      "/a/b 相对文件夹根目录，** 跨越多级目录，! 开头表示重新包含。"
+                      "被排除的目录不会被进入。")
+        hint.setWordWrap(True)
+        hint.setFont(QFont("SimHei", 9))
+        layout.addWidget(hint)
+
+        self.exclude_edit = QPlainTextEdit("\n".join(rules.exclude))
+        self.exclude_edit.setFont(QFont("Consolas", 10))
+        layout.addWidget(self.exclude_edit, stretch=1)
+        reset_btn = QPushButton("恢复默认排除模式")
+        reset_btn.clicked.connect(lambda: self.exclude_edit.setPlainText("\n".join(DEFAULT_EXCLUDES)))
+        layout.addWidget(reset_btn)
+
+        form = QFormLayout()
+        self.depth_spin = QSpinBox()
+        self.depth_spin.setRange(0, 999)
+        self.depth_spin.setSpecialValueText("不限")
+        self.depth_spin.setValue(rules.max_depth + 1 if rules.max_depth is not None else 0)
+        form.addRow("最多进入的目录层数（含根目录）", self.depth_spin)
+        self.size_spin = QDoubleSpinBox()
+        self.size_spin.setRange(0, 1024 * 1024)
+        self.size_spin.setDecimals(1)
+        self.size_spin.setSuffix(" MB")
+        self.size_spin.setValue(rules.min_size_mb)
+        form.addRow("忽略小于此大小的视频", self.size_spin)
+        self.hidden_check = QCheckBox("跳过隐藏目录和系统目录")
+        self.hidden_check.setChecked(rules.skip_hidden)
+        form.addRow(self.hidden_check)
+        self.symlink_check = QCheckBox("进入符号链接指向的目录（链接成环时自动跳过）")
+        self.symlink_check.setChecked(rules.follow_symlinks)
+        form.addRow(self.symlink_check)
+        layout.addLayout(form)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def accept(self):
+        depth = self.depth_spin.value()
+        try:
+            self.result_rules = ScanRules(
+                exclude=[line.strip() for line in self.exclude_edit.toPlainText().splitlines() if line.strip()],
+                max_depth=depth - 1 if depth else None,
+                min_size_mb=self.size_spin.value(),
+                skip_hidden=self.hidden_check.isChecked(),
+                follow_symlinks=self.symlink_check.isChecked(),
+            )
+        except ScanRuleError as e:
+            QMessageBox.warning(self, "排除模式无效", str(e))
+            return
+        super().accept()
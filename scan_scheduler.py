@@ -0,0 +1,209 @@
+# scan_scheduler.py - 多文件夹扫描调度：按磁盘分队列限制并发，正在浏览的文件夹优先，后台深度扫描可被抢占
+#
+# 同一块磁盘（st_dev 相同）上的文件夹排在同一个队列里，默认同时只扫描一个，避免机械硬盘来回寻道；
+# 不同磁盘之间并行。目录遍历（ScanIndex.walk）在工作线程中执行，结果回到界面线程再写入索引。
+# 设备号由调用方提供（文件夹检测线程顺带取得），调度器本身不在界面线程访问磁盘。
+import os
+import heapq
+import itertools
+import threading
+from PyQt5.QtCore import QObject, pyqtSignal
+from scan_index import ScanCancelled
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+PRIORITY_VIEWED = 0
+PRIORITY_BACKGROUND = 1
+
+# 每块磁盘同时进行的扫描数，以及全局上限
+DEVICE_CONCURRENCY = 1
+MAX_CONCURRENT_SCANS = 4
+
+STATE_QUEUED = "queued"
+STATE_SCANNING = "scanning"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+STATE_TEXT = {
+    STATE_QUEUED: "等待扫描",
+    STATE_SCANNING: "扫描中",
+    STATE_DONE: "已扫描",
+    STATE_FAILED: "扫描失败",
+}
+
+
+class _ScanJob:
+    __slots__ = ('root', 'device', 'priority', 'token', 'cancel', 'preempted', 'partial')
+
+    def __init__(self, root, device, priority, token):
+        self.root = root
+        self.device = device
+        self.priority = priority
+        self.token = token
+        self.cancel = threading.Event()
+        self.preempted = False
+        # 被取消时工作线程写入已列出的部分结果（ScanCancelled.partial）
+        self.partial = None
+
+
+class ScanScheduler(QObject):
+    # progress(root, 已核对目录数, 已发现视频数)
+    progress = pyqtSignal(str, int, int)
+    # finished(root, added, removed, changed)：索引已在界面线程更新并保存
+    finished = pyqtSignal(str, object, object, object)
+    failed = pyqtSignal(str, str)
+    _walk_progress = pyqtSignal(str, int, int, int)
+    _walk_finished = pyqtSignal(str, int, object, str)
+
+    def __init__(self, registry, device_of=None, device_concurrency=DEVICE_CONCURRENCY,
+                 max_concurrent=MAX_CONCURRENT_SCANS, parent=None):
+        super().__init__(parent)
+        self.registry = registry
+        # device_of(root) -> 设备号，未知时返回 None
+        self._device_of = device_of
+        self.device_concurrency = device_concurrency
+        self.max_concurrent = max_concurrent
+        # root -> (状态, 已核对目录数, 已发现视频数)
+        self.states = {}
+        # root -> 被抢占的遍历留下的部分结果，下一次遍历以此为种子
+        self._partial = {}
+        self._queues = {}
+        self._queued = {}
+        self._running = {}
+        self._seq = itertools.count()
+        self._tokens = itertools.count(1)
+        self._walk_progress.connect(self._on_walk_progress)
+        self._walk_finished.connect(self._on_walk_finished)
+
+    def device_of(self, root):
+        # 还不知道设备号（尚未检测或已离线）时单独成队；不缓存，下次请求时重新取
+        device = self._device_of(root) if self._device_of is not None else None
+        return root if device is None else device
+
+    # === 提交与取消 ===
+    def request(self, root, priority=PRIORITY_BACKGROUND):
+        running = self._running.get(root)
+        if running is not None:
+            running.priority = min(running.priority, priority)
+            if running.cancel.is_set():
+                # 已取消但线程尚未退出：结束后重新排队
+                running.preempted = True
+            return
+        job = self._queued.get(root)
+        if job is not None and priority >= job.priority:
+            return
+        job = _ScanJob(root, self.device_of(root), priority, next(self._tokens))
+        self._queued[root] = job
+        heapq.heappush(self._queues.setdefault(job.device, []), (priority, next(self._seq), job))
+        self._set_state(root, STATE_QUEUED, 0, 0)
+        self._dispatch()
+
+    def prioritize(self, root):
+        # 用户正在浏览的文件夹：排到最前面，必要时抢占同一磁盘上的后台扫描
+        self.request(root, PRIORITY_VIEWED)
+        job = self._queued.get(root)
+        if job is None:
+            return
+        busy = [j for j in self._running.values() if j.device == job.device]
+        if len(busy) >= self.device_concurrency:
+            for victim in busy:
+                if victim.priority > job.priority and not victim.preempted:
+                    log.debug("抢占后台扫描 %s，优先扫描 %s", victim.root, root)
+                    victim.preempted = True
+                    victim.cancel.set()
+                    break
+
+    def cancel(self, root):
+        self._queued.pop(root, None)
+        self._partial.pop(root, None)
+        running = self._running.get(root)
+        if running is not None:
+            running.cancel.set()
+        self.states.pop(root, None)
+
+    def shutdown(self):
+        for root in list(self._queued) + list(self._running):
+            self.cancel(root)
+
+    def is_busy(self, root):
+        return root in self._queued or root in self._running
+
+    def state_of(self, root):
+        return self.states.get(root)
+
+    # === 调度 ===
+    def _dispatch(self):
+        for device, queue in self._queues.items():
+            while queue and len(self._running) < self.max_concurrent:
+                if sum(1 for j in self._running.values() if j.device == device) >= self.device_concurrency:
+                    break
+                _, _, job = heapq.heappop(queue)
+                if self._queued.get(job.root) is not job:
+                    continue
+                del self._queued[job.root]
+                self._start(job)
+
+    def _start(self, job):
+        self._running[job.root] = job
+        self._set_state(job.root, STATE_SCANNING, 0, 0)
+        index = self.registry.get(job.root)
+        snapshot = index.begin_walk(self._partial.pop(job.root, None))
+        threading.Thread(
+            target=self._run, args=(index, job, snapshot), daemon=True, name=f"scan-{os.path.basename(job.root)}"
+        ).start()
+
+    def _run(self, index, job, snapshot):
+        try:
+            result = index.walk(
+                cancel=job.cancel.is_set,
+                progress=lambda dirs, files: self._walk_progress.emit(job.root, job.token, dirs, files),
+                snapshot=snapshot,
+            )
+        except ScanCancelled as e:
+            job.partial = e.partial
+            self._walk_finished.emit(job.root, job.token, None, "")
+        except Exception as e:
+            self._walk_finished.emit(job.root, job.token, None, str(e) or type(e).__name__)
+        else:
+            self._walk_finished.emit(job.root, job.token, result, "")
+
+    def _on_walk_progress(self, root, token, dirs, files):
+        job = self._running.get(root)
+        if job is not None and job.token == token:
+            self._set_state(root, STATE_SCANNING, dirs, files)
+
+    def _on_walk_finished(self, root, token, result, error):
+        job = self._running.get(root)
+        if job is None or job.token != token:
+            return
+        del self._running[root]
+        if result is not None:
+            index = self.registry.get(root)
+            try:
+                delta = index.apply_walk(result)
+                index.save()
+            except Exception as e:
+                log.error("写入扫描结果出错 %s: %s", root, e)
+                self._set_state(root, STATE_FAILED, 0, 0)
+                self.failed.emit(root, str(e))
+            else:
+                dirs, files = len(result['dirs']), sum(len(e['files']) for e in result['dirs'].values())
+                self._set_state(root, STATE_DONE, dirs, files)
+                self.finished.emit(root, *delta)
+        elif job.preempted:
+            # 被抢占的扫描重新排队；已列出的目录作为种子，重跑时 mtime 未变化的直接复用
+            if job.partial is not None:
+                self._partial[root] = job.partial
+            self.request(root, job.priority)
+        elif error:
+            log.warning("扫描 %s 失败: %s", root, error)
+            self._set_state(root, STATE_FAILED, 0, 0)
+            self.failed.emit(root, error)
+        else:
+            self.states.pop(root, None)
+        self._dispatch()
+
+    def _set_state(self, root, state, dirs, files):
+        self.states[root] = (state, dirs, files)
+        self.progress.emit(root, dirs, files)
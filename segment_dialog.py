@@ -0,0 +1,122 @@
+# segment_dialog.py - 片段查找与管理：按标签和时长在全库片段索引中查询，双击从片段开头播放
+import os
+import time
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QDoubleSpinBox, QCheckBox, QPushButton,
+    QTreeWidget, QTreeWidgetItem, QMessageBox
+)
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QFont
+from segments import format_time
+
+ALL_TAGS = "（全部标签）"
+# 结果只画前这么多行
+RESULT_ROWS = 5000
+
+
+class SegmentSearchDialog(QDialog):
+    # expand_tag(tag) 返回该标签及其全部子标签；play_callback(path, start_ms)；changed_callback() 在删除片段后调用
+    def __init__(self, store, expand_tag, play_callback, changed_callback, current_path=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("片段")
+        self.resize(860, 560)
+        self.store = store
+        self.expand_tag = expand_tag
+        self.play_callback = play_callback
+        self.changed_callback = changed_callback
+        self.current_path = current_path
+
+        layout = QVBoxLayout(self)
+        row = QHBoxLayout()
+        row.addWidget(QLabel("标签"))
+        self.tag_combo = QComboBox()
+        self.tag_combo.addItem(ALL_TAGS)
+        self.tag_combo.addItems(sorted(store.tags()))
+        row.addWidget(self.tag_combo, stretch=1)
+        row.addWidget(QLabel("时长至少"))
+        self.min_spin = QDoubleSpinBox()
+        self.min_spin.setRange(0, 24 * 3600)
+        self.min_spin.setDecimals(0)
+        self.min_spin.setSuffix(" 秒")
+        row.addWidget(self.min_spin)
+        row.addWidget(QLabel("至多"))
+        self.max_spin = QDoubleSpinBox()
+        self.max_spin.setRange(0, 24 * 3600)
+        self.max_spin.setDecimals(0)
+        self.max_spin.setSpecialValueText("不限")
+        self.max_spin.setSuffix(" 秒")
+        row.addWidget(self.max_spin)
+        self.current_check = QCheckBox("只看正在播放的视频")
+        self.current_check.setEnabled(current_path is not None)
+        self.current_check.setChecked(current_path is not None)
+        row.addWidget(self.current_check)
+        layout.addLayout(row)
+
+        self.status_label = QLabel()
+        self.status_label.setFont(QFont("SimHei", 10))
+        layout.addWidget(self.status_label)
+        self.results = QTreeWidget()
+        self.results.setHeaderLabels(["视频", "标签", "开始", "结束", "时长"])
+        self.results.setRootIsDecorated(False)
+        self.results.setSelectionMode(QTreeWidget.ExtendedSelection)
+        self.results.setColumnWidth(0, 380)
+        self.results.itemDoubleClicked.connect(self.play_item)
+        layout.addWidget(self.results, stretch=1)
+
+        buttons = QHBoxLayout()
+        hint = QLabel("播放时：I / O 标记入点和出点并添加片段，[ / ] 跳到上一个/下一个片段，S 跳过当前片段")
+        hint.setFont(QFont("SimHei", 9))
+        buttons.addWidget(hint, stretch=1)
+        delete_btn = QPushButton("删除选中片段")
+        delete_btn.clicked.connect(self.delete_selected)
+        buttons.addWidget(delete_btn)
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.accept)
+        buttons.addWidget(close_btn)
+        layout.addLayout(buttons)
+
+        self.tag_combo.currentIndexChanged.connect(self.search)
+        self.min_spin.valueChanged.connect(self.search)
+        self.max_spin.valueChanged.connect(self.search)
+        self.current_check.toggled.connect(self.search)
+        self.search()
+
+    def search(self, *args):
+        tag = self.tag_combo.currentText()
+        tags = self.store.tags() if tag == ALL_TAGS else self.expand_tag(tag)
+        max_s = self.max_spin.value()
+        path = self.current_path if self.current_check.isChecked() else None
+        started = time.perf_counter()
+        rows = self.store.query(tags, int(self.min_spin.value() * 1000), int(max_s * 1000) if max_s else None, path)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.results.clear()
+        items = []
+        for p, start, end, seg_tag in rows[:RESULT_ROWS]:
+            item = QTreeWidgetItem([
+                os.path.basename(p), seg_tag, format_time(start), format_time(end), format_time(end - start)
+            ])
+            item.setToolTip(0, p)
+            item.setData(0, Qt.UserRole, (p, start, end, seg_tag))
+            items.append(item)
+        self.results.addTopLevelItems(items)
+        self.status_label.setText(f"共 {len(rows)} 个片段（查询用时 {elapsed:.1f} ms）")
+
+    def play_item(self, item):
+        path, start, _, _ = item.data(0, Qt.UserRole)
+        self.play_callback(path, start)
+
+    def delete_selected(self):
+        selected = [item.data(0, Qt.UserRole) for item in self.results.selectedItems()]
+        if not selected:
+            return
+        reply = QMessageBox.question(
+            self, '确认删除', f"确定要删除选中的 {len(selected)} 个片段吗？",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        for path, start, end, tag in selected:
+            self.store.remove(path, (start, end, tag))
+        self.store.save()
+        self.changed_callback()
+        self.search()
@@ -0,0 +1,240 @@
+# segments.py - 片段标签：给视频中的一段时间打标签（如“片头 0:00-1:30”“打斗 42:10-44:00”）
+#
+# Save/Segments.json: {"segments": {路径: [[start_ms, end_ms, 标签], ...]}}
+# 两级索引都在内存中随增删增量维护：
+#   VideoSegments  一个视频的片段按开始时间排序，另存“前缀最大结束时间”；查询 t 时刻落在哪些片段里时
+#                  二分到最后一个 start <= t，再向前扫描，前缀最大结束时间 <= t 即可停止
+#   标签 -> 按时长排序的 [(时长, 路径, start, end)]；“标签 X 且长于 30 秒”二分定位后直接切片
+import os
+import json
+from bisect import bisect_left, bisect_right, insort
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+SEGMENTS_FILE = os.path.join(SAVE_DIR, "Segments.json")
+# 片段开头这么短的时间内按“上一个片段”，跳到前一个片段而不是当前片段的开头
+PREV_GRACE_MS = 1500
+
+
+class SegmentError(ValueError):
+    pass
+
+
+def parse_time(text):
+    # "90" / "1:30" / "1:02:03" / "1:30.5" -> 毫秒
+    parts = text.strip().split(':')
+    if not parts[0] or len(parts) > 3:
+        raise SegmentError(f"无法识别的时间: {text}")
+    try:
+        seconds = 0.0
+        for part in parts:
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        raise SegmentError(f"无法识别的时间: {text}") from None
+    if seconds < 0:
+        raise SegmentError(f"时间不能为负: {text}")
+    return int(round(seconds * 1000))
+
+
+def format_time(ms):
+    s = max(0, ms) // 1000
+    if s >= 3600:
+        return f"{s // 3600}:{s % 3600 // 60:02d}:{s % 60:02d}"
+    return f"{s // 60}:{s % 60:02d}"
+
+
+class VideoSegments:
+    # 一个视频的片段 [(start_ms, end_ms, tag)]，按 (start, end) 排序
+    def __init__(self, segments=()):
+        self.segments = sorted(segments)
+        self.starts = [s[0] for s in self.segments]
+        self._max_end = []
+        running = -1
+        for start, end, tag in self.segments:
+            running = max(running, end)
+            self._max_end.append(running)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def at(self, t):
+        # 包含 t 的片段（start <= t < end），按开始时间排序
+        hits = []
+        i = bisect_right(self.starts, t) - 1
+        while i >= 0 and self._max_end[i] > t:
+            if self.segments[i][1] > t:
+                hits.append(self.segments[i])
+            i -= 1
+        hits.reverse()
+        return hits
+
+    def next_start(self, t):
+        i = bisect_right(self.starts, t)
+        return self.starts[i] if i < len(self.starts) else None
+
+    def prev_start(self, t):
+        i = bisect_left(self.starts, t - PREV_GRACE_MS) - 1
+        return self.starts[i] if i >= 0 else None
+
+    def skip_end(self, t):
+        # 跳过当前所在的片段：重叠时跳到这些片段中最晚的结束位置
+        hits = self.at(t)
+        return max(end for _, end, _ in hits) if hits else None
+
+    def spans(self, duration_ms):
+        # 进度条上的标记：[(开始比例, 结束比例, 标签)]
+        if duration_ms <= 0:
+            return []
+        return [(min(1.0, s / duration_ms), min(1.0, e / duration_ms), tag) for s, e, tag in self.segments]
+
+
+class SegmentStore:
+    def __init__(self, file=SEGMENTS_FILE):
+        self.file = file
+        self.by_path = {}
+        # 标签 -> [(时长, 路径, start, end)]，按时长排序
+        self.by_tag = {}
+        self._videos = {}
+        self.dirty = False
+
+    def load(self):
+        self.by_path, self.by_tag, self._videos = {}, {}, {}
+        try:
+            if os.path.exists(self.file):
+                with open(self.file, 'r', encoding='utf-8') as f:
+                    data = json.load(f).get('segments', {})
+                for path, segments in data.items():
+                    self.by_path[path] = [tuple(s) for s in segments]
+        except Exception as e:
+            log.error("读取 %s 出错: %s", self.file, e)
+        for path, segments in self.by_path.items():
+            for start, end, tag in segments:
+                self.by_tag.setdefault(tag, []).append((end - start, path, start, end))
+        for entries in self.by_tag.values():
+            entries.sort()
+
+    def save(self):
+        data = {path: [list(s) for s in segments] for path, segments in self.by_path.items() if segments}
+        try:
+            write_json_atomic(self.file, {"segments": data})
+            self.dirty = False
+        except Exception as e:
+            log.error("保存 %s 出错: %s", self.file, e)
+
+    def save_if_dirty(self):
+        if self.dirty:
+            self.save()
+
+    # === 单个视频 ===
+    def for_video(self, path):
+        videos = self._videos.get(path)
+        if videos is None:
+            videos = VideoSegments(self.by_path.get(path, ()))
+            self._videos[path] = videos
+        return videos
+
+    def tags(self):
+        return {tag for tag, entries in self.by_tag.items() if entries}
+
+    def add(self, path, start_ms, end_ms, tag):
+        tag = tag.strip()
+        if not tag:
+            raise SegmentError("片段标签不能为空")
+        if start_ms < 0 or end_ms <= start_ms:
+            raise SegmentError("片段的结束时间必须晚于开始时间")
+        segment = (int(start_ms), int(end_ms), tag)
+        segments = self.by_path.setdefault(path, [])
+        if segment in segments:
+            return False
+        segments.append(segment)
+        insort(self.by_tag.setdefault(tag, []), (segment[1] - segment[0], path, segment[0], segment[1]))
+        self._videos.pop(path, None)
+        self.dirty = True
+        return True
+
+    def remove(self, path, segment):
+        segments = self.by_path.get(path, [])
+        if segment not in segments:
+            return False
+        segments.remove(segment)
+        if not segments:
+            del self.by_path[path]
+        self._unindex(path, segment)
+        self._videos.pop(path, None)
+        self.dirty = True
+        return True
+
+    def _unindex(self, path, segment):
+        start, end, tag = segment
+        entries = self.by_tag.get(tag, [])
+        key = (end - start, path, start, end)
+        i = bisect_left(entries, key)
+        if i < len(entries) and entries[i] == key:
+            del entries[i]
+        if not entries:
+            self.by_tag.pop(tag, None)
+
+    # === 全库查询：只在各标签的时长有序表上二分 ===
+    def query(self, tags, min_ms=0, max_ms=None, path=None):
+        # tags 为要匹配的标签集合（调用方按层级展开）；返回 [(路径, start, end, 标签)]，按时长从长到短
+        rows = []
+        for tag in tags:
+            entries = self.by_tag.get(tag)
+            if not entries:
+                continue
+            lo = bisect_left(entries, (min_ms,))
+            hi = len(entries) if max_ms is None else bisect_right(entries, (max_ms, '\U0010ffff'))
+            for duration, p, start, end in entries[lo:hi]:
+                if path is None or p == path:
+                    rows.append((duration, p, start, end, tag))
+        rows.sort(key=lambda r: (-r[0], r[1], r[2]))
+        return [(p, start, end, tag) for _, p, start, end, tag in rows]
+
+    def all_segments(self, path):
+        return [(path, start, end, tag) for start, end, tag in self.for_video(path).segments]
+
+    # === 标签改名/删除、文件移动之后调用 ===
+    def rename_tag(self, old_tag, new_tag):
+        entries = self.by_tag.pop(old_tag, None)
+        if not entries:
+            return False
+        for _, path, start, end in entries:
+            segments = self.by_path[path]
+            segments.remove((start, end, old_tag))
+            if (start, end, new_tag) not in segments:
+                segments.append((start, end, new_tag))
+                insort(self.by_tag.setdefault(new_tag, []), (end - start, path, start, end))
+            self._videos.pop(path, None)
+        self.dirty = True
+        return True
+
+    def forget_tags(self, tags):
+        changed = False
+        for tag in tags:
+            for _, path, start, end in self.by_tag.pop(tag, ()):
+                segments = self.by_path[path]
+                segments.remove((start, end, tag))
+                if not segments:
+                    del self.by_path[path]
+                self._videos.pop(path, None)
+                changed = True
+        self.dirty = self.dirty or changed
+        return changed
+
+    def rename_paths(self, mapping):
+        changed = False
+        for src, dst in mapping.items():
+            segments = self.by_path.pop(src, None)
+            if segments is None:
+                continue
+            for segment in segments:
+                self._unindex(src, segment)
+            self._videos.pop(src, None)
+            for start, end, tag in segments:
+                self.add(dst, start, end, tag)
+            changed = True
+        self.dirty = self.dirty or changed
+        return changed
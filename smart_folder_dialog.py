@@ -0,0 +1,97 @@
+# smart_folder_dialog.py - 新建/编辑智能文件夹
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QFormLayout, QDialogButtonBox, QLabel, QLineEdit, QComboBox, QDoubleSpinBox,
+    QListWidget, QListWidgetItem, QMessageBox
+)
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QFont
+from smart_folders import SmartQuery, WATCH_TEXT
+
+
+def _split(text):
+    return [part.strip() for part in text.replace('，', ',').split(',') if part.strip()]
+
+
+class SmartFolderDialog(QDialog):
+    def __init__(self, folders, known_tags, name="", query=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("智能文件夹")
+        self.resize(520, 520)
+        self.known_tags = known_tags
+        self.result_name = None
+        self.result_query = None
+        query = query or SmartQuery({})
+
+        layout = QVBoxLayout(self)
+        hint = QLabel("智能文件夹保存一组条件，结果随标签修改、扫描和播放自动更新。"
+                      "标签用逗号分隔，父标签匹配其所有子标签。")
+        hint.setWordWrap(True)
+        hint.setFont(QFont("SimHei", 10))
+        layout.addWidget(hint)
+
+        form = QFormLayout()
+        self.name_edit = QLineEdit(name)
+        form.addRow("名称", self.name_edit)
+        self.include_edit = QLineEdit(", ".join(query.include_tags))
+        self.include_edit.setPlaceholderText("例如：动画")
+        form.addRow("必须包含的标签", self.include_edit)
+        self.exclude_edit = QLineEdit(", ".join(query.exclude_tags))
+        self.exclude_edit.setPlaceholderText("例如：已归档")
+        form.addRow("不能包含的标签", self.exclude_edit)
+        self.watch_combo = QComboBox()
+        for value, text in WATCH_TEXT.items():
+            self.watch_combo.addItem(text, value)
+        self.watch_combo.setCurrentIndex(self.watch_combo.findData(query.watch))
+        form.addRow("观看状态", self.watch_combo)
+        self.days_spin = QDoubleSpinBox()
+        self.days_spin.setRange(0, 36500)
+        self.days_spin.setDecimals(0)
+        self.days_spin.setSpecialValueText("不限")
+        self.days_spin.setSuffix(" 天")
+        self.days_spin.setValue(query.recent_days)
+        form.addRow("最近加入（按修改时间）", self.days_spin)
+        self.size_spin = QDoubleSpinBox()
+        self.size_spin.setRange(0, 1024 * 1024)
+        self.size_spin.setDecimals(1)
+        self.size_spin.setSpecialValueText("不限")
+        self.size_spin.setSuffix(" MB")
+        self.size_spin.setValue(query.min_size_mb)
+        form.addRow("最小文件大小", self.size_spin)
+        layout.addLayout(form)
+
+        layout.addWidget(QLabel("限定文件夹（都不勾选表示全部）"))
+        self.folder_list = QListWidget()
+        for folder in folders:
+            item = QListWidgetItem(folder)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if folder in query.folders else Qt.Unchecked)
+            self.folder_list.addItem(item)
+        layout.addWidget(self.folder_list, stretch=1)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def accept(self):
+        name = self.name_edit.text().strip()
+        if not name:
+            QMessageBox.warning(self, "缺少名称", "请输入智能文件夹的名称。")
+            return
+        include, exclude = _split(self.include_edit.text()), _split(self.exclude_edit.text())
+        unknown = [t for t in include + exclude if t not in self.known_tags]
+        if unknown:
+            QMessageBox.warning(self, "未知标签", "以下标签不在全局标签列表中：" + "、".join(unknown))
+            return
+        folders = [self.folder_list.item(i).text() for i in range(self.folder_list.count())
+                   if self.folder_list.item(i).checkState() == Qt.Checked]
+        self.result_name = name
+        self.result_query = SmartQuery({
+            'include_tags': include,
+            'exclude_tags': exclude,
+            'watch': self.watch_combo.currentData(),
+            'recent_days': self.days_spin.value(),
+            'min_size_mb': self.size_spin.value(),
+            'folders': folders,
+        })
+        super().accept()
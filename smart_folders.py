@@ -0,0 +1,331 @@
+# smart_folders.py - 智能文件夹：保存的查询 + 物化的结果集，标签修改/扫描变化/播放记录到来时逐条增量维护
+#
+# Save/SmartFolders.json: {"folders": [{"id", "name", "query": {...}, "members": {路径: [size, mtime_ns]}}]}
+#   query.include_tags   必须都有（父标签匹配其任一子孙标签）
+#   query.exclude_tags   一个都不能有
+#   query.watch          "unwatched" 没看过 / "unfinished" 看过没看完 / "completed" 看完了，null 表示不限
+#   query.recent_days    文件修改时间在最近 N 天内（复制/下载进来的时间），0 或 null 表示不限
+#   query.min_size_mb    最小文件大小
+#   query.folders        只在这些注册文件夹中，空表示全部
+# 只在创建/修改查询（以及标签层级变化）时对已扫描的视频完整求值一次；打开智能文件夹只读取物化结果。
+import os
+import json
+import time
+import itertools
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+SMART_FOLDERS_FILE = os.path.join(SAVE_DIR, "SmartFolders.json")
+# 智能文件夹在文件夹列表中的条目键
+SMART_PREFIX = "smart:"
+
+WATCH_UNWATCHED = "unwatched"
+WATCH_UNFINISHED = "unfinished"
+WATCH_COMPLETED = "completed"
+WATCH_TEXT = {
+    None: "不限",
+    WATCH_UNWATCHED: "没看过",
+    WATCH_UNFINISHED: "看过没看完",
+    WATCH_COMPLETED: "已看完",
+}
+
+DAY = 86400
+
+
+class SmartQuery:
+    def __init__(self, data):
+        self.include_tags = list(dict.fromkeys(data.get('include_tags') or ()))
+        self.exclude_tags = list(dict.fromkeys(data.get('exclude_tags') or ()))
+        self.watch = data.get('watch') or None
+        if self.watch not in WATCH_TEXT:
+            raise ValueError(f"未知的观看状态: {self.watch}")
+        self.recent_days = float(data.get('recent_days') or 0)
+        self.min_size_mb = float(data.get('min_size_mb') or 0)
+        self.folders = [os.path.normpath(f) for f in data.get('folders') or ()]
+
+    def to_dict(self):
+        return {
+            'include_tags': self.include_tags,
+            'exclude_tags': self.exclude_tags,
+            'watch': self.watch,
+            'recent_days': self.recent_days,
+            'min_size_mb': self.min_size_mb,
+            'folders': self.folders,
+        }
+
+    def uses_tags(self):
+        return bool(self.include_tags or self.exclude_tags)
+
+    def cutoff_ns(self, now):
+        return int((now - self.recent_days * DAY) * 1e9) if self.recent_days else None
+
+    def matches(self, root, stat, expanded_tags, watch_state, now):
+        # stat 为 (size, mtime_ns)；expanded_tags 为视频的标签及其全部祖先；watch_state 取值同 query.watch
+        if self.folders and root not in self.folders:
+            return False
+        size, mtime = stat
+        if self.min_size_mb and size < self.min_size_mb * 1024 * 1024:
+            return False
+        cutoff = self.cutoff_ns(now)
+        if cutoff is not None and mtime < cutoff:
+            return False
+        if any(t not in expanded_tags for t in self.include_tags):
+            return False
+        if any(t in expanded_tags for t in self.exclude_tags):
+            return False
+        if self.watch is not None and watch_state != self.watch:
+            return False
+        return True
+
+    def describe(self):
+        parts = []
+        if self.include_tags:
+            parts.append("含 " + "、".join(self.include_tags))
+        if self.exclude_tags:
+            parts.append("不含 " + "、".join(self.exclude_tags))
+        if self.watch:
+            parts.append(WATCH_TEXT[self.watch])
+        if self.recent_days:
+            parts.append(f"最近 {self.recent_days:g} 天")
+        if self.min_size_mb:
+            parts.append(f"≥{self.min_size_mb:g}MB")
+        if self.folders:
+            parts.append(f"{len(self.folders)} 个文件夹")
+        return "，".join(parts) or "全部视频"
+
+
+class SmartFolder:
+    def __init__(self, folder_id, name, query, members=None):
+        self.id = folder_id
+        self.name = name
+        self.query = query
+        # 路径 -> (size, mtime_ns)：打开时直接用这些条目建列表，不访问扫描索引
+        self.members = members if members is not None else {}
+
+    @property
+    def key(self):
+        return SMART_PREFIX + self.id
+
+
+class SmartFolderStore:
+    # data_manager 提供标签/层级/扫描索引，watch_history 提供观看状态
+    def __init__(self, data_manager, watch_history, file=SMART_FOLDERS_FILE):
+        self.data_manager = data_manager
+        self.watch_history = watch_history
+        self.file = file
+        self.folders = {}
+        self.dirty = False
+        # on_changed()：有智能文件夹的结果变化时调用一次，之后由调用方 take_changed 取走
+        self.on_changed = None
+        self._changed = set()
+        self._ids = itertools.count(1)
+        self._hierarchy_version = data_manager.tag_hierarchy.version
+
+    def load(self):
+        self.folders = {}
+        try:
+            if os.path.exists(self.file):
+                with open(self.file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                for entry in data.get('folders', []):
+                    try:
+                        query = SmartQuery(entry.get('query', {}))
+                    except ValueError as e:
+                        log.error("智能文件夹 %s 的查询无效: %s", entry.get('name'), e)
+                        continue
+                    members = {p: tuple(stat) for p, stat in entry.get('members', {}).items()}
+                    self.folders[entry['id']] = SmartFolder(entry['id'], entry['name'], query, members)
+        except Exception as e:
+            log.error("读取 %s 出错: %s", self.file, e)
+        numeric = [int(i) for i in self.folders if i.isdigit()]
+        self._ids = itertools.count(max(numeric, default=0) + 1)
+
+    def save(self):
+        data = {'folders': [
+            {'id': f.id, 'name': f.name, 'query': f.query.to_dict(),
+             'members': {p: list(stat) for p, stat in f.members.items()}}
+            for f in self.folders.values()
+        ]}
+        try:
+            write_json_atomic(self.file, data)
+            self.dirty = False
+        except Exception as e:
+            log.error("保存 %s 出错: %s", self.file, e)
+
+    def save_if_dirty(self):
+        if self.dirty:
+            self.save()
+
+    def ordered(self):
+        return sorted(self.folders.values(), key=lambda f: f.name)
+
+    def get(self, key):
+        # key 为文件夹列表中的条目键（smart:<id>）
+        if key and key.startswith(SMART_PREFIX):
+            return self.folders.get(key[len(SMART_PREFIX):])
+        return None
+
+    # === 创建/修改：对已扫描的视频完整求值一次 ===
+    def create(self, name, query):
+        folder = SmartFolder(str(next(self._ids)), name, query)
+        self.folders[folder.id] = folder
+        self.materialize(folder)
+        return folder
+
+    def update(self, folder, name, query):
+        folder.name = name
+        folder.query = query
+        self.materialize(folder)
+
+    def delete(self, folder):
+        self.folders.pop(folder.id, None)
+        self.dirty = True
+
+    def materialize(self, folder):
+        dm = self.data_manager
+        query = folder.query
+        now = time.time()
+        watch = self.watch_history.watch_states() if query.watch is not None else {}
+        members = {}
+        for root in query.folders or dm.folders:
+            if root not in dm.folders:
+                continue
+            table = dm.scan_indexes.get(root).table()
+            if query.uses_tags():
+                dm.labels.shard(root)
+            for path, size, mtime in zip(table.paths, table.sizes, table.mtimes):
+                tags = dm.tag_hierarchy.expand(dm.get_tags(path)) if query.uses_tags() else ()
+                if query.matches(root, (size, mtime), tags, self._watch_state(watch.get(path)), now):
+                    members[path] = (size, mtime)
+            dm.labels.evict()
+        folder.members = members
+        self.dirty = True
+        self._mark_changed(folder)
+        log.info("智能文件夹 %s: %d 个视频", folder.name, len(members))
+
+    def sync_hierarchy(self):
+        # 标签层级变化会改变父标签覆盖的范围，按标签筛选的智能文件夹重新求值
+        version = self.data_manager.tag_hierarchy.version
+        if version == self._hierarchy_version:
+            return
+        self._hierarchy_version = version
+        for folder in self.folders.values():
+            if folder.query.uses_tags():
+                self.materialize(folder)
+
+    def rename_tag(self, old_tag, new_tag):
+        # 在标签改名之后调用：改写引用了旧名字的查询，并只对这些智能文件夹重新求值
+        for folder in self.folders.values():
+            q = folder.query
+            if old_tag in q.include_tags or old_tag in q.exclude_tags:
+                q.include_tags = list(dict.fromkeys(new_tag if t == old_tag else t for t in q.include_tags))
+                q.exclude_tags = list(dict.fromkeys(new_tag if t == old_tag else t for t in q.exclude_tags))
+                self.materialize(folder)
+
+    def forget_tags(self, tags):
+        # 在标签删除之后调用：排除条件中去掉这些标签后重新求值；要求包含它们的智能文件夹已随标签移除变空
+        for folder in self.folders.values():
+            q = folder.query
+            if not tags.isdisjoint(q.exclude_tags):
+                q.exclude_tags = [t for t in q.exclude_tags if t not in tags]
+                self.materialize(folder)
+
+    # === 增量维护：每个事件只对涉及的那一个视频求值 ===
+    def on_tags(self, path, old_tags, new_tags):
+        tagged = [f for f in self.folders.values() if f.query.uses_tags()]
+        if not tagged:
+            return
+        expanded = self.data_manager.tag_hierarchy.expand(new_tags)
+        self._reevaluate(path, tagged, tags=expanded)
+
+    def on_scan_delta(self, index, added, removed, changed):
+        if not self.folders:
+            return
+        for path in removed:
+            for folder in self.folders.values():
+                if folder.members.pop(path, None) is not None:
+                    self.dirty = True
+                    self._mark_changed(folder)
+        folders = list(self.folders.values())
+        for path in added | changed:
+            self._reevaluate(path, folders, stat=index.stat_of(path), root=index.root)
+
+    def on_played(self, path):
+        watching = [f for f in self.folders.values() if f.query.watch is not None]
+        if watching:
+            self._reevaluate(path, watching)
+
+    def on_moved(self, mapping):
+        # 程序内移动/重命名之后调用（扫描索引已改用新路径）：成员换成新路径后对涉及的视频重新求值，
+        # 移到别的文件夹后可能不再满足文件夹条件
+        folders = list(self.folders.values())
+        if not folders:
+            return
+        for src, dst in mapping.items():
+            for folder in folders:
+                stat = folder.members.pop(src, None)
+                if stat is not None:
+                    folder.members[dst] = stat
+                    self.dirty = True
+                    self._mark_changed(folder)
+            self._reevaluate(dst, folders)
+
+    def expire(self, folder):
+        # “最近 N 天”只会随时间减少成员：打开时按修改时间剔除过期的，只遍历该智能文件夹自身
+        cutoff = folder.query.cutoff_ns(time.time())
+        if cutoff is None:
+            return False
+        stale = [p for p, (_, mtime) in folder.members.items() if mtime < cutoff]
+        for path in stale:
+            del folder.members[path]
+        if stale:
+            self.dirty = True
+        return bool(stale)
+
+    def take_changed(self):
+        changed, self._changed = self._changed, set()
+        return changed
+
+    def _reevaluate(self, path, folders, tags=None, stat=None, root=None):
+        dm = self.data_manager
+        if root is None:
+            root = dm.labels.root_for(path)
+        if stat is None:
+            stat = dm.stat_of(path)
+        now = time.time()
+        watch_state = None
+        for folder in folders:
+            query = folder.query
+            if stat is None:
+                hit = False
+            else:
+                if tags is None and query.uses_tags():
+                    tags = dm.tag_hierarchy.expand(dm.get_tags(path))
+                if watch_state is None and query.watch is not None:
+                    watch_state = self._watch_state(self.watch_history.completed(path))
+                hit = query.matches(root, tuple(stat), tags or (), watch_state, now)
+            old = folder.members.get(path)
+            new = tuple(stat) if hit else None
+            if new is not None:
+                folder.members[path] = new
+            elif old is not None:
+                del folder.members[path]
+            if old != new:
+                self.dirty = True
+                self._mark_changed(folder)
+
+    @staticmethod
+    def _watch_state(completed):
+        # completed: None 没有观看记录 / 0 / 1
+        if completed is None:
+            return WATCH_UNWATCHED
+        return WATCH_COMPLETED if completed else WATCH_UNFINISHED
+
+    def _mark_changed(self, folder):
+        notify = not self._changed
+        self._changed.add(folder.id)
+        if notify and self.on_changed is not None:
+            self.on_changed()
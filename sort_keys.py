@@ -0,0 +1,97 @@
+# sort_keys.py - 视频列表的排序模式与预计算排序键
+import os
+import re
+
+SORT_NAME = "name"
+SORT_MTIME = "mtime"
+SORT_SIZE = "size"
+SORT_DURATION = "duration"
+SORT_LAST_PLAYED = "last_played"
+SORT_TAG_COUNT = "tag_count"
+
+# (模式, 显示名称, 是否降序)
+SORT_MODES = [
+    (SORT_NAME, "名称", False),
+    (SORT_MTIME, "修改时间", True),
+    (SORT_SIZE, "文件大小", True),
+    (SORT_DURATION, "时长", True),
+    (SORT_LAST_PLAYED, "最近播放", True),
+    (SORT_TAG_COUNT, "标签数量", True),
+]
+_DESCENDING = {mode: desc for mode, _, desc in SORT_MODES}
+
+_DIGITS = re.compile(r'(\d+)')
+
+
+def natural_key(text):
+    # "EP2" < "EP10"：切分后奇数位是数字段，偶数位是文本段，逐位比较时类型总是一致
+    parts = _DIGITS.split(text.casefold())
+    return tuple(int(part) if i % 2 else part for i, part in enumerate(parts))
+
+
+class ListingTable:
+    # 一个扫描索引对应的扁平表：每个条目的排序键只算一次，各模式的顺序缓存为整数下标数组
+    def __init__(self, entries):
+        # entries: [(path, size, mtime_ns)]
+        self.paths = [e[0] for e in entries]
+        self.sizes = [e[1] for e in entries]
+        self.mtimes = [e[2] for e in entries]
+        self.position = {p: i for i, p in enumerate(self.paths)}
+        self._name_keys = None
+        self._dynamic = {}
+        self._orders = {}
+        self._ranks = {}
+
+    def set_dynamic_key(self, mode, key_for_path):
+        # 时长/最近播放/标签数随使用变化，由调用方提供取值函数，变化时调用 invalidate
+        if self._dynamic.get(mode) == key_for_path:
+            return
+        self._dynamic[mode] = key_for_path
+        self.invalidate(mode)
+
+    def invalidate(self, *modes):
+        for mode in modes:
+            self._orders.pop(mode, None)
+            self._ranks.pop(mode, None)
+
+    def _keys(self, mode):
+        if mode == SORT_NAME:
+            if self._name_keys is None:
+                self._name_keys = [
+                    (natural_key(os.path.basename(p)), natural_key(os.path.dirname(p))) for p in self.paths
+                ]
+            return self._name_keys
+        if mode == SORT_MTIME:
+            return self.mtimes
+        if mode == SORT_SIZE:
+            return self.sizes
+        key_for_path = self._dynamic.get(mode)
+        if key_for_path is None:
+            raise KeyError(f"未知的排序模式: {mode}")
+        return [key_for_path(p) for p in self.paths]
+
+    def order(self, mode):
+        order = self._orders.get(mode)
+        if order is None:
+            keys = self._keys(mode)
+            order = sorted(range(len(keys)), key=keys.__getitem__, reverse=_DESCENDING.get(mode, False))
+            rank = [0] * len(order)
+            for r, i in enumerate(order):
+                rank[i] = r
+            self._orders[mode] = order
+            self._ranks[mode] = rank
+        return order
+
+    def ordered(self, mode, subset=None):
+        order = self.order(mode)
+        paths = self.paths
+        if subset is None or len(subset) >= len(paths):
+            return [paths[i] for i in order if subset is None or paths[i] in subset]
+        # 结果集较小时按名次数组排序 O(k log k)，否则顺序扫描下标数组 O(n)
+        k = len(subset)
+        if k * max(1, k.bit_length()) < len(paths):
+            rank = self._ranks[mode]
+            position = self.position
+            ids = sorted((position[p] for p in subset if p in position), key=rank.__getitem__)
+            return [paths[i] for i in ids]
+        return [paths[i] for i in order if paths[i] in subset]
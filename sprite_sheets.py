@@ -0,0 +1,350 @@
+# sprite_sheets.py - 进度条悬停预览：每个视频预先生成一张缩略图拼图，悬停时只从缓存中裁出一格
+#
+# Save/Sprites/<hash>.jpg   拼图（一张 JPEG）：TILE_COLUMNS 列，每格 TILE_WIDTH x TILE_HEIGHT
+# Save/Sprites/<hash>.json  偏移表：{"path", "size", "mtime_ns", "duration_ms", "tile": [w, h], "columns",
+#                                   "times": [ms, ...]}；第 i 格对应 times[i]，左上角在 (i % columns * w, i // columns * h)
+# 拼图由后台线程通过可替换的取帧器（FrameExtractor）生成：正式运行用 libvlc 解码到内存，测试用 StubFrameExtractor。
+# 悬停时在偏移表上二分找到最近的格子，从 LRU 缓存中已载入的拼图里复制这一小块，不做任何视频解码。
+import os
+import json
+import heapq
+import ctypes
+import hashlib
+import itertools
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QObject, QRect, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+SPRITE_DIR = os.path.join(SAVE_DIR, "Sprites")
+os.makedirs(SPRITE_DIR, exist_ok=True)
+
+TILE_WIDTH = 160
+TILE_HEIGHT = 90
+TILE_COLUMNS = 10
+# 大约每 10 秒一格，总数限制在 [MIN_TILES, MAX_TILES]
+TILE_INTERVAL_MS = 10000
+MIN_TILES = 10
+MAX_TILES = 100
+JPEG_QUALITY = 80
+FRAME_TIMEOUT = 3.0
+MAX_CACHED_SHEETS = 6
+
+PRIORITY_PLAYING = 0
+PRIORITY_PREFETCH = 1
+
+
+class FrameExtractError(Exception):
+    pass
+
+
+def sprite_base(path):
+    return os.path.join(SPRITE_DIR, hashlib.sha1(path.encode('utf-8')).hexdigest()[:16])
+
+
+# === 取帧器：open(path) 返回时长（毫秒），frame(ms) 返回该时刻的 QImage（取不到时为 None），close() ===
+class FrameExtractor:
+    def open(self, path):
+        raise NotImplementedError
+
+    def frame(self, ms):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class StubFrameExtractor(FrameExtractor):
+    # 不解码视频：按时间生成纯色画面，用于测试拼图的生成、偏移表和缓存
+    def __init__(self, duration_ms=600000):
+        self.duration_ms = duration_ms
+
+    def open(self, path):
+        return self.duration_ms
+
+    def frame(self, ms):
+        image = QImage(TILE_WIDTH, TILE_HEIGHT, QImage.Format_RGB32)
+        image.fill(QColor.fromHsv(int(ms / max(1, self.duration_ms) * 359), 160, 200))
+        return image
+
+
+class VlcFrameExtractor(FrameExtractor):
+    # 独立的 vlc.Instance，画面通过回调解码到内存缓冲区：不创建窗口、不输出声音。
+    # 两块缓冲区交替使用：libvlc 只写入最近一帧之外的那一块，frame() 在 _cond 内复制最近一帧
+    def __init__(self, width=TILE_WIDTH, height=TILE_HEIGHT, timeout=FRAME_TIMEOUT):
+        import vlc
+        self.width = width
+        self.height = height
+        self.timeout = timeout
+        self.instance = vlc.Instance("--quiet", "--no-audio", "--no-video-title-show", "--no-xlib", "--no-osd")
+        self.player = self.instance.media_player_new()
+        self._buffers = [(ctypes.c_ubyte * (width * height * 4))() for _ in range(2)]
+        # 最近一帧所在的缓冲区下标
+        self._ready = None
+        self._frames = 0
+        self._cond = threading.Condition()
+        # 回调对象必须保持引用，否则会被回收
+        self._callbacks = (
+            vlc.CallbackDecorators.VideoLockCb(self._lock),
+            vlc.CallbackDecorators.VideoUnlockCb(self._unlock),
+            vlc.CallbackDecorators.VideoDisplayCb(self._display),
+        )
+        self.player.video_set_callbacks(*self._callbacks, None)
+        self.player.video_set_format("RV32", width, height, width * 4)
+
+    def _lock(self, opaque, planes):
+        with self._cond:
+            index = 1 if self._ready == 0 else 0
+        planes[0] = ctypes.addressof(self._buffers[index])
+        # 返回值原样作为 picture 传给 _display；加 1 避免成为空指针
+        return index + 1
+
+    def _unlock(self, opaque, picture, planes):
+        pass
+
+    def _display(self, opaque, picture):
+        with self._cond:
+            self._ready = picture - 1
+            self._frames += 1
+            self._cond.notify_all()
+
+    def _wait_frame(self, after):
+        with self._cond:
+            return self._cond.wait_for(lambda: self._frames > after, self.timeout)
+
+    def open(self, path):
+        media = self.instance.media_new(path)
+        media.add_option(":no-audio")
+        self.player.set_media(media)
+        start = self._frames
+        self.player.play()
+        if not self._wait_frame(start):
+            self.player.stop()
+            raise FrameExtractError(f"无法解码 {path}")
+        # 之后保持暂停，逐个时间点跳转；暂停状态下跳转会解码并输出目标位置的一帧
+        self.player.set_pause(1)
+        return self.player.get_length()
+
+    def frame(self, ms):
+        start = self._frames
+        self.player.set_time(int(ms))
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._frames > start, self.timeout):
+                return None
+            # 持有 _cond 期间 _display 不会切换缓冲区，_lock 也不会把这一块交给解码器
+            data = bytes(self._buffers[self._ready])
+        return QImage(data, self.width, self.height, self.width * 4, QImage.Format_RGB32).copy()
+
+    def close(self):
+        self.player.stop()
+
+    def release(self):
+        self.player.release()
+        self.instance.release()
+
+
+# === 生成 ===
+def tile_times(duration_ms):
+    count = max(MIN_TILES, min(MAX_TILES, duration_ms // TILE_INTERVAL_MS))
+    return [int((i + 0.5) * duration_ms / count) for i in range(count)]
+
+
+def is_current(path):
+    # 拼图存在且与视频文件的大小/修改时间一致
+    try:
+        with open(sprite_base(path) + ".json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return False
+    return meta.get('size') == st.st_size and meta.get('mtime_ns') == st.st_mtime_ns
+
+
+def build_sprite_sheet(path, extractor, cancel=None):
+    # 在工作线程中调用；返回是否生成成功
+    st = os.stat(path)
+    duration = extractor.open(path)
+    try:
+        if not duration or duration <= 0:
+            raise FrameExtractError(f"无法取得时长: {path}")
+        times = tile_times(duration)
+        rows = (len(times) + TILE_COLUMNS - 1) // TILE_COLUMNS
+        sheet = QImage(TILE_COLUMNS * TILE_WIDTH, rows * TILE_HEIGHT, QImage.Format_RGB32)
+        sheet.fill(Qt.black)
+        painter = QPainter(sheet)
+        try:
+            for i, ms in enumerate(times):
+                if cancel is not None and cancel():
+                    return False
+                image = extractor.frame(ms)
+                if image is None:
+                    continue
+                if image.width() != TILE_WIDTH or image.height() != TILE_HEIGHT:
+                    image = image.scaled(TILE_WIDTH, TILE_HEIGHT, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+                painter.drawImage(i % TILE_COLUMNS * TILE_WIDTH, i // TILE_COLUMNS * TILE_HEIGHT, image)
+        finally:
+            painter.end()
+    finally:
+        extractor.close()
+    base = sprite_base(path)
+    tmp = f"{base}.{os.getpid()}.tmp.jpg"
+    if not sheet.save(tmp, "JPG", JPEG_QUALITY):
+        raise FrameExtractError(f"无法写入 {tmp}")
+    os.replace(tmp, base + ".jpg")
+    write_json_atomic(base + ".json", {
+        'path': path, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'duration_ms': duration,
+        'tile': [TILE_WIDTH, TILE_HEIGHT], 'columns': TILE_COLUMNS, 'times': times,
+    })
+    return True
+
+
+def move_sprite_sheets(mapping):
+    # 程序内移动/重命名之后调用：拼图按路径哈希命名，改名即可沿用（移动不改变文件大小和修改时间）
+    for src, dst in mapping.items():
+        old, new = sprite_base(src), sprite_base(dst)
+        try:
+            with open(old + ".json", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            os.replace(old + ".jpg", new + ".jpg")
+            meta['path'] = dst
+            write_json_atomic(new + ".json", meta)
+            os.remove(old + ".json")
+        except (OSError, ValueError):
+            continue
+
+
+class SpriteSheetWorker(QObject):
+    # ready(path)：该视频的拼图已生成（或已更新）
+    ready = pyqtSignal(str)
+
+    def __init__(self, extractor_factory=VlcFrameExtractor, parent=None):
+        super().__init__(parent)
+        self.extractor_factory = extractor_factory
+        self._heap = []
+        self._queued = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    def request(self, path, priority=PRIORITY_PREFETCH):
+        with self._cond:
+            if self._queued.get(path, priority + 1) <= priority:
+                return
+            self._queued[path] = priority
+            heapq.heappush(self._heap, (priority, next(self._seq), path))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="sprite-sheets")
+                self._thread.start()
+            self._cond.notify()
+
+    def shutdown(self):
+        with self._cond:
+            self._stop = True
+            self._heap.clear()
+            self._queued.clear()
+            self._cond.notify()
+
+    def _next(self):
+        with self._cond:
+            while True:
+                if self._stop:
+                    return None
+                while self._heap:
+                    priority, _, path = heapq.heappop(self._heap)
+                    # 同一路径以更高优先级重新排队时，旧条目作废
+                    if self._queued.get(path) == priority:
+                        del self._queued[path]
+                        return path
+                self._cond.wait()
+
+    def _run(self):
+        try:
+            extractor = self.extractor_factory()
+        except Exception as e:
+            log.warning("无法创建取帧器，进度条悬停预览不可用: %s", e)
+            return
+        try:
+            while True:
+                path = self._next()
+                if path is None:
+                    break
+                if is_current(path):
+                    continue
+                try:
+                    if build_sprite_sheet(path, extractor, cancel=lambda: self._stop):
+                        log.debug("已生成预览拼图: %s", path)
+                        self.ready.emit(path)
+                except Exception as e:
+                    log.warning("生成预览拼图失败 %s: %s", path, e)
+        finally:
+            release = getattr(extractor, 'release', None)
+            if release is not None:
+                release()
+
+
+# === 查看：拼图按 LRU 缓存在界面线程中，悬停只做二分和一小块复制 ===
+class SpriteSheet:
+    def __init__(self, pixmap, meta):
+        self.pixmap = pixmap
+        self.times = meta['times']
+        self.columns = meta['columns']
+        self.tile_width, self.tile_height = meta['tile']
+
+    def frame(self, ms):
+        i = bisect_left(self.times, ms)
+        if i == len(self.times) or (i > 0 and ms - self.times[i - 1] < self.times[i] - ms):
+            i -= 1
+        rect = QRect(i % self.columns * self.tile_width, i // self.columns * self.tile_height,
+                     self.tile_width, self.tile_height)
+        return self.pixmap.copy(rect)
+
+
+class SpriteCache:
+    def __init__(self, max_sheets=MAX_CACHED_SHEETS):
+        self.max_sheets = max_sheets
+        self._sheets = OrderedDict()
+        # 没有拼图的路径：避免每次鼠标移动都访问磁盘，拼图生成后由 invalidate 清除
+        self._missing = set()
+
+    def frame(self, path, ms):
+        sheet = self._sheets.get(path)
+        if sheet is not None:
+            self._sheets.move_to_end(path)
+            return sheet.frame(ms)
+        if path in self._missing:
+            return None
+        sheet = self._load(path)
+        if sheet is None:
+            self._missing.add(path)
+            return None
+        self._sheets[path] = sheet
+        while len(self._sheets) > self.max_sheets:
+            self._sheets.popitem(last=False)
+        return sheet.frame(ms)
+
+    def _load(self, path):
+        base = sprite_base(path)
+        try:
+            with open(base + ".json", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        pixmap = QPixmap(base + ".jpg")
+        if pixmap.isNull() or not meta.get('times'):
+            return None
+        return SpriteSheet(pixmap, meta)
+
+    def invalidate(self, path):
+        self._sheets.pop(path, None)
+        self._missing.discard(path)
+
+    def clear(self):
+        self._sheets.clear()
+        self._missing.clear()
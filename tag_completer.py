@@ -0,0 +1,120 @@
+# tag_completer.py - 标签前缀补全（有序数组 + bisect）与最近/常用排序
+import os
+import re
+import json
+import time
+from bisect import bisect_left
+from itertools import islice
+from sort_keys import natural_key
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+TAG_USAGE_FILE = os.path.join(SAVE_DIR, "TagUsage.json")
+
+# 除整串外，分隔符后的每一段也可作为前缀命中，例如 "action" 能匹配 "Anime-Action"
+_WORD_START = re.compile(r'[-_\s/·]+')
+RECENT_HALF_LIFE = 7 * 24 * 3600
+
+
+class TagUsage:
+    # tag -> [使用次数, 最近使用时间]
+    def __init__(self):
+        self.stats = {}
+        self.version = 0
+        self.load()
+
+    def load(self):
+        try:
+            if os.path.exists(TAG_USAGE_FILE):
+                with open(TAG_USAGE_FILE, 'r', encoding='utf-8') as f:
+                    self.stats = json.load(f)
+        except Exception as e:
+            log.error("读取 %s 出错: %s", TAG_USAGE_FILE, e)
+
+    def save(self):
+        try:
+            with open(TAG_USAGE_FILE, 'w', encoding='utf-8') as f:
+                json.dump(self.stats, f, ensure_ascii=False)
+        except Exception as e:
+            log.error("保存 %s 出错: %s", TAG_USAGE_FILE, e)
+
+    def record(self, tags):
+        now = time.time()
+        for tag in tags:
+            count, _ = self.stats.get(tag, (0, 0))
+            self.stats[tag] = [count + 1, now]
+        self.version += 1
+        self.save()
+
+    def rename(self, old_tag, new_tag):
+        if old_tag in self.stats:
+            self.stats[new_tag] = self.stats.pop(old_tag)
+            self.version += 1
+            self.save()
+
+    def forget(self, tag):
+        if self.stats.pop(tag, None) is not None:
+            self.version += 1
+            self.save()
+
+    def score(self, tag, now):
+        # 使用次数按最近使用时间衰减：越常用、越近用过的排越前
+        count, last = self.stats.get(tag, (0, 0))
+        if not count:
+            return 0.0
+        return count * 0.5 ** ((now - last) / RECENT_HALF_LIFE) + 1.0
+
+
+class TagCompleter:
+    def __init__(self, usage):
+        self.usage = usage
+        self.tags = frozenset()
+        self._keys = []       # 有序的 (前缀键, 标签)
+        self._ranked = None
+        self._rank_of = {}
+        self._ranked_version = -1
+
+    def refresh(self, tags):
+        tags = frozenset(tags)
+        if tags == self.tags:
+            return
+        self.tags = tags
+        keys = []
+        for tag in tags:
+            folded = tag.casefold()
+            keys.append((folded, tag))
+            for m in _WORD_START.finditer(folded):
+                if m.end() < len(folded):
+                    keys.append((folded[m.end():], tag))
+        keys.sort()
+        self._keys = keys
+        self._ranked = None
+
+    def ranked(self):
+        # 全部标签按最近/常用排好的顺序与名次，只在标签集合或使用统计变化时重算
+        if self._ranked is None or self._ranked_version != self.usage.version:
+            now = time.time()
+            score = self.usage.score
+            self._ranked = sorted(self.tags, key=lambda t: (-score(t, now), natural_key(t)))
+            self._rank_of = {t: i for i, t in enumerate(self._ranked)}
+            self._ranked_version = self.usage.version
+        return self._ranked
+
+    def complete(self, text):
+        # 每次按键调用：二分定位前缀区间 O(log n + k)，再按预先算好的名次排序
+        ranked = self.ranked()
+        prefix = text.strip().casefold()
+        if not prefix:
+            return ranked
+        lo = bisect_left(self._keys, (prefix,))
+        hits = set()
+        for key, tag in islice(self._keys, lo, None):
+            if not key.startswith(prefix):
+                break
+            hits.add(tag)
+        k = len(hits)
+        if k * max(1, k.bit_length()) < len(ranked):
+            return sorted(hits, key=self._rank_of.__getitem__)
+        return [t for t in ranked if t in hits]
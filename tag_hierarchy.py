@@ -0,0 +1,147 @@
+# tag_hierarchy.py - 标签层级：每个标签最多一个父标签，祖先/子孙闭包表随增删改增量维护
+#
+# Save/TagHierarchy.json: {"parents": {子标签: 父标签}}
+# 闭包表按两个方向保存：up[t] 为 t 的全部祖先，down[t] 为 t 的全部子孙（都不含 t 本身）。
+# 移动一个标签时只改动 (旧/新祖先) × (被移动的子树) 这些条目，与层级总大小无关。
+import os
+import json
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+TAG_HIERARCHY_FILE = os.path.join(SAVE_DIR, "TagHierarchy.json")
+
+
+class TagHierarchyError(ValueError):
+    pass
+
+
+class TagHierarchy:
+    def __init__(self, file=TAG_HIERARCHY_FILE):
+        self.file = file
+        self.parent = {}
+        self.children = {}
+        self.up = {}
+        self.down = {}
+        self._mtime = None
+        # 每次结构变化加一，依赖层级的缓存（智能文件夹）据此判断是否需要重新求值
+        self.version = 0
+
+    def __contains__(self, tag):
+        return tag in self.parent or tag in self.children
+
+    def load(self):
+        self.parent, self.children, self.up, self.down = {}, {}, {}, {}
+        self.version += 1
+        try:
+            if os.path.exists(self.file):
+                self._mtime = os.path.getmtime(self.file)
+                with open(self.file, 'r', encoding='utf-8') as f:
+                    parents = json.load(f).get('parents', {})
+                for tag, parent in parents.items():
+                    try:
+                        self.set_parent(tag, parent)
+                    except TagHierarchyError as e:
+                        log.warning("忽略无效的标签层级 %s -> %s: %s", tag, parent, e)
+        except Exception as e:
+            log.error("读取 %s 出错: %s", self.file, e)
+
+    def save(self):
+        try:
+            write_json_atomic(self.file, {"parents": self.parent}, indent=4)
+            self._mtime = os.path.getmtime(self.file)
+        except Exception as e:
+            log.error("保存 %s 出错: %s", self.file, e)
+
+    def changed_on_disk(self):
+        try:
+            return os.path.exists(self.file) and os.path.getmtime(self.file) != self._mtime
+        except OSError:
+            return False
+
+    # === 查询 ===
+    def parent_of(self, tag):
+        return self.parent.get(tag)
+
+    def children_of(self, tag):
+        return self.children.get(tag, ())
+
+    def ancestors(self, tag):
+        return self.up.get(tag, ())
+
+    def descendants(self, tag):
+        return self.down.get(tag, ())
+
+    def subtree(self, tag):
+        return {tag} | self.down.get(tag, set())
+
+    def lineage(self, tag):
+        # 标签本身及其全部祖先：一个视频打上 tag，就同时属于这些标签的子树
+        up = self.up.get(tag)
+        return (tag, *up) if up else (tag,)
+
+    def has_children(self, tag):
+        return bool(self.children.get(tag))
+
+    def expand(self, tags):
+        result = set(tags)
+        for tag in tags:
+            result.update(self.up.get(tag, ()))
+        return result
+
+    def roots(self, tags):
+        # tags 中没有父标签的（按显示顺序排好）
+        return sorted(t for t in tags if t not in self.parent)
+
+    def depth(self, tag):
+        return len(self.up.get(tag, ()))
+
+    # === 修改 ===
+    def set_parent(self, tag, parent):
+        # parent 为 None 表示移到顶层；返回 (移动的子树, 旧祖先, 新祖先)，供倒排索引增量调整
+        if parent == tag or parent in self.down.get(tag, ()):
+            raise TagHierarchyError(f"'{parent}' 是 '{tag}' 自身或其子标签，不能作为父标签")
+        subtree = self.subtree(tag)
+        old_up = set(self.up.get(tag, ()))
+        old_parent = self.parent.get(tag)
+        if old_parent == parent:
+            return subtree, old_up, old_up
+        self.version += 1
+        if old_parent is not None:
+            siblings = self.children[old_parent]
+            siblings.discard(tag)
+            if not siblings:
+                del self.children[old_parent]
+            for a in old_up:
+                down = self.down[a]
+                down.difference_update(subtree)
+                if not down:
+                    del self.down[a]
+            for d in subtree:
+                up = self.up[d]
+                up.difference_update(old_up)
+                if not up:
+                    del self.up[d]
+            del self.parent[tag]
+        new_up = set()
+        if parent is not None:
+            new_up = {parent} | self.up.get(parent, set())
+            self.parent[tag] = parent
+            self.children.setdefault(parent, set()).add(tag)
+            for a in new_up:
+                self.down.setdefault(a, set()).update(subtree)
+            for d in subtree:
+                self.up.setdefault(d, set()).update(new_up)
+        return subtree, old_up, new_up
+
+    def drop(self, tag):
+        # 删除已移到顶层的整棵子树（只影响子树内部的条目）
+        if tag in self.parent:
+            raise TagHierarchyError(f"'{tag}' 仍有父标签")
+        for d in self.subtree(tag):
+            self.parent.pop(d, None)
+            self.children.pop(d, None)
+            self.up.pop(d, None)
+            self.down.pop(d, None)
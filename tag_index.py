@@ -0,0 +1,212 @@
+# tag_index.py - 标签倒排索引（标签 -> 视频路径集合）
+#
+# 有子标签的标签另外维护一份“子树倒排表”：含该标签或其任一子孙标签的视频集合，
+# 按父标签筛选时一次查表即可，不用逐个合并子标签的倒排表。
+from tag_hierarchy import TagHierarchy
+
+
+class TagIndex:
+    def __init__(self, hierarchy=None):
+        # tag -> set(video_path)；返回给调用方的集合只读，不要在外部修改
+        self.postings = {}
+        self.hierarchy = hierarchy if hierarchy is not None else TagHierarchy()
+        # 有子标签的 tag -> set(video_path)，以及每个视频在该子树中打了几个标签（降到 0 才移出集合）
+        self.under = {}
+        self._refs = {}
+        self.rebuild_under()
+
+    def rebuild(self, all_videos_info):
+        self.postings = {}
+        self.rebuild_under()
+        for path, info in all_videos_info.items():
+            self.add(path, info.get('tags', []))
+
+    def rebuild_under(self):
+        self.under, self._refs = {}, {}
+        for tag in list(self.hierarchy.children):
+            self._build_under(tag)
+
+    def add(self, path, tags):
+        for tag in tags:
+            paths = self.postings.setdefault(tag, set())
+            # 已登记过的 (path, tag) 不再计数，否则祖先的引用计数与 remove 对不上
+            if path in paths:
+                continue
+            paths.add(path)
+            for a in self.hierarchy.lineage(tag):
+                refs = self._refs.get(a)
+                if refs is not None:
+                    n = refs.get(path, 0)
+                    refs[path] = n + 1
+                    if not n:
+                        self.under[a].add(path)
+
+    def remove(self, path, tags):
+        for tag in tags:
+            paths = self.postings.get(tag)
+            if paths is None or path not in paths:
+                continue
+            paths.discard(path)
+            if not paths:
+                del self.postings[tag]
+            for a in self.hierarchy.lineage(tag):
+                refs = self._refs.get(a)
+                if refs is not None:
+                    n = refs.pop(path, 1) - 1
+                    if n:
+                        refs[path] = n
+                    else:
+                        self.under[a].discard(path)
+
+    def has(self, path, tag):
+        return path in self.postings.get(tag, ())
+
+    def paths_with(self, tag):
+        return self.postings.get(tag, set())
+
+    def paths_under(self, tag):
+        # 含 tag 或其任一子孙标签的视频
+        under = self.under.get(tag)
+        return under if under is not None else self.postings.get(tag, set())
+
+    def count(self, tag):
+        return len(self.postings.get(tag, ()))
+
+    def count_under(self, tag):
+        return len(self.paths_under(tag))
+
+    def expand(self, tags):
+        return self.hierarchy.expand(tags)
+
+    def all_under(self):
+        # (tag, 子树倒排表)，覆盖出现在倒排表中的标签和所有父标签
+        for tag, paths in self.postings.items():
+            if tag not in self.under:
+                yield tag, paths
+        yield from self.under.items()
+
+    # === 层级变化：只调整被移动子树的视频在新旧祖先上的计数 ===
+    def move_subtree(self, subtree, old_ancestors, new_ancestors):
+        # 在 hierarchy.set_parent 之后调用；两边共有的祖先不受影响
+        for a in old_ancestors - new_ancestors:
+            if a in self._refs:
+                self._shift(a, subtree, -1)
+        for a in new_ancestors - old_ancestors:
+            if a in self._refs:
+                self._shift(a, subtree, 1)
+            else:
+                # 原来是叶子标签，第一次有了子标签
+                self._build_under(a)
+        for a in old_ancestors - new_ancestors:
+            if not self.hierarchy.has_children(a):
+                self.under.pop(a, None)
+                self._refs.pop(a, None)
+
+    def forget_tags(self, tags):
+        # 标签从层级中删除后丢弃它们的子树倒排表
+        for tag in tags:
+            self.under.pop(tag, None)
+            self._refs.pop(tag, None)
+
+    def _shift(self, ancestor, subtree, delta):
+        refs, under = self._refs[ancestor], self.under[ancestor]
+        for tag in subtree:
+            for path in self.postings.get(tag, ()):
+                n = refs.get(path, 0) + delta
+                if n > 0:
+                    refs[path] = n
+                    under.add(path)
+                else:
+                    refs.pop(path, None)
+                    under.discard(path)
+
+    def _build_under(self, tag):
+        refs = {}
+        for t in self.hierarchy.subtree(tag):
+            for path in self.postings.get(t, ()):
+                refs[path] = refs.get(path, 0) + 1
+        self._refs[tag] = refs
+        self.under[tag] = set(refs)
+
+    def match_all(self, tags, candidates=None):
+        # 按倒排表长度从小到大求交集，先用最短的表收窄候选集；父标签按其子树倒排表计算
+        lists = sorted((self.paths_under(t) for t in tags), key=len)
+        if not lists:
+            return set(candidates) if candidates is not None else set()
+        if candidates is None:
+            result = set(lists[0])
+        else:
+            result = lists[0].intersection(candidates)
+        for paths in lists[1:]:
+            if not result:
+                break
+            result.intersection_update(paths)
+        return result
+
+
+class FacetCounter:
+    # 当前文件夹 + 当前筛选条件下，每个标签还能命中多少视频（即“再勾选该标签后的结果数”）
+    def __init__(self, tag_index, get_tags):
+        self.tag_index = tag_index
+        self.get_tags = get_tags
+        self.view = set()
+        self.filter_tags = set()
+        self.result = set()
+        self.counts = {}
+
+    def reset(self, view_paths, filter_tags):
+        self.view = set(view_paths)
+        self.filter_tags = set(filter_tags)
+        self._recompute()
+
+    def clear(self):
+        self.reset((), ())
+
+    def _recompute(self):
+        if self.filter_tags:
+            self.result = self.tag_index.match_all(self.filter_tags, self.view)
+        else:
+            self.result = set(self.view)
+        self.counts = {}
+        if not self.result:
+            return
+        for tag, paths in self.tag_index.all_under():
+            # set.intersection 会遍历两者中较小的那个
+            n = len(self.result.intersection(paths))
+            if n:
+                self.counts[tag] = n
+
+    def set_filter(self, filter_tags):
+        filter_tags = set(filter_tags)
+        if filter_tags >= self.filter_tags:
+            # 条件只增不减：结果集只会缩小，按被剔除的视频扣减计数即可
+            narrowed = self.tag_index.match_all(filter_tags - self.filter_tags, self.result)
+            for path in self.result - narrowed:
+                self._count(self.get_tags(path), -1)
+            self.result = narrowed
+            self.filter_tags = filter_tags
+        else:
+            self.filter_tags = filter_tags
+            self._recompute()
+
+    def update_path(self, path, old_tags, new_tags):
+        if path not in self.view:
+            return
+        if path in self.result:
+            self.result.discard(path)
+            self._count(old_tags, -1)
+        if self.filter_tags.issubset(self.tag_index.expand(new_tags)):
+            self.result.add(path)
+            self._count(new_tags, 1)
+
+    def _count(self, tags, delta):
+        # 父标签的计数包含子孙标签命中的视频
+        for tag in self.tag_index.expand(tags):
+            n = self.counts.get(tag, 0) + delta
+            if n > 0:
+                self.counts[tag] = n
+            else:
+                self.counts.pop(tag, None)
+
+    def count(self, tag):
+        return self.counts.get(tag, 0)
@@ -0,0 +1,158 @@
+# tag_picker.py - 可输入筛选的标签选择对话框与带补全的标签输入框
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QLabel, QLineEdit, QListView, QDialogButtonBox, QCompleter
+)
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex
+from PyQt5.QtGui import QFont
+
+
+class TagListModel(QAbstractListModel):
+    # 只持有当前可见的标签列表，QListView 按需绘制可见行；勾选状态独立保存，筛选变化时不会丢失
+    def __init__(self, checkable=False, parent=None):
+        super().__init__(parent)
+        self.tags = []
+        self.checkable = checkable
+        self.checked = set()
+
+    def set_tags(self, tags):
+        self.beginResetModel()
+        self.tags = tags
+        self.endResetModel()
+
+    def toggle(self, row):
+        if 0 <= row < len(self.tags):
+            self.checked ^= {self.tags[row]}
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.tags)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        tag = self.tags[index.row()]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return tag
+        if role == Qt.CheckStateRole and self.checkable:
+            return Qt.Checked if tag in self.checked else Qt.Unchecked
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.CheckStateRole or not self.checkable or not index.isValid():
+            return False
+        tag = self.tags[index.row()]
+        if value == Qt.Checked:
+            self.checked.add(tag)
+        else:
+            self.checked.discard(tag)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if self.checkable:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+
+class TagPickerDialog(QDialog):
+    # 输入框逐键筛选；回车勾选第一项并清空输入，输入框为空时回车确认
+    def __init__(self, completer, parent=None, title="选择标签"):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.setModal(True)
+        self.resize(300, 400)
+        self.completer = completer
+        layout = QVBoxLayout(self)
+
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("输入以筛选标签…")
+        self.filter_edit.setFont(QFont("SimHei", 11))
+        self.filter_edit.textChanged.connect(self.apply_filter)
+        layout.addWidget(self.filter_edit)
+
+        self.model = TagListModel(checkable=True, parent=self)
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setModel(self.model)
+        self.list_view.activated.connect(lambda index: self.model.toggle(index.row()))
+        layout.addWidget(self.list_view)
+
+        self.selected_label = QLabel()
+        layout.addWidget(self.selected_label)
+        self.model.dataChanged.connect(self.update_selected_label)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+        self.apply_filter("")
+        self.update_selected_label()
+        self.filter_edit.setFocus()
+
+    def apply_filter(self, text):
+        self.model.set_tags(self.completer.complete(text))
+
+    def update_selected_label(self):
+        self.selected_label.setText(f"已选 {len(self.model.checked)} 个标签")
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key_Return, Qt.Key_Enter) and self.filter_edit.hasFocus() \
+                and self.filter_edit.text().strip():
+            if self.model.tags:
+                if self.model.tags[0] not in self.model.checked:
+                    self.model.toggle(0)
+                self.filter_edit.clear()
+            return
+        super().keyPressEvent(event)
+
+    def get_selected_tags(self):
+        return [tag for tag in self.completer.complete("") if tag in self.model.checked]
+
+
+class TagInputDialog(QDialog):
+    # 代替 QInputDialog.getText：输入时弹出按最近/常用排序的已有标签
+    def __init__(self, completer, parent=None, title="输入标签", label="请输入标签名称：", text=""):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.setModal(True)
+        self.tag_completer = completer
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(label))
+
+        self.line_edit = QLineEdit(text)
+        self.line_edit.selectAll()
+        layout.addWidget(self.line_edit)
+
+        self.model = TagListModel(parent=self)
+        self.popup_completer = QCompleter(self.model, self)
+        self.popup_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.popup_completer.setWidget(self.line_edit)
+        self.popup_completer.activated[str].connect(self.line_edit.setText)
+        self.line_edit.textEdited.connect(self.update_completions)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        button_box.accepted.connect(self.accept)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def update_completions(self, text):
+        matches = self.tag_completer.complete(text) if text.strip() else []
+        self.model.set_tags(matches)
+        if matches:
+            self.popup_completer.complete()
+        else:
+            self.popup_completer.popup().hide()
+
+    def text(self):
+        return self.line_edit.text()
+
+    @staticmethod
+    def get_tag(completer, parent, title, label, text=""):
+        dialog = TagInputDialog(completer, parent, title, label, text)
+        ok = dialog.exec_() == QDialog.Accepted
+        return dialog.text(), ok
@@ -0,0 +1,9 @@
+# 测试在临时目录中运行：各模块导入时会在当前目录下创建 Save/，不能写进仓库
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.chdir(tempfile.mkdtemp(prefix="video_manager_tests_"))
@@ -0,0 +1,39 @@
+import re
+import random
+
+from auto_tag import AutoTagger
+
+
+def brute_force(rules, path):
+    # 不做预筛选：逐条规则直接对完整路径做 re.search
+    normalized = path.replace('\\', '/')
+    tags = set()
+    for rule in rules:
+        flags = re.IGNORECASE if rule.get('ignore_case', True) else 0
+        if re.search(rule['pattern'], normalized, flags):
+            tags.update(rule['tags'])
+    return tags
+
+
+def rule(pattern, tag):
+    return {'pattern': pattern, 'tags': [tag]}
+
+
+def test_grams_crossing_last_separator():
+    rules = [rule('ion/', 'a'), rule('on/ep', 'b'), rule('Action', 'c'),
+             rule('tion', 'd'), rule('n/ep1', 'e')]
+    path = '/lib/Action/ep1.mp4'
+    assert AutoTagger(rules).tags_for(path) == brute_force(rules, path) == {'a', 'b', 'c', 'd', 'e'}
+
+
+def test_prefilter_matches_plain_search():
+    alphabet = 'abon/ti'
+    rng = random.Random(1234)
+    words = {''.join(rng.choice(alphabet) for _ in range(rng.randint(3, 5))) for _ in range(60)}
+    rules = [rule(re.escape(w), w) for w in sorted(words)]
+    rules.append(rule('ab|on', 'alt'))
+    rules.append(rule('x?', 'always'))
+    tagger = AutoTagger(rules)
+    for _ in range(500):
+        path = '/' + ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 24))) + '.mp4'
+        assert tagger.tags_for(path) == brute_force(rules, path), path
@@ -0,0 +1,104 @@
+# 两台机器通过文件夹里的侧车副本同步标签：各自的本地版本号不可比较，删除标签也要传过去
+import os
+
+import pytest
+
+from label_shards import ShardedLabelStore
+from data_manager import merge_label_records
+
+
+@pytest.fixture
+def machines(tmp_path, monkeypatch):
+    root = str(tmp_path / "videos")
+    os.makedirs(root)
+    homes = {name: str(tmp_path / name) for name in ("a", "b")}
+    for home in homes.values():
+        os.makedirs(home)
+
+    def on(name):
+        monkeypatch.chdir(homes[name])
+        labels = ShardedLabelStore()
+        labels.load_manifest()
+        labels.set_roots([root])
+        labels.set_sidecar(root, True)
+        return labels
+    return root, on
+
+
+def edit(labels, root, rel, tags):
+    shard = labels.shard(root)
+    shard.store.touch(rel)
+    shard.store.records[rel] = dict(shard.store.records.get(rel) or {}, tags=tags)
+    labels.commit(shard, merge=merge_label_records)
+
+
+def sync(labels, root):
+    shard, changes = labels.import_sidecar(root, merge_label_records)
+    if changes:
+        labels.commit(shard, merge=merge_label_records)
+    labels.export_sidecar(root)
+    # 文件系统的时间戳精度有限，保证每次导出后侧车的修改时间都不同
+    path = labels.sidecar_file(root)
+    if os.path.exists(path):
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def tags_of(labels, root, rel):
+    return (labels.shard(root).store.records.get(rel) or {}).get('tags', [])
+
+
+def test_sidecar_sync_ignores_local_versions_and_propagates_removals(machines):
+    root, on = machines
+    a = on("a")
+    edit(a, root, "x.mp4", ["keep"])
+    sync(a, root)
+
+    b = on("b")
+    sync(b, root)
+    assert tags_of(b, root, "x.mp4") == ["keep"]
+    # b 上的版本号因此比 a 高
+    edit(b, root, "x.mp4", ["keep", "tmp"])
+    edit(b, root, "x.mp4", ["keep"])
+    sync(b, root)
+
+    a = on("a")
+    sync(a, root)
+    edit(a, root, "x.mp4", [])
+    sync(a, root)
+
+    b = on("b")
+    edit(b, root, "y.mp4", ["new"])
+    sync(b, root)
+    assert tags_of(b, root, "x.mp4") == []
+    assert tags_of(b, root, "y.mp4") == ["new"]
+
+
+def test_sidecar_sync_merges_concurrent_edits(machines):
+    root, on = machines
+    a = on("a")
+    edit(a, root, "x.mp4", ["base"])
+    sync(a, root)
+    b = on("b")
+    sync(b, root)
+
+    edit(b, root, "x.mp4", ["base", "from-b"])
+    sync(b, root)
+    a = on("a")
+    edit(a, root, "x.mp4", ["from-a"])
+    sync(a, root)
+    assert sorted(tags_of(a, root, "x.mp4")) == ["from-a", "from-b"]
+
+
+def test_rebase_keeps_uncommitted_edits(machines, tmp_path):
+    root, on = machines
+    a = on("a")
+    shard = a.shard(root)
+    shard.store.touch("x.mp4")
+    shard.store.records["x.mp4"] = {'tags': ["pending"]}
+    real = str(tmp_path / "real")
+    a.rebase(root, real)
+    assert a.shard(root) is shard and shard.store.dirty
+    assert shard.abs("x.mp4") == os.path.join(real, "x.mp4")
+    a.commit(shard, merge=merge_label_records)
+    assert tags_of(on("a"), root, "x.mp4") == ["pending"]
@@ -0,0 +1,53 @@
+# 多进程并发写同一个标签存储：每个进程各自加标签，结束后不能丢失任何一次修改，压缩后快照与日志一致
+import os
+import json
+import multiprocessing
+from label_store import LabelStore
+from data_manager import merge_label_records
+
+PROCESSES = 6
+EDITS = 60
+PATHS = [f"/videos/{i}.mp4" for i in range(5)]
+
+
+def _writer(snapshot, worker, edits):
+    store = LabelStore(snapshot, compact_every=25)
+    store.load()
+    for i in range(edits):
+        path = PATHS[i % len(PATHS)]
+        store.poll()
+        store.touch(path)
+        record = store.records.setdefault(path, {'tags': []})
+        record['tags'] = record.get('tags', []) + [f"w{worker}-{i}"]
+        store.commit(merge=merge_label_records)
+
+
+def test_concurrent_writers_lose_no_updates(tmp_path):
+    snapshot = str(tmp_path / "Labels.json")
+    ctx = multiprocessing.get_context()
+    procs = [ctx.Process(target=_writer, args=(snapshot, w, EDITS)) for w in range(PROCESSES)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(120)
+        assert p.exitcode == 0
+
+    expected = {f"w{w}-{i}" for w in range(PROCESSES) for i in range(EDITS)}
+    store = LabelStore(snapshot)
+    store.load()
+    tags = [t for info in store.records.values() for t in info['tags']]
+    assert len(tags) == len(expected)
+    assert set(tags) == expected
+
+    # 压缩后快照本身即包含全部修改，日志只剩头部
+    store.compact()
+    with open(snapshot, 'r', encoding='utf-8') as f:
+        compacted = json.load(f)
+    assert {p: info['tags'] for p, info in compacted.items()} == \
+        {p: info['tags'] for p, info in store.records.items()}
+    with open(store.journal_file, 'rb') as f:
+        assert len(f.read().splitlines()) == 1
+    fresh = LabelStore(snapshot)
+    fresh.load()
+    assert fresh.records == store.records
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp")]
@@ -0,0 +1,159 @@
+import json
+import time
+import asyncio
+import threading
+import http.client
+import concurrent.futures
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+import local_api
+from local_api import LocalApiServer
+
+TOKEN = "test-token"
+
+
+class DirectBridge:
+    # 测试中没有 Qt 事件循环：直接在服务器线程执行
+    def call(self, fn):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class FakeDataManager:
+    def __init__(self, count):
+        self.folders = ["/videos"]
+        self.tags = {f"/videos/{i:05d}.mp4": [] for i in range(count)}
+        self.all_known_tags = set()
+        self._listeners = []
+
+    def add_tag_listener(self, callback):
+        self._listeners.append(callback)
+
+    def query_videos(self, tags=(), folder=None):
+        if folder is not None and folder not in self.folders:
+            raise ValueError(folder)
+        return [(path, 1000, 1, list(t)) for path, t in sorted(self.tags.items()) if set(tags) <= set(t)]
+
+    def apply_tag_ops(self, ops):
+        changed = set()
+        for op in ops:
+            for path in op['paths']:
+                old = list(self.tags[path])
+                new = old + [t for t in op['tags'] if t not in old]
+                if new != old:
+                    self.tags[path] = new
+                    changed.add(path)
+                    for callback in self._listeners:
+                        callback(path, old, new)
+            self.all_known_tags.update(op['tags'])
+        return changed
+
+
+@pytest.fixture
+def server():
+    dm = FakeDataManager(1200)
+    api = LocalApiServer(dm, port=0, bridge=DirectBridge(), token=TOKEN)
+    assert api.start()
+    yield api
+    api.stop()
+
+
+def request(api, method, target, body=None, headers=None):
+    conn = http.client.HTTPConnection(local_api.HOST, api.port, timeout=30)
+    try:
+        conn.request(method, target, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        return response, data
+    finally:
+        conn.close()
+
+
+def post_batch(api, ops, **headers):
+    base = {'Content-Type': 'application/json', 'Authorization': f'Bearer {TOKEN}'}
+    base.update(headers)
+    return request(api, 'POST', '/api/tags/batch', json.dumps({'ops': ops}), base)
+
+
+def test_pagination_and_etag(server):
+    response, data = request(server, 'GET', '/api/videos?limit=100&offset=1100')
+    assert response.status == 200
+    page = json.loads(data)
+    assert page['total'] == 1200 and len(page['items']) == 100 and page['next'] is None
+    etag = response.getheader('ETag')
+
+    response, data = request(server, 'GET', '/api/videos?limit=100&offset=1100', headers={'If-None-Match': etag})
+    assert response.status == 304 and data == b""
+
+    assert post_batch(server, [{'op': 'add', 'paths': ['/videos/00000.mp4'], 'tags': ['x']}])[0].status == 200
+    response, _ = request(server, 'GET', '/api/videos?limit=100&offset=1100', headers={'If-None-Match': etag})
+    assert response.status == 200 and response.getheader('ETag') != etag
+
+
+def test_ndjson_stream(server):
+    response, data = request(server, 'GET', '/api/videos.ndjson')
+    assert response.status == 200
+    assert response.getheader('Transfer-Encoding') == 'chunked'
+    lines = data.decode('utf-8').splitlines()
+    assert len(lines) == int(response.getheader('X-Total-Count')) == 1200
+    assert json.loads(lines[-1])['path'] == "/videos/01199.mp4"
+
+
+def test_changes_long_poll_wakes_up(server):
+    since = server.feed.seq
+    threading.Timer(0.3, lambda: server.notify('scan', root="/videos")).start()
+    started = time.monotonic()
+    response, data = request(server, 'GET', f'/api/changes?since={since}&timeout=20')
+    assert response.status == 200
+    assert time.monotonic() - started < 10
+    changes = json.loads(data)['changes']
+    assert [c['kind'] for c in changes] == ['scan']
+
+
+def test_batch_mutation(server):
+    ops = [{'op': 'add', 'paths': ['/videos/00001.mp4', '/videos/00002.mp4'], 'tags': ['a', 'b']}]
+    response, data = post_batch(server, ops)
+    assert response.status == 200
+    assert json.loads(data)['changed'] == 2
+    response, data = request(server, 'GET', '/api/videos?tags=a,b')
+    assert [item['path'] for item in json.loads(data)['items']] == ['/videos/00001.mp4', '/videos/00002.mp4']
+
+
+def test_rejects_cross_site_requests(server):
+    ops = [{'op': 'add', 'paths': ['/videos/00003.mp4'], 'tags': ['a']}]
+    assert post_batch(server, ops, Authorization='Bearer wrong')[0].status == 401
+    assert post_batch(server, ops, **{'Content-Type': 'text/plain'})[0].status == 415
+    assert post_batch(server, ops, Origin='http://example.com')[0].status == 403
+    assert request(server, 'GET', '/api/tags', headers={'Host': f'evil.example:{server.port}'})[0].status == 403
+    assert request(server, 'GET', '/api/tags', headers={'Host': f'localhost:{server.port}'})[0].status == 200
+    assert server.data_manager.tags['/videos/00003.mp4'] == []
+
+
+def test_batch_rejects_rename_to_same_name(server):
+    response, data = post_batch(server, [{'op': 'rename', 'from': 'a', 'to': 'a'}])
+    assert response.status == 400
+    assert "ops[0]" in json.loads(data)['error']
+
+
+def test_connection_burst(server):
+    async def one(i):
+        reader, writer = await asyncio.open_connection(local_api.HOST, server.port)
+        writer.write(
+            f"GET /api/videos?offset={i}&limit=5 HTTP/1.1\r\nHost: {local_api.HOST}:{server.port}\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1')
+        )
+        data = await reader.read()
+        writer.close()
+        return data.split(b" ", 2)[1]
+
+    async def burst():
+        return await asyncio.gather(*(one(i) for i in range(300)))
+
+    assert asyncio.run(burst()) == [b"200"] * 300
@@ -0,0 +1,94 @@
+import os
+import json
+
+import pytest
+
+pytest.importorskip("PyQt5")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtCore import QRect
+from PyQt5.QtGui import QGuiApplication, QImage, QPixmap, QPainter, QColor
+
+from sprite_sheets import (
+    SpriteSheet, SpriteCache, StubFrameExtractor, build_sprite_sheet, is_current, move_sprite_sheets,
+    sprite_base, tile_times, TILE_WIDTH, TILE_HEIGHT, TILE_COLUMNS,
+)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def app():
+    yield QGuiApplication.instance() or QGuiApplication([])
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "clip.mp4")
+    with open(path, 'wb') as f:
+        f.write(b"\0" * 1024)
+    return path
+
+
+def tile_color(i):
+    return QColor.fromHsv(i * 29 % 360, 255, 255)
+
+
+def test_frame_picks_nearest_tile():
+    times = [500, 1500, 2500, 3500, 4500, 5500, 6500]
+    columns = 3
+    image = QImage(columns * TILE_WIDTH, 3 * TILE_HEIGHT, QImage.Format_RGB32)
+    painter = QPainter(image)
+    for i in range(len(times)):
+        painter.fillRect(QRect(i % columns * TILE_WIDTH, i // columns * TILE_HEIGHT, TILE_WIDTH, TILE_HEIGHT),
+                         tile_color(i))
+    painter.end()
+    sheet = SpriteSheet(QPixmap.fromImage(image), {
+        'times': times, 'columns': columns, 'tile': [TILE_WIDTH, TILE_HEIGHT],
+    })
+    for ms, expected in [(0, 0), (999, 0), (1001, 1), (4400, 4), (5999, 5), (6000, 6), (99999, 6)]:
+        pixmap = sheet.frame(ms)
+        assert (pixmap.width(), pixmap.height()) == (TILE_WIDTH, TILE_HEIGHT)
+        assert pixmap.toImage().pixelColor(TILE_WIDTH // 2, TILE_HEIGHT // 2).rgb() == tile_color(expected).rgb(), ms
+
+
+def test_build_and_lookup(video):
+    assert not is_current(video)
+    assert build_sprite_sheet(video, StubFrameExtractor(duration_ms=600000))
+    assert is_current(video)
+    with open(sprite_base(video) + ".json", 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    assert meta['times'] == tile_times(600000)
+    assert meta['columns'] == TILE_COLUMNS and meta['path'] == video
+
+    cache = SpriteCache()
+    pixmap = cache.frame(video, meta['times'][7])
+    assert pixmap is not None and (pixmap.width(), pixmap.height()) == (TILE_WIDTH, TILE_HEIGHT)
+    assert cache.frame(video + ".missing", 0) is None
+
+
+def test_is_current_tracks_size_and_mtime(video):
+    build_sprite_sheet(video, StubFrameExtractor())
+    st = os.stat(video)
+    os.utime(video, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert not is_current(video)
+
+    build_sprite_sheet(video, StubFrameExtractor())
+    assert is_current(video)
+    st = os.stat(video)
+    with open(video, 'ab') as f:
+        f.write(b"\0")
+    # 只改变大小，修改时间恢复原值
+    os.utime(video, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert not is_current(video)
+
+
+def test_move_sprite_sheets(video, tmp_path):
+    build_sprite_sheet(video, StubFrameExtractor())
+    dst = str(tmp_path / "renamed.mp4")
+    os.replace(video, dst)
+    move_sprite_sheets({video: dst})
+    assert not os.path.exists(sprite_base(video) + ".json")
+    assert not os.path.exists(sprite_base(video) + ".jpg")
+    with open(sprite_base(dst) + ".json", 'r', encoding='utf-8') as f:
+        assert json.load(f)['path'] == dst
+    assert os.path.exists(sprite_base(dst) + ".jpg")
+    assert is_current(dst)
@@ -0,0 +1,58 @@
+import pytest
+
+from data_manager import DataManager
+
+
+def test_merge_rename_keeps_parent_postings_balanced():
+    dm = DataManager()
+    path = "/videos/merge.mp4"
+    dm.set_tag_parent('b', 'P')
+    dm.add_tags([path], ['a', 'b'])
+    # 'a' 合并进已有的 'b'：记录里 b 已经存在，不能再计一次
+    dm.rename_tag('a', 'b')
+    assert dm.get_tags(path) == ['b']
+    assert dm.tag_index.paths_under('P') == {path}
+
+    dm.remove_tags([path], ['b'])
+    assert dm.get_tags(path) == []
+    assert path not in dm.tag_index.paths_under('P')
+    assert path not in dm.tag_index.match_all({'P'})
+
+
+def test_adding_existing_tag_is_idempotent():
+    dm = DataManager()
+    path = "/videos/twice.mp4"
+    dm.set_tag_parent('c', 'Q')
+    dm.add_tags([path], ['c'])
+    dm.add_tags([path], ['c'])
+    dm.remove_tags([path], ['c'])
+    assert path not in dm.tag_index.paths_under('Q')
+
+
+def test_rename_to_same_name_keeps_hierarchy():
+    dm = DataManager()
+    dm.set_tag_parent('kid', 'x')
+    assert dm.rename_tag('x', 'x') == set()
+    assert dm.tag_hierarchy.parent_of('kid') == 'x'
+
+
+def test_batch_with_failing_op_changes_nothing():
+    dm = DataManager()
+    path = "/videos/batch.mp4"
+    dm.set_tag_parent('child', 'root')
+    ops = [
+        {'op': 'add', 'paths': [path], 'tags': ['new']},
+        {'op': 'rename', 'from': 'root', 'to': 'child'},
+    ]
+    with pytest.raises(ValueError):
+        dm.apply_tag_ops(ops)
+    assert dm.get_tags(path) == []
+    assert dm.tag_hierarchy.parent_of('child') == 'root'
+
+    # 前面的操作改变了层级时按模拟后的结构检查
+    ops = [
+        {'op': 'delete', 'tag': 'root'},
+        {'op': 'rename', 'from': 'child', 'to': 'root'},
+    ]
+    dm.apply_tag_ops(ops)
+    assert 'child' not in dm.tag_hierarchy
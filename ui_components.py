@@ -1,62 +1,107 @@
-# ui_components.py - 自定义 UI 组件
-import os
-from pathlib import Path
-from PyQt5.QtWidgets import (
-    QWidget, QHBoxLayout, QPushButton, QLabel, QSlider, QStyle, QStyleOptionSlider
-)
-from PyQt5.QtCore import Qt, pyqtSignal
-from PyQt5.QtGui import QFont
-
-VIDEO_PATH_ROLE = Qt.UserRole + 1
-VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv', '.webm', '.m4v'}
-
-class ClickableSlider(QSlider):
-    clicked = pyqtSignal(int)
-
-    def mousePressEvent(self, event):
-        if event.button() == Qt.LeftButton:
-            opt = QStyleOptionSlider()
-            self.initStyleOption(opt)
-            sr = self.style().subControlRect(QStyle.CC_Slider, opt, QStyle.SC_SliderHandle, self)
-            if sr.contains(event.pos()):
-                super().mousePressEvent(event)
-            else:
-                new_pos = self.minimum() + (self.maximum() - self.minimum()) * (
-                    (event.x() - self.contentsMargins().left()) /
-                    (self.width() - self.contentsMargins().left() - self.contentsMargins().right())
-                )
-                self.setValue(int(new_pos))
-                self.clicked.emit(self.value())
-        else:
-            super().mousePressEvent(event)
-
-def create_tag_widget(tag_name, remove_callback):
-    widget = QWidget()
-    layout = QHBoxLayout(widget)
-    layout.setContentsMargins(0, 0, 0, 0)
-    layout.setSpacing(5)
-
-    label = QLabel(tag_name)
-    label.setFont(QFont("SimHei", 10))
-    label.setStyleSheet("background-color: #e0e0e0; padding: 3px 6px; border-radius: 4px;")
-    layout.addWidget(label)
-
-    delete_btn = QPushButton("×")
-    delete_btn.setFixedSize(20, 20)
-    delete_btn.setStyleSheet("""
-        QPushButton {
-            background-color: #ff6b6b;
-            color: white;
-            border-radius: 10px;
-            font-weight: bold;
-            font-size: 12px;
-        }
-        QPushButton:hover {
-            background-color: #ff5252;
-        }
-    """)
-    delete_btn.clicked.connect(lambda: remove_callback(tag_name))
-    layout.addWidget(delete_btn)
-    layout.addStretch()
-
+# ui_components.py - 自定义 UI 组件
+import os
+from pathlib import Path
+from PyQt5.QtWidgets import (
+    QWidget, QHBoxLayout, QPushButton, QLabel, QSlider, QStyle, QStyleOptionSlider
+)
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtGui import QFont, QPainter, QColor
+
+VIDEO_PATH_ROLE = Qt.UserRole + 1
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.flv', '.wmv', '.webm', '.m4v'}
+
+class ClickableSlider(QSlider):
+    clicked = pyqtSignal(int)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            opt = QStyleOptionSlider()
+            self.initStyleOption(opt)
+            sr = self.style().subControlRect(QStyle.CC_Slider, opt, QStyle.SC_SliderHandle, self)
+            if sr.contains(event.pos()):
+                super().mousePressEvent(event)
+            else:
+                new_pos = self.minimum() + (self.maximum() - self.minimum()) * (
+                    (event.x() - self.contentsMargins().left()) /
+                    (self.width() - self.contentsMargins().left() - self.contentsMargins().right())
+                )
+                self.setValue(int(new_pos))
+                self.clicked.emit(self.value())
+        else:
+            super().mousePressEvent(event)
+
+class SegmentSlider(ClickableSlider):
+    # 进度条上标出片段标签覆盖的时间段：spans 为 [(开始比例, 结束比例, 标签)]
+    # 鼠标悬停时发出 hovered(比例)，移开时发出 hover_left()，用于显示预览画面
+    SEGMENT_COLOR = QColor(255, 193, 7, 170)
+    hovered = pyqtSignal(float)
+    hover_left = pyqtSignal()
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.spans = []
+        self.setMouseTracking(True)
+
+    def set_segments(self, spans):
+        self.spans = spans
+        self.setToolTip("\n".join(sorted({tag for _, _, tag in spans})))
+        self.update()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.spans:
+            return
+        opt = QStyleOptionSlider()
+        self.initStyleOption(opt)
+        groove = self.style().subControlRect(QStyle.CC_Slider, opt, QStyle.SC_SliderGroove, self)
+        painter = QPainter(self)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(self.SEGMENT_COLOR)
+        width = groove.width()
+        for start, end, _ in self.spans:
+            x = groove.left() + int(start * width)
+            painter.drawRect(x, groove.top(), max(2, int((end - start) * width)), groove.height())
+        painter.end()
+
+    def mouseMoveEvent(self, event):
+        super().mouseMoveEvent(event)
+        opt = QStyleOptionSlider()
+        self.initStyleOption(opt)
+        groove = self.style().subControlRect(QStyle.CC_Slider, opt, QStyle.SC_SliderGroove, self)
+        if groove.width() > 0:
+            self.hovered.emit(min(1.0, max(0.0, (event.x() - groove.left()) / groove.width())))
+
+    def leaveEvent(self, event):
+        super().leaveEvent(event)
+        self.hover_left.emit()
+
+def create_tag_widget(tag_name, remove_callback):
+    widget = QWidget()
+    layout = QHBoxLayout(widget)
+    layout.setContentsMargins(0, 0, 0, 0)
+    layout.setSpacing(5)
+
+    label = QLabel(tag_name)
+    label.setFont(QFont("SimHei", 10))
+    label.setStyleSheet("background-color: #e0e0e0; padding: 3px 6px; border-radius: 4px;")
+    layout.addWidget(label)
+
+    delete_btn = QPushButton("×")
+    delete_btn.setFixedSize(20, 20)
+    delete_btn.setStyleSheet("""
+        QPushButton {
+            background-color: #ff6b6b;
+            color: white;
+            border-radius: 10px;
+            font-weight: bold;
+            font-size: 12px;
+        }
+        QPushButton:hover {
+            background-color: #ff5252;
+        }
+    """)
+    delete_btn.clicked.connect(lambda: remove_callback(tag_name))
+    layout.addWidget(delete_btn)
+    layout.addStretch()
+
     return widget
\ No newline at end of file
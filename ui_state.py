@@ -0,0 +1,81 @@
+# ui_state.py - 界面状态持久化：上次打开的文件夹、筛选标签、排序、选中项、滚动位置，以及上次显示的列表快照
+#
+# Save/UiState.json       小文件，记录导航状态
+# Save/ListingSnapshot.json 上次渲染的列表（按显示顺序），目录前缀只存一次：
+#   {"folder": 注册路径, "dirs": [目录, ...], "items": [[目录下标, 文件名], ...]}
+# 启动时先用快照直接画出列表，再加载扫描索引并在后台核对，之后只把差异应用到列表上。
+import os
+import json
+from label_store import write_json_atomic
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+UI_STATE_FILE = os.path.join(SAVE_DIR, "UiState.json")
+LISTING_SNAPSHOT_FILE = os.path.join(SAVE_DIR, "ListingSnapshot.json")
+
+
+def _read(path):
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        log.error("读取 %s 出错: %s", path, e)
+    return None
+
+
+def _write(path, data):
+    try:
+        write_json_atomic(path, data)
+    except Exception as e:
+        log.error("保存 %s 出错: %s", path, e)
+
+
+def load_ui_state():
+    return _read(UI_STATE_FILE) or {}
+
+
+def save_ui_state(state):
+    _write(UI_STATE_FILE, state)
+
+
+def encode_listing(folder, paths):
+    dirs, dir_ids, items = [], {}, []
+    for path in paths:
+        directory, name = os.path.split(path)
+        i = dir_ids.get(directory)
+        if i is None:
+            i = dir_ids[directory] = len(dirs)
+            dirs.append(directory)
+        items.append([i, name])
+    return {'folder': folder, 'dirs': dirs, 'items': items}
+
+
+def decode_listing(data):
+    dirs = data.get('dirs', [])
+    return [os.path.join(dirs[i], name) for i, name in data.get('items', [])]
+
+
+def load_listing_snapshot(folder):
+    # 只有快照属于该文件夹时才返回路径列表
+    data = _read(LISTING_SNAPSHOT_FILE)
+    if not data or data.get('folder') != folder:
+        return None
+    try:
+        return decode_listing(data)
+    except (IndexError, TypeError, ValueError) as e:
+        log.warning("列表快照无效: %s", e)
+        return None
+
+
+def save_listing_snapshot(folder, paths):
+    if folder is None:
+        if os.path.exists(LISTING_SNAPSHOT_FILE):
+            try:
+                os.remove(LISTING_SNAPSHOT_FILE)
+            except OSError as e:
+                log.error("删除 %s 出错: %s", LISTING_SNAPSHOT_FILE, e)
+        return
+    _write(LISTING_SNAPSHOT_FILE, encode_listing(folder, paths))
@@ -0,0 +1,232 @@
+# watch_history.py - 观看记录：只追加的会话表 + 增量维护的每视频汇总（SQLite）
+#
+# sessions 每次打开视频到切走/关闭记一行，从不修改；rollups 每个视频一行，写入会话时在同一事务里更新。
+# “继续观看”“最常观看”“未看完”都是对 rollups 的 ORDER BY ... LIMIT，由索引直接给出前 K 条，
+# 与历史会话的总数无关。
+import os
+import time
+import sqlite3
+import threading
+from log_utils import get_logger
+
+log = get_logger(__name__)
+
+SAVE_DIR = "Save"
+HISTORY_DB = os.path.join(SAVE_DIR, "WatchHistory.sqlite3")
+
+# 看到这个比例即视为看完
+COMPLETE_FRACTION = 0.9
+# 位置几乎没变又很快切走的会话（快速翻看）不记录
+MIN_SESSION_MS = 3000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    video_id INTEGER NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    start_ms INTEGER NOT NULL,
+    position_ms INTEGER NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    fraction REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_video ON sessions(video_id, end);
+CREATE TABLE IF NOT EXISTS rollups (
+    video_id INTEGER PRIMARY KEY,
+    sessions INTEGER NOT NULL,
+    watched_ms INTEGER NOT NULL,
+    last_played REAL NOT NULL,
+    position_ms INTEGER NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    fraction REAL NOT NULL,
+    max_fraction REAL NOT NULL,
+    completed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rollups_recent ON rollups(last_played);
+CREATE INDEX IF NOT EXISTS rollups_sessions ON rollups(sessions, watched_ms);
+CREATE INDEX IF NOT EXISTS rollups_unfinished ON rollups(last_played) WHERE completed = 0 AND position_ms > 0;
+CREATE INDEX IF NOT EXISTS rollups_unfinished_fraction ON rollups(fraction) WHERE completed = 0 AND position_ms > 0;
+"""
+
+_UPSERT_ROLLUP = """
+INSERT INTO rollups (video_id, sessions, watched_ms, last_played, position_ms, duration_ms,
+                     fraction, max_fraction, completed)
+VALUES (:video_id, 1, :watched_ms, :end, :position_ms, :duration_ms, :fraction, :fraction, :completed)
+ON CONFLICT(video_id) DO UPDATE SET
+    sessions = sessions + 1,
+    watched_ms = watched_ms + excluded.watched_ms,
+    last_played = MAX(last_played, excluded.last_played),
+    position_ms = CASE WHEN excluded.last_played >= last_played THEN excluded.position_ms ELSE position_ms END,
+    duration_ms = CASE WHEN excluded.duration_ms > 0 THEN excluded.duration_ms ELSE duration_ms END,
+    fraction = CASE WHEN excluded.last_played >= last_played THEN excluded.fraction ELSE fraction END,
+    max_fraction = MAX(max_fraction, excluded.max_fraction),
+    completed = MAX(completed, excluded.completed)
+"""
+
+_ROLLUP_COLUMNS = (
+    "v.path, r.sessions, r.watched_ms, r.last_played, r.position_ms, r.duration_ms, "
+    "r.fraction, r.max_fraction, r.completed"
+)
+
+
+class WatchHistory:
+    def __init__(self, db_file=HISTORY_DB):
+        self.db_file = db_file
+        self.created = not os.path.exists(db_file)
+        # 查询可能来自其他线程（本地 API），连接共享并由锁串行化
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._video_ids = {}
+        self.current = None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _video_id(self, path):
+        video_id = self._video_ids.get(path)
+        if video_id is None:
+            self._conn.execute("INSERT OR IGNORE INTO videos (path) VALUES (?)", (path,))
+            video_id = self._conn.execute("SELECT id FROM videos WHERE path = ?", (path,)).fetchone()[0]
+            self._video_ids[path] = video_id
+        return video_id
+
+    # === 会话 ===
+    def begin(self, path, position_ms=0):
+        self.current = {'path': path, 'start': time.time(), 'start_ms': max(0, position_ms or 0)}
+
+    def end(self, position_ms, duration_ms):
+        # 结束当前会话并写入；返回是否实际记录
+        session, self.current = self.current, None
+        if session is None:
+            return False
+        return self.record(
+            session['path'], session['start'], time.time(), session['start_ms'], position_ms, duration_ms
+        )
+
+    def record(self, path, start, end, start_ms, position_ms, duration_ms):
+        position_ms = max(0, position_ms or 0)
+        watched_ms = max(0, position_ms - start_ms)
+        if watched_ms < MIN_SESSION_MS and (end - start) * 1000 < MIN_SESSION_MS:
+            return False
+        fraction = min(1.0, position_ms / duration_ms) if duration_ms and duration_ms > 0 else 0.0
+        row = {
+            'start': start, 'end': end, 'start_ms': start_ms, 'position_ms': position_ms,
+            'duration_ms': duration_ms or 0, 'fraction': fraction, 'watched_ms': watched_ms,
+            'completed': int(fraction >= COMPLETE_FRACTION),
+        }
+        try:
+            with self._lock, self._conn:
+                row['video_id'] = self._video_id(path)
+                self._conn.execute(
+                    "INSERT INTO sessions (video_id, start, end, start_ms, position_ms, duration_ms, fraction) "
+                    "VALUES (:video_id, :start, :end, :start_ms, :position_ms, :duration_ms, :fraction)", row
+                )
+                self._conn.execute(_UPSERT_ROLLUP, row)
+        except sqlite3.Error as e:
+            log.error("写入观看记录出错 %s: %s", path, e)
+            return False
+        return True
+
+    def import_playback_states(self, states):
+        # 首次启用时把旧的“最后播放位置”各记为一次会话，让历史视图一开始就有内容
+        for path, state in states.items():
+            last_played = state.get('last_played')
+            if not last_played:
+                continue
+            self.record(
+                path, last_played, last_played, 0, state.get('time_ms', 0), state.get('duration_ms', 0)
+            )
+
+    def rename_paths(self, mapping):
+        # 文件在程序内被移动/重命名：会话和汇总按 video_id 关联，只需在一个事务里改写 videos.path。
+        # 新路径上若有已不存在的旧文件留下的记录，先连同其会话一起删除
+        try:
+            with self._lock, self._conn:
+                for src, dst in mapping.items():
+                    # 已经改写过的路径跳过（启动时重跑中断的迁移），否则会把刚迁移的记录当作旧记录删掉
+                    if self._conn.execute("SELECT 1 FROM videos WHERE path = ?", (src,)).fetchone() is None:
+                        continue
+                    stale = self._conn.execute("SELECT id FROM videos WHERE path = ?", (dst,)).fetchone()
+                    if stale is not None:
+                        self._conn.execute("DELETE FROM sessions WHERE video_id = ?", (stale[0],))
+                        self._conn.execute("DELETE FROM rollups WHERE video_id = ?", (stale[0],))
+                        self._conn.execute("DELETE FROM videos WHERE id = ?", (stale[0],))
+                    self._conn.execute("UPDATE videos SET path = ? WHERE path = ?", (dst, src))
+        except sqlite3.Error as e:
+            log.error("改写观看记录路径出错: %s", e)
+            return False
+        finally:
+            self._video_ids.clear()
+        if self.current is not None and self.current['path'] in mapping:
+            self.current['path'] = mapping[self.current['path']]
+        return True
+
+    # === 汇总查询（均为索引上的前 K 条）===
+    def _query(self, where, order, limit, params=()):
+        sql = (f"SELECT {_ROLLUP_COLUMNS} FROM rollups r JOIN videos v ON v.id = r.video_id "
+               f"{where} ORDER BY {order} LIMIT ?")
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, (*params, limit))]
+
+    def continue_watching(self, limit=50):
+        return self._query("WHERE r.completed = 0 AND r.position_ms > 0", "r.last_played DESC", limit)
+
+    def recently_watched(self, limit=50):
+        return self._query("", "r.last_played DESC", limit)
+
+    def most_watched(self, limit=50):
+        return self._query("", "r.sessions DESC, r.watched_ms DESC", limit)
+
+    def unfinished(self, limit=50):
+        # 看过但没看完，按已看比例从高到低（最接近看完的排前面）
+        return self._query("WHERE r.completed = 0 AND r.position_ms > 0", "r.fraction DESC", limit)
+
+    def stats(self, path):
+        rows = self._query("WHERE v.path = ?", "r.video_id", 1, (path,))
+        return rows[0] if rows else None
+
+    def completed(self, path):
+        # None 表示没有观看记录，否则为 0 / 1
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT r.completed FROM rollups r JOIN videos v ON v.id = r.video_id WHERE v.path = ?", (path,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def watch_states(self):
+        # 路径 -> 是否看完，覆盖所有有观看记录的视频（智能文件夹建立结果集时一次读取）
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT v.path, r.completed FROM rollups r JOIN videos v ON v.id = r.video_id"
+            ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def completion(self):
+        # (看完的视频数, 看过的视频数)
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(completed), 0), COUNT(*) FROM rollups").fetchone()
+        return row[0], row[1]
+
+    def rebuild_rollups(self):
+        # 汇总表损坏或规则变化时，从会话表完整重算
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM rollups")
+            sessions = self._conn.execute(
+                "SELECT video_id, end, start_ms, position_ms, duration_ms, fraction FROM sessions ORDER BY end"
+            ).fetchall()
+            for s in sessions:
+                self._conn.execute(_UPSERT_ROLLUP, {
+                    'video_id': s['video_id'], 'end': s['end'], 'position_ms': s['position_ms'],
+                    'duration_ms': s['duration_ms'], 'fraction': s['fraction'],
+                    'watched_ms': max(0, s['position_ms'] - s['start_ms']),
+                    'completed': int(s['fraction'] >= COMPLETE_FRACTION),
+                })